@@ -33,11 +33,21 @@ CREATE TABLE movies
     stripped_title TEXT           NOT NULL,
     release_year   INTEGER        NOT NULL,
     imdb_id        VARCHAR UNIQUE NOT NULL,
-    date_added     TIMESTAMP DEFAULT NOW()
+    date_added     TIMESTAMP DEFAULT NOW(),
+    guide_hash     TEXT           NULL
 );
 CREATE UNIQUE INDEX idx_imdb_id ON movies (imdb_id);
 CREATE INDEX idx_title_year ON movies (stripped_title, release_year);
 
+DROP TABLE IF EXISTS alternate_titles CASCADE;
+CREATE TABLE alternate_titles
+(
+    movie_id       UUID REFERENCES movies (movie_id) ON DELETE CASCADE,
+    title          TEXT NOT NULL,
+    stripped_title TEXT NOT NULL,
+    PRIMARY KEY (movie_id, stripped_title)
+);
+
 -- DROP TABLE IF EXISTS game_rounds CASCADE;
 -- CREATE TABLE game_rounds
 -- (
@@ -62,6 +72,26 @@ CREATE TABLE games
 );
 CREATE UNIQUE INDEX idx_game_of_player ON games (game_id, player_id);
 
+DROP TABLE IF EXISTS clues CASCADE;
+CREATE TABLE clues
+(
+    clue_id      UUID      DEFAULT gen_random_uuid() PRIMARY KEY,
+    movie_id     UUID REFERENCES movies (movie_id),
+    category_id  INT REFERENCES categories (category_id),
+    clue_text    TEXT NOT NULL,
+    spoiler      BOOL,
+    date_created TIMESTAMP DEFAULT NOW(),
+    clue_hash    TEXT GENERATED ALWAYS AS (md5(clue_text)) STORED,
+    -- Set at ingest by imdb_game.utils.utils.clue_leaks_title
+    title_leak   BOOL      NOT NULL DEFAULT FALSE,
+    playable     BOOL GENERATED ALWAYS AS
+        (NOT title_leak AND spoiler IS NOT TRUE) STORED,
+    -- 0 (easy) to 1 (hard), set by imdb_game.gameshow.difficulty
+    difficulty   REAL
+);
+CREATE UNIQUE INDEX idx_clue_hash ON clues (movie_id, category_id, clue_hash);
+CREATE INDEX idx_playable_clues ON clues (movie_id) WHERE playable;
+
 DROP TABLE IF EXISTS guesses CASCADE;
 CREATE TABLE guesses
 (
@@ -71,19 +101,11 @@ CREATE TABLE guesses
     guess_text       TEXT                    NOT NULL,
     guessed_movie_id UUID REFERENCES movies (movie_id),
     guess_time       TIMESTAMP DEFAULT NOW() NOT NULL,
-    is_correct       BOOLEAN                 NOT NULL
-);
-
-DROP TABLE IF EXISTS clues CASCADE;
-CREATE TABLE clues
-(
-    clue_id      UUID      DEFAULT gen_random_uuid() PRIMARY KEY,
-    movie_id     UUID REFERENCES movies (movie_id),
-    category_id  INT REFERENCES categories (category_id),
-    clue_text    TEXT NOT NULL,
-    spoiler      BOOL,
-    date_created TIMESTAMP DEFAULT NOW()
+    is_correct       BOOLEAN                 NOT NULL,
+    -- The clue on screen when the guess was made
+    clue_id          UUID REFERENCES clues (clue_id)
 );
+CREATE INDEX idx_guess_clue ON guesses (clue_id);
 
 DROP TABLE IF EXISTS player_movies CASCADE;
 CREATE TABLE player_movies
@@ -104,6 +126,17 @@ CREATE TABLE player_clues
     PRIMARY KEY (player_id, clue_id)
 );
 CREATE INDEX idx_date_played_clue ON player_clues (date_played);
+CREATE INDEX idx_played_clue ON player_clues (clue_id);
+
+DROP TABLE IF EXISTS game_states CASCADE;
+CREATE TABLE game_states
+(
+    state_key    TEXT PRIMARY KEY,
+    version      INT       NOT NULL,
+    state        BYTEA     NOT NULL,
+    date_updated TIMESTAMP DEFAULT NOW()
+);
+CREATE INDEX idx_date_updated_state ON game_states (date_updated);
 
-\copy movies FROM 'data/movies.csv' CSV HEADER;
-\copy clues FROM 'data/clues.csv' CSV HEADER;
+\copy movies (movie_id, title, stripped_title, release_year, imdb_id, date_added) FROM 'data/movies.csv' CSV HEADER;
+\copy clues (clue_id, movie_id, category_id, clue_text, spoiler, date_created, title_leak) FROM 'data/clues.csv' CSV HEADER;
@@ -1,10 +1,103 @@
-from flask import Flask, render_template
-from imdb_game.gameshow.game import GameShowHost
+import os
+import sys
+import time
+from contextlib import contextmanager
+from uuid import uuid4
+from flask import Flask, abort, flash, jsonify, redirect, render_template, \
+    request, session, url_for
+from imdb_game.gameshow.engine import GameEngine, InvalidActionError
+from imdb_game.gameshow.sessions import SessionRegistry
+from imdb_game.gameshow.state import GameState, MemoryGameStateStore, \
+    PostgresGameStateStore, StaleStateError
 from imdb_game.database.dataclasses import Player
+from imdb_game.database.catalogue import CatalogueDBHandler
+from imdb_game.database.handler import DBHandler
 
 app = Flask(__name__, template_folder="templates")
-player = Player('mike')
-host = GameShowHost(player)
+# Every worker must sign session cookies with the same key, or a visitor's
+# session, and so their stored game, is lost whenever another worker answers
+app.secret_key = os.getenv('FLASK_SECRET_KEY')
+if not app.secret_key:
+    print('FLASK_SECRET_KEY must be set')
+    sys.exit(1)
+# Movies, clues and categories are served from memory, reloaded whenever
+# the scraper publishes new ones
+database = CatalogueDBHandler(DBHandler(
+    use_pool=True,
+    pool_min_size=int(os.getenv('POSTGRES_POOL_MIN_SIZE', 2)),
+    pool_max_size=int(os.getenv('POSTGRES_POOL_MAX_SIZE', 10)),
+    pool_timeout=float(os.getenv('POSTGRES_POOL_TIMEOUT', 30))),
+    snapshot_path=os.getenv('CATALOGUE_SNAPSHOT'), listen=True)
+# Load the title suggestions now rather than on the first keystroke
+database.complete_titles('')
+max_sessions = int(os.getenv('GAME_MAX_SESSIONS', 1000))
+session_timeout = float(os.getenv('GAME_SESSION_TIMEOUT', 30 * 60))
+if os.getenv('GAME_STATE_STORE', 'postgres') == 'memory':
+    game_states = MemoryGameStateStore(max_sessions, session_timeout)
+else:
+    game_states = PostgresGameStateStore(database)
+
+
+def new_engine(session_id: str) -> GameEngine:
+    """
+    Returns a GameEngine for the session, resuming its stored game or
+    registering a guest player for a new one
+    """
+    state = game_states.load(session_id)
+    if state is None:
+        player = Player(f'guest-{uuid4().hex[:12]}')
+        database.add_player_by_username(player)
+        state = GameState(database.get_player_by_username(player), None)
+    engine = GameEngine(state.player, state.game, database=database)
+    engine.state = GameState(engine.player, engine.game, state.version)
+    return engine
+
+
+engines = SessionRegistry(new_engine, max_sessions=max_sessions,
+                          idle_timeout=session_timeout)
+# Seconds between sweeps of idle sessions and game states
+EXPIRY_INTERVAL: float = 60.0
+_next_expiry = 0.0
+
+
+def expire_games():
+    """
+    Drops sessions and stored game states idle for longer than the session
+    timeout, at most once every EXPIRY_INTERVAL seconds
+    """
+    global _next_expiry
+    now = time.monotonic()
+    if now < _next_expiry:
+        return
+    _next_expiry = now + EXPIRY_INTERVAL
+    engines.expire()
+    game_states.expire(session_timeout)
+
+
+@contextmanager
+def game_session():
+    """
+    Yields the GameEngine of the visitor's session, with the latest stored
+    state of their game, and stores the game again afterwards. Responds with
+    409 Conflict if another request changed the game in the meantime.
+    """
+    expire_games()
+    with engines.session(session.get('game_session')) as (session_id, engine):
+        session['game_session'] = session_id
+        state = game_states.load(session_id)
+        if state is not None and state.version != engine.state.version:
+            # Another worker served this game since, pick up its changes
+            engine.player, engine.game = state.player, state.game
+            engine.state = state
+        elif state is None:
+            # The stored game expired, store it again from scratch
+            engine.state.version = 0
+        yield engine
+        engine.state.player, engine.state.game = engine.player, engine.game
+        try:
+            game_states.save(session_id, engine.state)
+        except StaleStateError:
+            abort(409)
 
 
 @app.route('/')
@@ -19,27 +112,103 @@ def home():
 @app.route('/game')
 def game():
     """
-    Display Game Page.
+    Display Game Page: the years to choose from, or the final score once
+    the game is over.
     :return: rendered game.html template.
     """
-    options = host.get_three_years()
-    return render_template('game.html', choices=options)
+    with game_session() as engine:
+        if engine.round_in_progress():
+            return redirect(url_for('clue'))
+        options = [] if engine.game.GAME_OVER else engine.get_options()
+        return render_template('game.html', choices=options,
+                               game_round_num=engine.game.get_round(),
+                               game_over=engine.game.GAME_OVER,
+                               score=engine.game.score)
+
+
+@app.route('/game/new')
+def new_game():
+    """
+    Start a new game for the player and display the Game Page.
+    """
+    with game_session() as engine:
+        engine.start_game()
+    return redirect(url_for('game'))
 
 
-@app.route('/movie/<movie_id>')
+@app.route('/movie/<uuid:movie_id>')
 def select_movie(movie_id):
-    print(movie_id)
-    # movie = host.DB.get_movie_by_movie_id(movie_id)
-    obj = host.web_start_round()
-    print(obj)
-    return render_template('movie.html',
-                           current_clue=obj['clue_text'])
+    """
+    Start the round with the chosen movie and display its first clue.
+    """
+    with game_session() as engine:
+        try:
+            current_clue = engine.choose_movie(movie_id)
+        except InvalidActionError as err:
+            flash(str(err))
+            return redirect(url_for('game'))
+    return render_clue(current_clue)
+
+
+@app.route('/clue')
+def clue():
+    """
+    Display the current clue of the round.
+    """
+    with game_session() as engine:
+        try:
+            current_clue = engine.next_clue()
+        except InvalidActionError:
+            return redirect(url_for('game'))
+    return render_clue(current_clue)
+
+
+@app.route('/guess', methods=['POST'])
+def guess():
+    """
+    Score the player's guess, then display the next clue or go back to the
+    Game Page for the next round.
+    """
+    with game_session() as engine:
+        try:
+            outcome = engine.submit_guess(request.form.get('guess', ''))
+        except InvalidActionError:
+            return redirect(url_for('game'))
+    if outcome['result'] == 'correct':
+        flash(f"CORRECT: +{outcome['points']}")
+    elif outcome['result'] == 'wrong':
+        flash(f"WRONG: {outcome['points']}")
+    if outcome['action'] == 'next_round':
+        if outcome['result'] != 'correct':
+            flash(f"Out of clues! The movie was {outcome['title']}")
+        return redirect(url_for('game'))
+    return redirect(url_for('clue'))
+
 
+@app.route('/api/titles')
+def titles():
+    """
+    Suggest movie titles starting with the `q` query parameter, served from
+    memory. Release years are only included with `years=1`, since they
+    would give the answer away.
+    :return: JSON list of suggestions, see DBHandler.complete_titles().
+    """
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    include_years = request.args.get('years', '0') == '1'
+    return jsonify(database.complete_titles(request.args.get('q', ''),
+                                            limit, include_years))
 
-# Todo:
-#   - add clues route/page with text box for player input and submit button
-#   - add functionality for win/loss of each round
-#   - add functionality for playing a five round game that reveals a final score
+
+def render_clue(current_clue: dict):
+    """
+    :return: rendered movie.html template for a clue from the GameEngine.
+    """
+    return render_template('movie.html',
+                           current_clue=current_clue['clue_text'],
+                           current_category=current_clue['category'][
+                               'display_name'],
+                           clue_num=current_clue['clue_number'],
+                           game_round_num=current_clue['round_number'])
 
 
 if __name__ == "__main__":
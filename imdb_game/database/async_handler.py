@@ -0,0 +1,475 @@
+"""
+asyncio counterpart of DBHandler, for serving many game sessions from one
+event loop and overlapping scraper writes with page fetches
+"""
+import os
+from psycopg import errors
+from psycopg.rows import dict_row, class_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+from uuid import UUID
+from . import queries
+from .dataclasses import Movie, Clue, Game, Player, RoundPack
+from .sampler import MovieSampler, PlayedMovies
+from .titles import TitleCompleter, TitleMatcher
+from ..utils.utils import strip_text
+
+
+class AsyncDBHandler:
+    """
+    Handles all Database actions for IMDb Game without blocking the event
+    loop. Mirrors the public API of DBHandler with coroutines, on an async
+    connection pool. Use as `async with AsyncDBHandler() as db:` or call
+    open() and close() explicitly.
+    """
+
+    def __init__(self, pg_url: str = None, pool_min_size: int = 1,
+                 pool_max_size: int = 10, pool_timeout: float = 30.0) -> None:
+        """
+        Initializes the database handler, the pool is created by open()
+        """
+        self.pg_url = pg_url or os.getenv('POSTGRES_URL')
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.pool_timeout = pool_timeout
+        self.pool = None
+        self.movie_sampler = MovieSampler()
+        self.title_matcher = TitleMatcher()
+        self.title_completer = TitleCompleter()
+        self.played_movies = PlayedMovies()
+
+    async def open(self):
+        """
+        Opens the connection pool, waiting until min_size connections are
+        ready
+        """
+        if self.pool is None:
+            self.pool = AsyncConnectionPool(
+                conninfo=self.pg_url, min_size=self.pool_min_size,
+                max_size=self.pool_max_size, timeout=self.pool_timeout,
+                kwargs={'autocommit': True},
+                check=AsyncConnectionPool.check_connection,
+                name='imdb_game_async', open=False)
+            await self.pool.open(wait=True, timeout=self.pool_timeout)
+        return self
+
+    async def close(self):
+        """
+        Closes the connection pool
+        """
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def _execute_sql(self, query: str, values=None,
+                           return_data: bool = False,
+                           row_factory=tuple_row, prepare: bool = None):
+        """
+        Executes the query string passed to it on a pooled connection. With
+        `prepare`, the statement is prepared on the connection the first time
+        and reused afterwards.
+        """
+        async with self.pool.connection() as connection, \
+                connection.cursor(row_factory=row_factory) as cur:
+            try:
+                await cur.execute(query, values or None, prepare=prepare)
+            except errors.UniqueViolation as err:
+                print('SKIPPING DUPLICATE KEY')
+                print(err)
+                return None
+            if return_data:
+                return await cur.fetchall()
+        return None
+
+    async def _update_player_last_played(self, player: Player):
+        """
+        Updates the timestamp column of the table passed to it
+        """
+        await self._execute_sql(queries.UPDATE_PLAYER_LAST_PLAYED,
+                                [str(player.player_id)])
+
+    async def add_player_by_username(self, player: Player):
+        """
+        Adds a new entry to the `players` table when a new player plays their
+        first game
+        """
+        await self._execute_sql(queries.INSERT_PLAYER_BY_USERNAME,
+                                [player.username])
+
+    async def add_full_player(self, player: Player):
+        """
+        Add a complete Player object as a row to explicitly write all columns
+        from object
+        """
+        await self._execute_sql(queries.INSERT_FULL_PLAYER, player.dict())
+
+    async def add_game(self, game_obj: Game):
+        """
+        Creates new game in the `games` table
+        """
+        await self._execute_sql(queries.INSERT_GAME, game_obj.dict())
+
+    async def add_movie(self, movie_object: Movie):
+        """
+        Add or update a movie in the `movies` table.
+        Returns:
+            UUID - the movie_id of the stored movie
+        """
+        result = await self._execute_sql(queries.UPSERT_MOVIE,
+                                         movie_object.dict(), return_data=True)
+        self.movie_sampler.invalidate()
+        self.title_matcher.invalidate()
+        self.title_completer.invalidate()
+        return result[0][0]
+
+    async def add_movies_bulk(self, movies: list[Movie]) -> list[UUID]:
+        """
+        Adds or updates many movies in one transaction.
+        Returns:
+            list[UUID] - the movie_id of each movie, in input order
+        """
+        unique_movies = list({movie.imdb_id: movie for movie in movies}
+                             .values())
+        movie_ids = {}
+        if unique_movies:
+            async with self.pool.connection() as connection, \
+                    connection.transaction(), connection.cursor() as cur:
+                await cur.executemany(queries.UPSERT_MOVIE_KEEPING_ID,
+                                      [movie.row() for movie in
+                                       unique_movies],
+                                      returning=True)
+                for movie in unique_movies:
+                    movie_ids[movie.imdb_id] = (await cur.fetchone())[0]
+                    cur.nextset()
+            self.movie_sampler.invalidate()
+            self.title_matcher.invalidate()
+            self.title_completer.invalidate()
+        return [movie_ids[movie.imdb_id] for movie in movies]
+
+    async def add_clue(self, clue_obj: Clue):
+        """
+        Add new Clue to `clues` table, skipping duplicates.
+        Returns:
+            UUID - the clue_id of the new clue, or None if it was a duplicate
+        """
+        result = await self._execute_sql(queries.INSERT_CLUE, clue_obj.dict(),
+                                         return_data=True)
+        return result[0][0] if result else None
+
+    async def add_clues_bulk(self, clues: list[Clue]) -> int:
+        """
+        Adds many clues in one transaction through a COPY into a staging
+        table.
+        Returns:
+            int - the number of clues inserted
+        """
+        if not clues:
+            return 0
+        async with self.pool.connection() as connection, \
+                connection.transaction(), connection.cursor() as cur:
+            await cur.execute(queries.CREATE_CLUES_STAGING)
+            async with cur.copy(queries.COPY_CLUES_STAGING) as copy:
+                for clue in clues:
+                    await copy.write_row(clue.row())
+            await cur.execute(queries.INSERT_CLUES_FROM_STAGING)
+            return cur.rowcount
+
+    async def get_clue_titles(self) -> list[tuple]:
+        """
+        Returns (clue_id, clue_text, movie title, title_leak) for every clue,
+        to classify them again
+        """
+        return await self._execute_sql(queries.SELECT_CLUE_TITLES,
+                                       return_data=True)
+
+    async def set_title_leaks(self, title_leaks: dict) -> int:
+        """
+        Stores the title_leak flag of many clues, given by clue_id, in one
+        transaction
+        Returns:
+            int - the number of clues updated
+        """
+        if not title_leaks:
+            return 0
+        async with self.pool.connection() as connection, \
+                connection.transaction(), connection.cursor() as cur:
+            await cur.executemany(queries.UPDATE_TITLE_LEAK,
+                                  [(title_leak, clue_id) for clue_id, title_leak
+                                   in title_leaks.items()])
+        return len(title_leaks)
+
+    async def add_guess(self, player_id: UUID, clue_id: UUID,
+                        guess_text: str, is_correct: bool,
+                        guessed_movie_id: UUID = None, game_id: UUID = None):
+        """
+        Adds new player guess to `guesses` table when a player makes a guess,
+        along with the clue they were looking at
+        """
+        await self._execute_sql(queries.INSERT_GUESS, {
+            'player_id': player_id, 'game_id': game_id, 'clue_id': clue_id,
+            'guess_text': guess_text, 'guessed_movie_id': guessed_movie_id,
+            'is_correct': is_correct})
+
+    async def add_player_clue(self, player_id: UUID, clue_id: UUID):
+        """
+        Records in `player_clues` that the player was shown this clue
+        """
+        await self._execute_sql(queries.INSERT_PLAYER_CLUE,
+                                [player_id, clue_id])
+
+    async def get_clue_guess_stats(self) -> list[tuple]:
+        """
+        Returns (clue_id, category_id, clue_text, wrong guesses, right
+        guesses) for every playable clue, counting the guesses made while
+        looking at that clue
+        """
+        return await self._execute_sql(queries.SELECT_CLUE_GUESS_STATS,
+                                       return_data=True)
+
+    async def set_clue_difficulties(self, difficulties: dict) -> int:
+        """
+        Stores the difficulty of many clues, given by clue_id, in one
+        transaction
+        Returns:
+            int - the number of clues updated
+        """
+        if not difficulties:
+            return 0
+        async with self.pool.connection() as connection, \
+                connection.transaction(), connection.cursor() as cur:
+            await cur.executemany(queries.UPDATE_CLUE_DIFFICULTY,
+                                  [(difficulty, clue_id) for clue_id, difficulty
+                                   in difficulties.items()])
+        return len(difficulties)
+
+    async def get_guide_hashes(self) -> dict:
+        """
+        Returns the stored parental guide hash of every movie by imdb_id
+        """
+        return dict(await self._execute_sql(queries.SELECT_GUIDE_HASHES,
+                                            return_data=True))
+
+    async def set_guide_hash(self, movie_id: UUID, guide_hash: str):
+        """
+        Records the content hash of the parental guide stored for a movie
+        """
+        await self._execute_sql(queries.UPDATE_GUIDE_HASH,
+                                [guide_hash, movie_id])
+
+    async def get_categories(self):
+        """
+        Gets all data from categories table and returns it as a list of dicts
+        """
+        return await self._execute_sql(queries.SELECT_CATEGORIES,
+                                       row_factory=dict_row, return_data=True)
+
+    async def get_movie_by_imdb_id(self, imdb_id):
+        """
+        Returns the Movie with the provided IMDb ID, or None
+        """
+        records = await self._execute_sql(queries.SELECT_MOVIE_BY_IMDB_ID,
+                                          [imdb_id],
+                                          row_factory=class_row(Movie),
+                                          return_data=True)
+        return records[0] if records else None
+
+    async def get_movie_by_movie_id(self, movie_id):
+        """
+        Returns the Movie with the provided movie_id, or None
+        """
+        records = await self._execute_sql(queries.SELECT_MOVIE_BY_MOVIE_ID,
+                                          [movie_id],
+                                          row_factory=class_row(Movie),
+                                          return_data=True)
+        return records[0] if records else None
+
+    async def get_three_movie_options(self, player_id: UUID = None):
+        """
+        Picks three random movies from distinct release years using the
+        in-process MovieSampler, skipping movies the player already played
+        Returns:
+            list[dict] - movie_id and release_year of each option
+        """
+        if self.movie_sampler.is_stale():
+            self.movie_sampler.load(await self._execute_sql(
+                queries.SELECT_MOVIE_YEARS, return_data=True))
+        played = await self.get_played_movie_ids(player_id) \
+            if player_id else None
+        return self.movie_sampler.sample(3, played)
+
+    async def match_title(self, stripped_guess: str, prefer: UUID = None):
+        """
+        Returns the movie_id whose title or alternate title is closest to a
+        guess passed through strip_text(), or None, using the in-process
+        TitleMatcher reloaded from `movies` and `alternate_titles` when it
+        is stale. Among equally close movies, `prefer` wins.
+        """
+        if self.title_matcher.is_stale():
+            self.title_matcher.load(await self._execute_sql(
+                queries.SELECT_MOVIE_TITLES, return_data=True))
+        return self.title_matcher.match(stripped_guess, prefer)
+
+    async def complete_titles(self, prefix: str, limit: int = 10,
+                              include_years: bool = False) -> list[dict]:
+        """
+        Suggests up to `limit` titles starting with what the player typed,
+        using the in-process TitleCompleter reloaded from `movies` and
+        `alternate_titles` when it is stale, so typing never queries the
+        database. See TitleCompleter.complete().
+        Returns:
+            list[dict] - title, and release_year with `include_years`
+        """
+        if self.title_completer.is_stale():
+            self.title_completer.load(await self._execute_sql(
+                queries.SELECT_TITLE_SUGGESTIONS, return_data=True))
+        return self.title_completer.complete(strip_text(prefix), limit,
+                                             include_years)
+
+    async def add_alternate_title(self, movie_id: UUID, title: str):
+        """
+        Adds another title a movie may be guessed as, such as its original
+        or international title
+        """
+        await self._execute_sql(queries.INSERT_ALTERNATE_TITLE,
+                                [movie_id, title, strip_text(title)])
+        self.title_matcher.invalidate()
+        self.title_completer.invalidate()
+
+    async def get_played_movie_ids(self, player_id: UUID) -> set:
+        """
+        Returns the set of movie ids the player has played
+        """
+        played = self.played_movies.get(player_id)
+        if played is None:
+            records = await self._execute_sql(queries.SELECT_PLAYER_MOVIES,
+                                              [player_id], return_data=True)
+            played = self.played_movies.put(player_id,
+                                            (row[0] for row in records))
+        return played
+
+    async def add_player_movie(self, player_id: UUID, movie_id: UUID):
+        """
+        Records in `player_movies` that the player was given this movie
+        """
+        try:
+            await self._execute_sql(queries.INSERT_PLAYER_MOVIE,
+                                    [player_id, movie_id])
+        except errors.ForeignKeyViolation as err:
+            print(f'Not recording movie for unknown player {player_id}')
+            print(err)
+            return
+        self.played_movies.add(player_id, movie_id)
+
+    async def get_round_packs(self, movie_ids) -> dict:
+        """
+        Fetches several movies and all of their playable clues in a single
+        query, so the options offered to a player can be played without
+        further round trips.
+        Returns:
+            dict - RoundPack by movie_id, for the movies that exist
+        """
+        records = await self._execute_sql(queries.SELECT_ROUND_PACKS,
+                                          [list(movie_ids)], return_data=True,
+                                          prepare=True)
+        return RoundPack.from_records(records)
+
+    async def load_round(self, movie_id: UUID):
+        """
+        Loads everything needed to play a movie, the movie, its clues and the
+        display names of their categories, with one prepared statement.
+        Returns:
+            RoundPack - or None if there is no such movie
+        """
+        return (await self.get_round_packs([movie_id])).get(movie_id)
+
+    async def get_catalogue_records(self) -> list[tuple]:
+        """
+        Selects every movie with playable clues together with those clues,
+        ordered by movie, to build a Catalogue from in one query
+        """
+        return await self._execute_sql(queries.SELECT_CATALOGUE,
+                                       return_data=True)
+
+    async def get_movies(self) -> list[Movie]:
+        """
+        Selects every movie from `movies` table.
+        Returns a list of Movie objects.
+        """
+        return await self._execute_sql(queries.SELECT_MOVIES,
+                                       return_data=True,
+                                       row_factory=class_row(Movie))
+
+    async def get_clues(self) -> list[Clue]:
+        """
+        Selects every clue from `clues` table, playable or not.
+        Returns a list of Clue objects.
+        """
+        return await self._execute_sql(queries.SELECT_CLUES,
+                                       return_data=True,
+                                       row_factory=class_row(Clue))
+
+    async def get_clues_by_movie_id(self, movie_id: UUID):
+        """
+        Selects all clues for a given movie id from `clues` table.
+        Returns a list of Clue objects.
+        """
+        return await self._execute_sql(queries.SELECT_CLUES_BY_MOVIE_ID,
+                                       [movie_id],
+                                       row_factory=class_row(Clue),
+                                       return_data=True)
+
+    async def get_player_by_username(self, player: Player):
+        """
+        Selects a player by username from `players` table.
+        Returns a Player object.
+        """
+        records = await self._execute_sql(queries.SELECT_PLAYER_BY_USERNAME,
+                                          [player.username],
+                                          row_factory=class_row(Player),
+                                          return_data=True)
+        return records[0]
+
+    async def get_game_state(self, state_key: str):
+        """
+        Selects a serialized game state from `game_states`.
+        Returns:
+            tuple - (state bytes, version), or None if there is none
+        """
+        records = await self._execute_sql(queries.SELECT_GAME_STATE,
+                                          [state_key], return_data=True)
+        return (bytes(records[0][0]), records[0][1]) if records else None
+
+    async def save_game_state(self, state_key: str, state: bytes,
+                              version: int):
+        """
+        Stores a serialized game state if the stored version still matches
+        `version`, 0 meaning no state was stored yet.
+        Returns:
+            int - the new version, or None if another writer got there first
+        """
+        if version:
+            records = await self._execute_sql(queries.UPDATE_GAME_STATE,
+                                              [state, state_key, version],
+                                              return_data=True)
+        else:
+            records = await self._execute_sql(queries.INSERT_GAME_STATE,
+                                              [state_key, state],
+                                              return_data=True)
+        return records[0][0] if records else None
+
+    async def delete_game_state(self, state_key: str):
+        """
+        Deletes a game state from `game_states`
+        """
+        await self._execute_sql(queries.DELETE_GAME_STATE, [state_key])
+
+    async def delete_expired_game_states(self, max_age: float):
+        """
+        Deletes game states not updated in the last `max_age` seconds
+        """
+        await self._execute_sql(queries.DELETE_EXPIRED_GAME_STATES, [max_age])
@@ -0,0 +1,223 @@
+"""
+In-process read-through cache for data that only changes when the scraper
+runs: movies, clues and categories
+"""
+import threading
+import time
+from collections import OrderedDict
+from .dataclasses import RoundPack
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache of at most `max_size` entries, each
+    expiring `ttl` seconds after it was stored (never, if ttl is None).
+    Counts hits and misses for get_or_load().
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by clear() so loads that raced an invalidation aren't stored
+        self._generation = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def generation(self) -> int:
+        """
+        Counter bumped by every clear(), to pass to put() after a load
+        """
+        return self._generation
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value for key, or default if it is missing or
+        expired
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value, generation: int = None):
+        """
+        Stores a value, evicting the least recently used entries when full.
+        If `generation` is given and the cache was cleared since, the value is
+        dropped as it may be stale.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None \
+            else None
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """
+        Returns the cached value for key, calling loader() and caching its
+        result on a miss. None results are not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        generation = self.generation
+        value = loader()
+        if value is not None:
+            self.put(key, value, generation)
+        return value
+
+    def clear(self):
+        """
+        Drops every entry
+        """
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        """
+        Returns hit, miss and size counters
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._data)}
+
+
+class CachedDBHandler:
+    """
+    Wraps a DBHandler so movies, clues and categories are read from memory
+    after the first query. Writes made through the wrapper clear the caches,
+    and with `listen` so does notify_catalogue_changed() from any process,
+    such as the scraper finishing a run. Everything else is passed through to
+    the wrapped handler.
+    """
+
+    def __init__(self, database, max_size: int = 4096, ttl: float = 3600.0,
+                 listen: bool = False):
+        self.database = database
+        self.movies = LRUCache(max_size, ttl)
+        self.clues = LRUCache(max_size, ttl)
+        # Round packs only hold playable clues, so they aren't shared with
+        # the full clue lists above
+        self.packs = LRUCache(max_size, ttl)
+        self.categories = LRUCache(1, ttl)
+        if listen:
+            database.listen_for_catalogue_changes(self.invalidate)
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    def invalidate(self):
+        """
+        Drops every cached movie, clue list, round pack and category, and
+        marks the wrapped handler's movie sampler and title indexes as stale
+        """
+        self.movies.clear()
+        self.clues.clear()
+        self.packs.clear()
+        self.categories.clear()
+        self.database.movie_sampler.invalidate()
+        self.database.title_matcher.invalidate()
+        self.database.title_completer.invalidate()
+
+    def cache_stats(self) -> dict:
+        """
+        Returns hit/miss counters of each cache
+        """
+        return {'movies': self.movies.stats(), 'clues': self.clues.stats(),
+                'packs': self.packs.stats(),
+                'categories': self.categories.stats()}
+
+    def get_categories(self):
+        """
+        Returns the cached categories list
+        """
+        return self.categories.get_or_load(None, self.database.get_categories)
+
+    def get_movie_by_movie_id(self, movie_id):
+        """
+        Returns the cached Movie for a movie_id
+        """
+        return self.movies.get_or_load(
+            movie_id, lambda: self.database.get_movie_by_movie_id(movie_id))
+
+    def get_clues_by_movie_id(self, movie_id):
+        """
+        Returns a new list of the cached clues for a movie_id, which the
+        caller may consume freely
+        """
+        return list(self.clues.get_or_load(
+            movie_id, lambda: self.database.get_clues_by_movie_id(movie_id)))
+
+    def get_round_packs(self, movie_ids) -> dict:
+        """
+        Returns a RoundPack by movie_id from the cache, loading the movies
+        missing from it in one query and caching them. Each RoundPack has
+        its own list of clues, which the caller may consume freely.
+        """
+        packs = {}
+        missing = []
+        for movie_id in movie_ids:
+            pack = self.packs.get(movie_id)
+            if pack is None:
+                missing.append(movie_id)
+            else:
+                packs[movie_id] = pack
+        self.packs.hits += len(packs)
+        self.packs.misses += len(missing)
+        if missing:
+            generation = self.packs.generation
+            for movie_id, pack in \
+                    self.database.get_round_packs(missing).items():
+                self.packs.put(movie_id, pack, generation)
+                packs[movie_id] = pack
+        return {movie_id: RoundPack(pack.movie, list(pack.clues),
+                                    dict(pack.category_names))
+                for movie_id, pack in packs.items()}
+
+    def load_round(self, movie_id):
+        """
+        Returns the RoundPack of a movie from the caches, or loads it with
+        one query
+        """
+        return self.get_round_packs([movie_id]).get(movie_id)
+
+    def add_movie(self, movie_object):
+        movie_id = self.database.add_movie(movie_object)
+        self.invalidate()
+        return movie_id
+
+    def add_movies_bulk(self, movies):
+        movie_ids = self.database.add_movies_bulk(movies)
+        self.invalidate()
+        return movie_ids
+
+    def add_clue(self, clue_obj):
+        clue_id = self.database.add_clue(clue_obj)
+        self.clues.clear()
+        self.packs.clear()
+        return clue_id
+
+    def add_clues_bulk(self, clues):
+        inserted = self.database.add_clues_bulk(clues)
+        self.clues.clear()
+        self.packs.clear()
+        return inserted
@@ -0,0 +1,377 @@
+"""
+Read-only in-memory copy of every playable movie and clue, so rounds are
+served without querying the database
+"""
+import math
+import os
+import tempfile
+import threading
+from array import array
+from datetime import datetime, timedelta
+from uuid import UUID
+
+import msgpack
+
+from .corpus import MappedCorpus, is_corpus
+from .dataclasses import Clue, Movie, RoundPack
+from .sampler import MovieSampler
+
+SNAPSHOT_VERSION: int = 1
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Stands for a NULL date_created in the dates column
+_NO_DATE: int = -2 ** 63
+
+
+def _column(typecode: str, values) -> memoryview:
+    """
+    Returns values packed in an array, behind a read-only memoryview
+    """
+    return memoryview(array(typecode, values)).toreadonly()
+
+
+def _column_from_bytes(typecode: str, data: bytes) -> memoryview:
+    column = array(typecode)
+    column.frombytes(data)
+    return memoryview(column).toreadonly()
+
+
+class Catalogue:
+    """
+    Immutable snapshot of the playable movies, their playable clues and the
+    clue categories, stored column by column: the fixed-width fields of all
+    movies or clues sit in one array each, and the clues of movie i are
+    clues[clue_offsets[i]:clue_offsets[i + 1]]. Nothing changes after
+    construction, so a new version is published by swapping the whole
+    object, never by updating it.
+    Built from the rows of SELECT_CATALOGUE with from_records(), or from a
+    file written by save() with load().
+    """
+
+    def __init__(self, movie_ids, imdb_ids, titles, stripped_titles,
+                 release_years, clue_offsets, clue_ids, category_ids,
+                 clue_texts, dates_created, difficulties, categories):
+        self.movie_ids: tuple = tuple(movie_ids)
+        self.imdb_ids: tuple = tuple(imdb_ids)
+        self.titles: tuple = tuple(titles)
+        self.stripped_titles: tuple = tuple(stripped_titles)
+        self.release_years: memoryview = release_years
+        self.clue_offsets: memoryview = clue_offsets
+        self.clue_ids: tuple = tuple(clue_ids)
+        self.category_ids: memoryview = category_ids
+        self.clue_texts: tuple = tuple(clue_texts)
+        # Microseconds since 1970, _NO_DATE for NULL
+        self.dates_created: memoryview = dates_created
+        # NaN for clues that haven't been scored
+        self.difficulties: memoryview = difficulties
+        self.categories: tuple = tuple(categories)
+        self._movie_index = {movie_id: index for index, movie_id
+                             in enumerate(self.movie_ids)}
+        self._category_names = {category['category_id']:
+                                category['display_name']
+                                for category in self.categories}
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __contains__(self, movie_id):
+        return movie_id in self._movie_index
+
+    @property
+    def clue_count(self) -> int:
+        return len(self.clue_ids)
+
+    @classmethod
+    def from_records(cls, records, categories):
+        """
+        Builds a Catalogue from (movie_id, imdb_id, title, stripped_title,
+        release_year, clue_id, category_id, clue_text, date_created,
+        difficulty) rows ordered by movie and then clue_order(), as
+        SELECT_CATALOGUE returns them, and the category dicts
+        """
+        movies, clue_offsets = [], []
+        clue_ids, category_ids, clue_texts = [], [], []
+        dates_created, difficulties = [], []
+        for (movie_id, imdb_id, title, stripped_title, release_year, clue_id,
+             category_id, clue_text, date_created, difficulty) in records:
+            if not movies or movies[-1][0] != movie_id:
+                movies.append((movie_id, imdb_id, title, stripped_title,
+                               release_year))
+                clue_offsets.append(len(clue_ids))
+            clue_ids.append(clue_id)
+            category_ids.append(category_id)
+            clue_texts.append(clue_text)
+            dates_created.append(_NO_DATE if date_created is None else
+                                 (date_created - _EPOCH) // _MICROSECOND)
+            difficulties.append(math.nan if difficulty is None
+                                else difficulty)
+        clue_offsets.append(len(clue_ids))
+        movie_ids, imdb_ids, titles, stripped_titles, release_years = \
+            zip(*movies) if movies else ((),) * 5
+        return cls(movie_ids, imdb_ids, titles, stripped_titles,
+                   _column('H', release_years), _column('I', clue_offsets),
+                   clue_ids, _column('H', category_ids), clue_texts,
+                   _column('q', dates_created), _column('f', difficulties),
+                   [dict(category) for category in categories])
+
+    @classmethod
+    def from_database(cls, database_handler):
+        """
+        Loads a Catalogue with one query for the movies and clues and one for
+        the categories
+        """
+        return cls.from_records(database_handler.get_catalogue_records(),
+                                database_handler.get_categories())
+
+    def movie_years(self) -> list[tuple]:
+        """
+        Returns (movie_id, release_year) of every movie, for MovieSampler
+        """
+        return list(zip(self.movie_ids, self.release_years))
+
+    def get_movie(self, movie_id: UUID):
+        """
+        Returns a new Movie for movie_id, or None
+        """
+        index = self._movie_index.get(movie_id)
+        if index is None:
+            return None
+        return Movie(imdb_id=self.imdb_ids[index], title=self.titles[index],
+                     stripped_title=self.stripped_titles[index],
+                     release_year=self.release_years[index],
+                     movie_id=movie_id)
+
+    def get_round_pack(self, movie_id: UUID):
+        """
+        Returns a new RoundPack with the movie and its playable clues, or
+        None if the movie isn't in the catalogue
+        """
+        movie = self.get_movie(movie_id)
+        if movie is None:
+            return None
+        index = self._movie_index[movie_id]
+        pack = RoundPack(movie)
+        for position in range(self.clue_offsets[index],
+                              self.clue_offsets[index + 1]):
+            category_id = self.category_ids[position]
+            date_created = self.dates_created[position]
+            difficulty = self.difficulties[position]
+            pack.clues.append(Clue(
+                movie_id=movie_id, category_id=category_id,
+                clue_text=self.clue_texts[position], spoiler=False,
+                date_created=None if date_created == _NO_DATE else
+                _EPOCH + date_created * _MICROSECOND,
+                clue_id=self.clue_ids[position],
+                difficulty=None if math.isnan(difficulty) else difficulty))
+            pack.category_names[category_id] = \
+                self._category_names[category_id]
+        return pack
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the catalogue to msgpack, with the array columns as raw
+        bytes and UUIDs as 16 bytes each
+        """
+        return msgpack.packb([
+            SNAPSHOT_VERSION,
+            b''.join(movie_id.bytes for movie_id in self.movie_ids),
+            self.imdb_ids, self.titles, self.stripped_titles,
+            self.release_years.tobytes(), self.clue_offsets.tobytes(),
+            b''.join(clue_id.bytes for clue_id in self.clue_ids),
+            self.category_ids.tobytes(), self.clue_texts,
+            self.dates_created.tobytes(), self.difficulties.tobytes(),
+            self.categories])
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """
+        Rebuilds a Catalogue from bytes made by to_bytes()
+        Raises:
+            ValueError - if the bytes come from another snapshot version
+        """
+        (version, movie_ids, imdb_ids, titles, stripped_titles,
+         release_years, clue_offsets, clue_ids, category_ids, clue_texts,
+         dates_created, difficulties, categories) = msgpack.unpackb(data)
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported catalogue snapshot version '
+                             f'{version}')
+        return cls([UUID(bytes=movie_ids[start:start + 16])
+                    for start in range(0, len(movie_ids), 16)],
+                   imdb_ids, titles, stripped_titles,
+                   _column_from_bytes('H', release_years),
+                   _column_from_bytes('I', clue_offsets),
+                   [UUID(bytes=clue_ids[start:start + 16])
+                    for start in range(0, len(clue_ids), 16)],
+                   _column_from_bytes('H', category_ids), clue_texts,
+                   _column_from_bytes('q', dates_created),
+                   _column_from_bytes('f', difficulties), categories)
+
+    def save(self, path: str):
+        """
+        Writes the catalogue to a snapshot file, replacing it atomically so
+        readers never see a partly written snapshot
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+            file.write(self.to_bytes())
+        os.replace(file.name, path)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads a snapshot file written by save()
+        """
+        with open(path, 'rb') as file:
+            return cls.from_bytes(file.read())
+
+
+def load_snapshot(path: str):
+    """
+    Opens a snapshot file: a clue corpus file is memory-mapped as a
+    MappedCorpus, anything else is read as a Catalogue
+    """
+    if is_corpus(path):
+        return MappedCorpus(path)
+    return Catalogue.load(path)
+
+
+def _file_version(path: str):
+    """
+    Returns what changes when a file is replaced, or None if it is missing
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+class CatalogueDBHandler:
+    """
+    Wraps a DBHandler so movie options, round packs and categories are
+    served from an in-memory Catalogue, loaded when the handler is created:
+    from `snapshot_path` if that file exists, otherwise from the database.
+    The snapshot may be a clue corpus file, which is memory-mapped instead so
+    worker processes share it. A replaced corpus is never closed here: it
+    stays mapped while any request still holds it and is unmapped when the
+    last reference goes away.
+    reload() builds the new version off to the side and swaps it in with a
+    single assignment, so requests see either the old or the new version,
+    never a mix. While the snapshot file exists only a replaced file is
+    loaded, the database is read only when there is no snapshot. With
+    `listen`, it runs whenever notify_catalogue_changed() is called from any
+    process, such as the scraper publishing a new snapshot.
+    Movies and clues written through the wrapper are picked up by the next
+    read, or with a snapshot, once a new one is published. Everything else
+    is passed through to the wrapped handler.
+    """
+
+    def __init__(self, database, snapshot_path: str = None,
+                 listen: bool = False):
+        self.database = database
+        self.snapshot_path = snapshot_path
+        self._reload_lock = threading.Lock()
+        self._stale = False
+        self._snapshot_version = _file_version(snapshot_path) \
+            if snapshot_path else None
+        if self._snapshot_version:
+            self._publish(load_snapshot(snapshot_path))
+        else:
+            self._publish(Catalogue.from_database(database))
+        if listen:
+            database.listen_for_catalogue_changes(self.reload)
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    @property
+    def catalogue(self):
+        return self._state()[0]
+
+    def _state(self) -> tuple:
+        if self._stale:
+            self.reload()
+        return self._current
+
+    def _publish(self, catalogue):
+        sampler = MovieSampler()
+        sampler.load(catalogue.movie_years())
+        # One assignment, so the catalogue and its sampler change together
+        self._current = (catalogue, sampler)
+
+    def reload(self):
+        """
+        Swaps in the snapshot file if it was replaced, or without a snapshot
+        file a new Catalogue from the database, and marks the wrapped
+        handler's title indexes as stale
+        """
+        with self._reload_lock:
+            self._stale = False
+            version = _file_version(self.snapshot_path) \
+                if self.snapshot_path else None
+            if version:
+                if version != self._snapshot_version:
+                    self._snapshot_version = version
+                    self._publish(load_snapshot(self.snapshot_path))
+            else:
+                self._publish(Catalogue.from_database(self.database))
+        self.database.movie_sampler.invalidate()
+        self.database.title_matcher.invalidate()
+        self.database.title_completer.invalidate()
+
+    def get_categories(self):
+        """
+        Returns the categories of the catalogue
+        """
+        return list(self.catalogue.categories)
+
+    def get_three_movie_options(self, player_id: UUID = None):
+        """
+        Picks three random movies of the catalogue from distinct release
+        years, skipping movies the player already played while unplayed ones
+        remain
+        Returns:
+            list[dict] - movie_id and release_year of each option
+        """
+        played = self.database.get_played_movie_ids(player_id) \
+            if player_id else None
+        return self._state()[1].sample(3, played)
+
+    def get_round_packs(self, movie_ids) -> dict:
+        """
+        Returns a RoundPack by movie_id, for the movies in the catalogue
+        """
+        catalogue = self.catalogue
+        packs = {}
+        for movie_id in movie_ids:
+            pack = catalogue.get_round_pack(movie_id)
+            if pack is not None:
+                packs[movie_id] = pack
+        return packs
+
+    def load_round(self, movie_id: UUID):
+        """
+        Returns the RoundPack of a movie, or None if it isn't in the
+        catalogue
+        """
+        return self.catalogue.get_round_pack(movie_id)
+
+    def add_movie(self, movie_object):
+        movie_id = self.database.add_movie(movie_object)
+        self._stale = True
+        return movie_id
+
+    def add_movies_bulk(self, movies):
+        movie_ids = self.database.add_movies_bulk(movies)
+        self._stale = True
+        return movie_ids
+
+    def add_clue(self, clue_obj):
+        clue_id = self.database.add_clue(clue_obj)
+        self._stale = True
+        return clue_id
+
+    def add_clues_bulk(self, clues):
+        inserted = self.database.add_clues_bulk(clues)
+        self._stale = True
+        return inserted
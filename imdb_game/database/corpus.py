@@ -0,0 +1,287 @@
+"""
+Binary clue corpus file, memory-mapped read-only so every worker process on
+a host shares one copy of the movies and clues in the page cache instead of
+each holding its own Python objects
+"""
+import math
+import mmap
+import os
+import struct
+import tempfile
+from datetime import datetime, timedelta
+from uuid import UUID
+
+from .dataclasses import Clue, Movie, RoundPack, clue_order
+
+CORPUS_MAGIC: bytes = b'IMDBCRPS'
+CORPUS_VERSION: int = 1
+# Clue flags
+SPOILER: int = 1
+TITLE_LEAK: int = 2
+
+# All little-endian, in file order after the header: one record per movie
+# sorted by movie_id, one per clue grouped by movie, one per category, then
+# the UTF-8 heap every offset points into
+# magic, version, movie count, clue count, category count
+HEADER = struct.Struct('<8sIIII')
+# movie_id, imdb_id offset, title offset, stripped_title offset, first clue,
+# clue count, playable clue count, release_year, imdb_id length, title
+# length, stripped_title length
+MOVIE = struct.Struct('<16sIIIIIIHHHH')
+# clue_id, date_created in microseconds since 1970, movie index, clue_text
+# offset, difficulty (NaN if unscored), clue_text length, category_id, flags
+CLUE = struct.Struct('<16sqIIfIHB')
+# display_name offset, short_name offset, category_id, display_name length,
+# short_name length
+CATEGORY = struct.Struct('<IIHHH')
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Stands for a NULL date_created
+_NO_DATE: int = -2 ** 63
+
+
+class _Heap:
+    """
+    Collects the strings of a corpus while it is written
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def add(self, text: str) -> tuple:
+        """
+        Appends text and returns its (offset, length) in bytes
+        """
+        data = (text or '').encode('utf-8')
+        offset = self.size
+        self.chunks.append(data)
+        self.size += len(data)
+        return offset, len(data)
+
+
+def write_corpus(path: str, movies, clues, categories):
+    """
+    Writes Movie and Clue objects, such as from DBHandler.get_movies() and
+    get_clues() or from the CSV exports, and the category dicts to a corpus
+    file, the clues of each movie in clue_order(). The file is replaced
+    atomically: workers that already mapped the old one keep reading it
+    until they map the new one.
+    """
+    movies = sorted(movies, key=lambda movie: movie.movie_id.bytes)
+    movie_index = {movie.movie_id: index for index, movie in enumerate(movies)}
+    clues_by_movie = [[] for _ in movies]
+    for clue in clues:
+        clues_by_movie[movie_index[clue.movie_id]].append(clue)
+    for movie_clues in clues_by_movie:
+        movie_clues.sort(key=clue_order)
+    heap = _Heap()
+    movie_records, clue_records, category_records = [], [], []
+    for index, movie in enumerate(movies):
+        imdb_offset, imdb_length = heap.add(movie.imdb_id)
+        title_offset, title_length = heap.add(movie.title)
+        stripped_offset, stripped_length = heap.add(movie.stripped_title)
+        movie_clues = clues_by_movie[index]
+        playable = sum(not clue.spoiler and not clue.title_leak
+                       for clue in movie_clues)
+        movie_records.append(MOVIE.pack(
+            movie.movie_id.bytes, imdb_offset, title_offset, stripped_offset,
+            len(clue_records), len(movie_clues), playable, movie.release_year,
+            imdb_length, title_length, stripped_length))
+        for clue in movie_clues:
+            text_offset, text_length = heap.add(clue.clue_text)
+            clue_records.append(CLUE.pack(
+                clue.clue_id.bytes,
+                _NO_DATE if clue.date_created is None else
+                (clue.date_created - _EPOCH) // _MICROSECOND,
+                index, text_offset,
+                math.nan if clue.difficulty is None else clue.difficulty,
+                text_length, clue.category_id,
+                (SPOILER if clue.spoiler else 0) |
+                (TITLE_LEAK if clue.title_leak else 0)))
+    for category in categories:
+        display_offset, display_length = heap.add(category['display_name'])
+        short_offset, short_length = heap.add(category['short_name'])
+        category_records.append(CATEGORY.pack(
+            display_offset, short_offset, category['category_id'],
+            display_length, short_length))
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(HEADER.pack(CORPUS_MAGIC, CORPUS_VERSION,
+                               len(movie_records), len(clue_records),
+                               len(category_records)))
+        for records in (movie_records, clue_records, category_records,
+                        heap.chunks):
+            file.writelines(records)
+    os.replace(file.name, path)
+
+
+def is_corpus(path: str) -> bool:
+    """
+    Returns True if the file at path starts like a corpus file
+    """
+    with open(path, 'rb') as file:
+        return file.read(len(CORPUS_MAGIC)) == CORPUS_MAGIC
+
+
+class MappedCorpus:
+    """
+    Read-only view of a corpus file written by write_corpus(). The file is
+    memory-mapped and records are decoded on demand, so opening it costs the
+    same however many clues it holds, and the pages are shared by every
+    process mapping the same file.
+    Serves the same lookups as a Catalogue, so CatalogueDBHandler can use
+    either one. Only playable clues, neither spoilers nor title leaks, are
+    handed out in round packs.
+    Raises:
+        ValueError - if the file isn't a corpus of this version, or is cut
+            short
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if len(self._view) < HEADER.size:
+            raise ValueError(f'{path} is not a clue corpus')
+        magic, version, self._movie_count, self._clue_count, \
+            category_count = HEADER.unpack_from(self._view)
+        if magic != CORPUS_MAGIC:
+            raise ValueError(f'{path} is not a clue corpus')
+        if version != CORPUS_VERSION:
+            raise ValueError(f'Unsupported clue corpus version {version}')
+        self._movies_start = HEADER.size
+        self._clues_start = self._movies_start + \
+            self._movie_count * MOVIE.size
+        categories_start = self._clues_start + self._clue_count * CLUE.size
+        self._heap_start = categories_start + category_count * CATEGORY.size
+        if len(self._view) < self._heap_start:
+            raise ValueError(f'{path} is cut short')
+        self.categories: tuple = tuple(
+            self._category(categories_start + index * CATEGORY.size)
+            for index in range(category_count))
+        self._category_names = {category['category_id']:
+                                category['display_name']
+                                for category in self.categories}
+
+    def __len__(self):
+        return self._movie_count
+
+    def __contains__(self, movie_id):
+        return self._find(movie_id) is not None
+
+    def close(self):
+        """
+        Unmaps the file, after which the corpus can't be read anymore. Only
+        for a caller that knows nothing else reads it, otherwise dropping the
+        last reference unmaps it just the same.
+        """
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            # A lookup still holds a slice, the mapping is freed along with it
+            pass
+
+    @property
+    def clue_count(self) -> int:
+        return self._clue_count
+
+    def _text(self, offset: int, length: int) -> str:
+        start = self._heap_start + offset
+        return str(self._view[start:start + length], 'utf-8')
+
+    def _category(self, position: int) -> dict:
+        display_offset, short_offset, category_id, display_length, \
+            short_length = CATEGORY.unpack_from(self._view, position)
+        return {'category_id': category_id,
+                'display_name': self._text(display_offset, display_length),
+                'short_name': self._text(short_offset, short_length)}
+
+    def _movie(self, index: int) -> tuple:
+        return MOVIE.unpack_from(self._view,
+                                 self._movies_start + index * MOVIE.size)
+
+    def _find(self, movie_id: UUID):
+        """
+        Returns the index of a movie by binary search over the sorted ids,
+        or None
+        """
+        if not isinstance(movie_id, UUID):
+            return None
+        target = movie_id.bytes
+        low, high = 0, self._movie_count
+        while low < high:
+            middle = (low + high) // 2
+            position = self._movies_start + middle * MOVIE.size
+            found = bytes(self._view[position:position + 16])
+            if found == target:
+                return middle
+            if found < target:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def movie_years(self) -> list[tuple]:
+        """
+        Returns (movie_id, release_year) of every movie with playable clues,
+        for MovieSampler
+        """
+        years = []
+        for index in range(self._movie_count):
+            record = self._movie(index)
+            if record[6]:
+                years.append((UUID(bytes=record[0]), record[7]))
+        return years
+
+    def get_movie(self, movie_id: UUID):
+        """
+        Returns a new Movie for movie_id, or None
+        """
+        index = self._find(movie_id)
+        if index is None:
+            return None
+        return self._movie_object(self._movie(index))
+
+    def _movie_object(self, record: tuple) -> Movie:
+        (movie_id, imdb_offset, title_offset, stripped_offset, _, _, _,
+         release_year, imdb_length, title_length, stripped_length) = record
+        return Movie(imdb_id=self._text(imdb_offset, imdb_length),
+                     title=self._text(title_offset, title_length),
+                     stripped_title=self._text(stripped_offset,
+                                               stripped_length),
+                     release_year=release_year, movie_id=UUID(bytes=movie_id))
+
+    def get_round_pack(self, movie_id: UUID):
+        """
+        Returns a new RoundPack with the movie and its playable clues, or
+        None if the movie isn't in the corpus
+        """
+        index = self._find(movie_id)
+        if index is None:
+            return None
+        record = self._movie(index)
+        pack = RoundPack(self._movie_object(record))
+        first_clue, clue_count = record[4], record[5]
+        for position in range(self._clues_start + first_clue * CLUE.size,
+                              self._clues_start +
+                              (first_clue + clue_count) * CLUE.size,
+                              CLUE.size):
+            (clue_id, date_created, _, text_offset, difficulty, text_length,
+             category_id, flags) = CLUE.unpack_from(self._view, position)
+            if flags & (SPOILER | TITLE_LEAK):
+                continue
+            pack.clues.append(Clue(
+                movie_id=pack.movie.movie_id, category_id=category_id,
+                clue_text=self._text(text_offset, text_length),
+                spoiler=False,
+                date_created=None if date_created == _NO_DATE else
+                _EPOCH + date_created * _MICROSECOND,
+                clue_id=UUID(bytes=clue_id),
+                difficulty=None if math.isnan(difficulty) else difficulty))
+            pack.category_names[category_id] = \
+                self._category_names[category_id]
+        return pack
@@ -1,13 +1,47 @@
 import random
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
+from itertools import groupby
+from operator import attrgetter
 from uuid import UUID
 
 from ..utils.utils import IMDB_ROOT, strip_text
 
 
-@dataclass
-class Movie:
+def _slotted(cls):
+    """
+    Makes cls a dataclass whose instances keep their fields in __slots__
+    instead of a per-instance __dict__, which is what dataclass(slots=True)
+    does from Python 3.10 on. Also gives the class a `_row` getter of every
+    field in declaration order, for _Record.row().
+    """
+    cls = dataclass(cls)
+    names = tuple(cls_field.name for cls_field in fields(cls))
+    namespace = dict(cls.__dict__)
+    for name in names + ('__dict__', '__weakref__'):
+        # Defaults were already captured by the generated __init__
+        namespace.pop(name, None)
+    namespace['__slots__'] = names
+    namespace['_row'] = attrgetter(*names)
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+class _Record:
+    """
+    Base of the slotted dataclasses below
+    """
+    __slots__ = ()
+
+    def row(self) -> tuple:
+        """
+        Returns the values of every field in declaration order, without
+        building a dict, such as for positional query parameters
+        """
+        return self._row(self)
+
+
+@_slotted
+class Movie(_Record):
     """
     SELECT imdb_id, title, stripped_title, release_year, imdb_id
     """
@@ -33,8 +67,8 @@ class Movie:
         return f'{IMDB_ROOT}/title/{self.imdb_id}'
 
 
-@dataclass
-class Clue:
+@_slotted
+class Clue(_Record):
     """
     Represents an IMDb user-submitted Parental Warning to be used as a clue for
     IMDb Game
@@ -45,6 +79,8 @@ class Clue:
     spoiler: bool
     date_created: datetime
     clue_id: UUID = None
+    title_leak: bool = False
+    difficulty: float = None
 
     def dict(self):
         return {
@@ -53,11 +89,14 @@ class Clue:
             'clue_text': self.clue_text,
             'spoiler': self.spoiler,
             'date_created': self.date_created,
-            'clue_id': self.clue_id
+            'clue_id': self.clue_id,
+            'title_leak': self.title_leak,
+            'difficulty': self.difficulty
         }
 
-@dataclass
-class Player:
+
+@_slotted
+class Player(_Record):
     """
     Represents a human player of IMDb Game
     """
@@ -66,7 +105,6 @@ class Player:
     date_created: datetime = None
     date_last_played: datetime = None
 
-
     def dict(self):
         return {
             'username': self.username,
@@ -76,12 +114,18 @@ class Player:
         }
 
 
-@dataclass
-class Round:
+@_slotted
+class Round(_Record):
     """
     Dataclass for a single round of IMDb Game, contains Movie and Clues,
-    as well as delivers random clues, and tracks clue point weight
+    as well as delivers clues hardest first, and tracks clue point weight.
+    The clue pool comes ordered by clue_order(), as round packs are. On the
+    first draw only the clues of equal difficulty are shuffled, by a
+    random.Random seeded by `seed`, so a round with the same seed and clues
+    replays the same clues in the same order.
     """
+    # Difficulty assumed for clues that haven't been scored yet
+    DEFAULT_DIFFICULTY = 0.5
     round_number: int
     current_movie: Movie
     clues_pool: list[Clue] = field(default_factory=list)
@@ -89,6 +133,8 @@ class Round:
     current_clue_number: int = 0
     total_clues: int = 5
     game_id: UUID = None
+    seed: int = None
+    shuffled: bool = False
 
     def dict(self):
         return {
@@ -97,7 +143,8 @@ class Round:
             'clues_pool': [clue.dict() for clue in self.clues_pool],
             'clues_played': [clue.dict() for clue in self.clues_played],
             'current_clue_number': self.current_clue_number,
-            'total_clues': self.total_clues
+            'total_clues': self.total_clues,
+            'seed': self.seed
         }
 
     def increment_clue_number(self):
@@ -112,13 +159,33 @@ class Round:
         """
         return self.current_clue_number + 1
 
+    def shuffle_clues(self):
+        """
+        Shuffles the clues_pool among equally difficult clues, keeping the
+        easiest to hardest order it comes in, so that draws can pop the
+        hardest clue off its end
+        """
+        rng = random.Random(self.seed)
+        shuffled = []
+        for _, group in groupby(self.clues_pool, key=self._difficulty):
+            group = list(group)
+            rng.shuffle(group)
+            shuffled.extend(group)
+        self.clues_pool = shuffled
+        self.shuffled = True
+
+    def _difficulty(self, clue: Clue) -> float:
+        return self.DEFAULT_DIFFICULTY if clue.difficulty is None \
+            else clue.difficulty
+
     def get_random_clue(self):
         """
-        Returns a random clue from the clues_pool. Does not account for
-        difficulty yet
+        Returns the hardest clue left in the clues_pool in constant time, by
+        popping the last clue of the pool ordered on the first draw
         """
-        clue = random.choice(self.clues_pool)
-        self.clues_pool.remove(clue)
+        if not self.shuffled:
+            self.shuffle_clues()
+        clue = self.clues_pool.pop()
         self.clues_played.append(clue)
         return clue
 
@@ -128,17 +195,60 @@ class Round:
         """
         return self.total_clues - self.current_clue_number
 
-    def remove_clues_with_movie_title(self):
+
+def clue_order(clue: Clue) -> tuple:
+    """
+    Sort key of the clues of a round: easiest first, unscored clues as
+    Round.DEFAULT_DIFFICULTY, then by clue_id. The same order as
+    SELECT_ROUND_PACKS and SELECT_CATALOGUE, so it is only applied to clues
+    from elsewhere.
+    """
+    return (Round.DEFAULT_DIFFICULTY if clue.difficulty is None
+            else clue.difficulty,
+            clue.clue_id.bytes if clue.clue_id else b'')
+
+
+@_slotted
+class RoundPack(_Record):
+    """
+    Everything needed to start a round with a movie: the movie, its playable
+    clues ordered by clue_order() and the display name of each clue
+    category, by category_id
+    """
+    movie: Movie
+    clues: list[Clue] = field(default_factory=list)
+    category_names: dict = field(default_factory=dict)
+
+    @staticmethod
+    def from_records(records) -> dict:
         """
-        Filter out Clue objects that contain the movie_title in their clue_text
+        Groups (movie columns..., clue columns..., category display name)
+        rows, as selected by SELECT_ROUND_PACKS, into a dict of RoundPack by
+        movie_id. Movies without clues come as a single row of NULL clue
+        columns.
         """
-        filtered_clues = [clue for clue in self.clues_pool if
-                          self.current_movie.title not in clue.clue_text]
-        self.clues_pool = filtered_clues
+        packs = {}
+        for (movie_id, imdb_id, title, stripped_title, release_year,
+             clue_id, category_id, clue_text, spoiler, date_created,
+             difficulty, display_name) in records:
+            pack = packs.get(movie_id)
+            if pack is None:
+                pack = packs[movie_id] = RoundPack(Movie(
+                    imdb_id=imdb_id, title=title,
+                    stripped_title=stripped_title, release_year=release_year,
+                    movie_id=movie_id))
+            if clue_id is not None:
+                pack.clues.append(Clue(
+                    movie_id=movie_id, category_id=category_id,
+                    clue_text=clue_text, spoiler=spoiler,
+                    date_created=date_created, clue_id=clue_id,
+                    difficulty=difficulty))
+                pack.category_names[category_id] = display_name
+        return packs
 
 
-@dataclass
-class Game:
+@_slotted
+class Game(_Record):
     """
     Object containing a single game metrics and statistics
     """
@@ -151,6 +261,8 @@ class Game:
     current_round: Round = None
     MAX_ROUNDS: int = 5
     GAME_OVER: bool = False
+    # movie_id and release_year of the movies offered for the next round
+    options: list[dict] = field(default_factory=list)
 
     # rounds: list = field(default_factory=list)
     def dict(self):
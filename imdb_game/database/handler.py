@@ -2,38 +2,139 @@
 Handles all database functions, configured for MongoDB connections
 """
 import os
+import select
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from psycopg import connect, ClientCursor, errors
 from psycopg.rows import dict_row, class_row, tuple_row
+from psycopg_pool import ConnectionPool
 import sys
 from uuid import UUID
 import time
-from .dataclasses import Movie, Clue, Game, Player
+from . import queries
+from .dataclasses import Movie, Clue, Game, Player, RoundPack
+from .sampler import MovieSampler, PlayedMovies
+from .titles import TitleCompleter, TitleMatcher
+from ..utils.utils import strip_text
 # from dotenv import load_dotenv
 #
 # load_dotenv('../../.env')
 
 
+class CatalogueListener:
+    """
+    Calls `callback` with no arguments whenever notify_catalogue_changed()
+    runs in any process, and once after every LISTEN, including the first,
+    since notifications sent while it wasn't listening are lost. Listens on a
+    dedicated connection in a daemon thread, reconnecting after
+    `retry_delay` seconds if it drops, until stop() is called.
+    """
+
+    def __init__(self, pg_url: str, callback, retry_delay: float = 5.0,
+                 poll_interval: float = 1.0):
+        self.pg_url = pg_url
+        self.callback = callback
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        # Set while the LISTEN is active
+        self.listening = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._listen,
+                                       name='catalogue-listener', daemon=True)
+        self.thread.start()
+
+    def _listen(self):
+        while not self.stopped.is_set():
+            try:
+                with connect(conninfo=self.pg_url,
+                             autocommit=True) as connection:
+                    connection.add_notify_handler(
+                        lambda notify: self.callback())
+                    connection.execute(queries.LISTEN_CATALOGUE_CHANGED)
+                    self.listening.set()
+                    self.callback()
+                    while not self.stopped.is_set():
+                        # Wakes up every poll_interval to check for stop()
+                        if select.select([connection], [], [],
+                                         self.poll_interval)[0]:
+                            # Notifications are handed to the handler above
+                            # while a query runs
+                            connection.execute(queries.POLL_NOTIFICATIONS)
+            except Exception as exc:
+                if not self.stopped.is_set():
+                    print(f'Lost catalogue listener connection: {exc}')
+            self.listening.clear()
+            self.stopped.wait(self.retry_delay)
+
+    def stop(self, timeout: float = None):
+        """
+        Stops listening and waits up to `timeout` seconds for the thread to
+        finish
+        """
+        self.stopped.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+
 class DBHandler:
     """
     Handles all Database actions for IMDb Game
     """
     _TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-    def __init__(self, pg_url: str = None) -> None:
+    def __init__(self, pg_url: str = None, use_pool: bool = False,
+                 pool_min_size: int = 1, pool_max_size: int = 10,
+                 pool_timeout: float = 30.0) -> None:
         """
-        Initializes the database handler
+        Initializes the database handler. By default all queries share one
+        connection, used by one thread at a time. With `use_pool`, every
+        query checks out its own connection from a pool of `pool_min_size` to
+        `pool_max_size` connections, waiting at most `pool_timeout` seconds,
+        so concurrent threads don't queue behind each other.
         """
         if not pg_url:
             pg_url = os.getenv('POSTGRES_URL')
-        self.connection = self._get_postgres_connection(pg_url)
+        self.pg_url = pg_url
+        self.connection = None
+        self.pool = None
+        self._lock = threading.RLock()
+        self.movie_sampler = MovieSampler()
+        self.title_matcher = TitleMatcher()
+        self.title_completer = TitleCompleter()
+        self.played_movies = PlayedMovies()
+        self.listeners = []
+        if use_pool:
+            self.pool = self._get_postgres_pool(pg_url, pool_min_size,
+                                                pool_max_size, pool_timeout)
+        else:
+            self.connection = self._get_postgres_connection(pg_url)
 
     def __del__(self):
         """
-        Closes the connection to the database
+        Closes the connection or pool to the database
         """
+        for listener in getattr(self, 'listeners', ()):
+            listener.stopped.set()
+        if getattr(self, 'connection', None):
+            self.connection.close()
+        if getattr(self, 'pool', None):
+            self.pool.close()
+
+    def close(self):
+        """
+        Stops the catalogue listeners and closes the connection or pool to
+        the database
+        """
+        for listener in self.listeners:
+            listener.stop()
+        self.listeners.clear()
         if self.connection:
             self.connection.close()
+            self.connection = None
+        if self.pool:
+            self.pool.close()
+            self.pool = None
 
     def _get_postgres_connection(self, pg_url: str):
         """
@@ -47,19 +148,73 @@ class DBHandler:
             sys.exit(1)
         return connection
 
+    def _get_postgres_pool(self, pg_url: str, min_size: int, max_size: int,
+                           timeout: float):
+        """
+        Accepts a postgresql URL and returns an open pool of autocommit
+        connections, which are checked for health before being handed out
+        """
+        try:
+            pool = ConnectionPool(conninfo=pg_url, min_size=min_size,
+                                  max_size=max_size, timeout=timeout,
+                                  kwargs={'autocommit': True},
+                                  check=ConnectionPool.check_connection,
+                                  name='imdb_game', open=False)
+            pool.open(wait=True, timeout=timeout)
+        except Exception as exc:
+            print(exc)
+            print('Failed to connect')
+            sys.exit(1)
+        return pool
+
+    @contextmanager
+    def _connect(self):
+        """
+        Yields a connection for the duration of a block of queries: a pooled
+        connection when a pool is configured, otherwise the shared connection
+        while holding it exclusively
+        """
+        if self.pool:
+            with self.pool.connection() as connection:
+                yield connection
+        else:
+            with self._lock:
+                yield self.connection
+
+    def notify_catalogue_changed(self):
+        """
+        Tells every process listening on the database that movies or clues
+        were written, so they can drop cached copies
+        """
+        self._execute_sql(queries.NOTIFY_CATALOGUE_CHANGED)
+
+    def listen_for_catalogue_changes(self, callback, retry_delay: float = 5.0):
+        """
+        Calls `callback` with no arguments whenever notify_catalogue_changed()
+        runs in any process, and after every (re)connection to resync. The
+        listener is stopped by close().
+        Returns:
+            CatalogueListener
+        """
+        listener = CatalogueListener(self.pg_url, callback, retry_delay)
+        self.listeners.append(listener)
+        return listener
+
     def _execute_sql(self, query: str, values=None,
                      return_data: bool = False,
-                     row_factory=tuple_row):
+                     row_factory=tuple_row, prepare: bool = None):
         """
-        Executes the query string passed to it
+        Executes the query string passed to it. With `prepare`, the statement
+        is prepared on the connection the first time and reused afterwards.
         """
         result = None
-        with self.connection.cursor(row_factory=row_factory) as cur:
+        with self._connect() as connection, \
+                connection.cursor(row_factory=row_factory) as cur:
             try:
                 if values:
-                    cur.execute(query, values)
+                    cur.execute(query, values, prepare=prepare)
                 else:
-                    cur.execute(query)
+                    cur.execute(query, prepare=prepare)
             except errors.UniqueViolation as err:
                 print('SKIPPING DUPLICATE KEY')
                 print(err)
@@ -67,19 +222,17 @@ class DBHandler:
                 result = cur.fetchall()
                 return result
             elif return_data:
-                self.connection.commit()
+                connection.commit()
                 result = cur.fetchall()
                 return result
-        self.connection.commit()
+            connection.commit()
         return None
 
     def _update_player_last_played(self, player: Player):
         """
         Updates the timestamp column of the table passed to it
         """
-        update_query = f"""
-        UPDATE players SET date_last_played = now()
-        WHERE player_id = %s"""
+        update_query = queries.UPDATE_PLAYER_LAST_PLAYED
         update_values = str(player.player_id)
         self._execute_sql(update_query, [update_values])
 
@@ -88,10 +241,7 @@ class DBHandler:
         Adds a new entry to the `players` table when a new player plays their
         first game
         """
-        insert_query = """
-            INSERT INTO players (username)
-            VALUES (%s)
-        """
+        insert_query = queries.INSERT_PLAYER_BY_USERNAME
         print(f"Adding {player.username}")
 
         self._execute_sql(insert_query, [player.username])
@@ -102,12 +252,7 @@ class DBHandler:
         Add a complete Player object as a row to explicitly write all columns
         from object
         """
-        insert_query = """
-        INSERT INTO players (player_id, username, date_created,
-        date_last_played)
-        VALUES (%(player_id)s, %(username)s, %(date_created)s,
-        %(date_last_played)s)
-        """
+        insert_query = queries.INSERT_FULL_PLAYER
         self._execute_sql(insert_query, player.dict())
         print(f"Player {player.username} added successfully")
 
@@ -115,35 +260,124 @@ class DBHandler:
         """
         Creates new game in the `games` table
         """
-        insert_query = """
-        INSERT INTO games(player_id, score, round)
-        VALUES (%(player_id)s, %(score)s, %(round)s)
-        """
+        insert_query = queries.INSERT_GAME
         self._execute_sql(insert_query, game_obj.dict())
         print("New Game created successfully!")
 
     def add_movie(self, movie_object: Movie):
         """
-        Add a movie to the `movies` table when scraped from IMDB
+        Add a movie to the `movies` table when scraped from IMDB. A movie that
+        is already stored under the same imdb_id is updated instead.
+        Returns:
+            UUID - the movie_id of the stored movie
+        """
+        insert_query = queries.UPSERT_MOVIE
+        result = self._execute_sql(insert_query, movie_object.dict(),
+                                   return_data=True)
+        self.movie_sampler.invalidate()
+        self.title_matcher.invalidate()
+        self.title_completer.invalidate()
+        print(f"Movie {movie_object.title} added successfully")
+        return result[0][0]
+
+    def add_movies_bulk(self, movies: list[Movie]) -> list[UUID]:
         """
-        insert_query = """
-            INSERT INTO movies (title, release_year, imdb_id,
-                                stripped_title)
-            VALUES (%(title)s, %(release_year)s, %(imdb_id)s,
-                    %(stripped_title)s)
+        Adds or updates many movies in one transaction, pipelining the
+        INSERTs and reading each movie_id back with RETURNING. Movies that
+        already carry a movie_id keep it.
+        Returns:
+            list[UUID] - the movie_id of each movie, in input order
+        """
+        insert_query = queries.UPSERT_MOVIE_KEEPING_ID
+        # One row per imdb_id, an upsert can't touch the same row twice
+        unique_movies = list({movie.imdb_id: movie for movie in movies}
+                             .values())
+        movie_ids = {}
+        if unique_movies:
+            with self._connect() as connection, connection.transaction(), \
+                    connection.cursor() as cur:
+                cur.executemany(insert_query,
+                                [movie.row() for movie in unique_movies],
+                                returning=True)
+                for movie in unique_movies:
+                    movie_ids[movie.imdb_id] = cur.fetchone()[0]
+                    cur.nextset()
+            self.movie_sampler.invalidate()
+            self.title_matcher.invalidate()
+            self.title_completer.invalidate()
+        print(f"{len(movie_ids)} movies added successfully")
+        return [movie_ids[movie.imdb_id] for movie in movies]
+
+    def add_clues_bulk(self, clues: list[Clue]) -> int:
         """
-        self._execute_sql(insert_query, movie_object.dict())
-        db_entry = self.get_movie_by_imdb_id(movie_object.imdb_id)
-        print(f"Movie {movie_object.title} added successfully")
-        return db_entry.movie_id
+        Adds many clues in one transaction by COPYing them into a staging
+        table and inserting from there. Clues already stored for the same
+        movie and category, or under the same clue_id, are skipped.
+        Returns:
+            int - the number of clues inserted
+        """
+        if not clues:
+            return 0
+        staging_query = queries.CREATE_CLUES_STAGING
+        copy_query = queries.COPY_CLUES_STAGING
+        insert_query = queries.INSERT_CLUES_FROM_STAGING
+        with self._connect() as connection, connection.transaction(), \
+                connection.cursor() as cur:
+            cur.execute(staging_query)
+            with cur.copy(copy_query) as copy:
+                for clue in clues:
+                    copy.write_row(clue.row())
+            cur.execute(insert_query)
+            inserted = cur.rowcount
+        print(f"{inserted} of {len(clues)} clues added successfully")
+        return inserted
+
+    def get_clue_titles(self) -> list[tuple]:
+        """
+        Returns (clue_id, clue_text, movie title, title_leak) for every clue,
+        to classify them again
+        """
+        return self._execute_sql(queries.SELECT_CLUE_TITLES, return_data=True)
+
+    def set_title_leaks(self, title_leaks: dict) -> int:
+        """
+        Stores the title_leak flag of many clues, given by clue_id, in one
+        transaction
+        Returns:
+            int - the number of clues updated
+        """
+        if not title_leaks:
+            return 0
+        with self._connect() as connection, connection.transaction(), \
+                connection.cursor() as cur:
+            cur.executemany(queries.UPDATE_TITLE_LEAK,
+                            [(title_leak, clue_id) for clue_id, title_leak
+                             in title_leaks.items()])
+        return len(title_leaks)
+
+    def get_guide_hashes(self) -> dict:
+        """
+        Returns the content hash of the last stored parental guide of every
+        movie, keyed by imdb_id. Movies whose guide was never stored map to
+        None.
+        """
+        select_query = queries.SELECT_GUIDE_HASHES
+        records = self._execute_sql(select_query, return_data=True)
+        return dict(records)
+
+    def set_guide_hash(self, movie_id: UUID, guide_hash: str):
+        """
+        Records the content hash of the parental guide whose clues were just
+        stored for a movie
+        """
+        update_query = queries.UPDATE_GUIDE_HASH
+        self._execute_sql(update_query, [guide_hash, movie_id])
 
     def get_categories(self):
         """
         Gets all data from categories table and returns it as a list of dicts
         """
-        categories = {}
-        select_query = """SELECT category_id, display_name, short_name
-         FROM categories"""
+        select_query = queries.SELECT_CATEGORIES
         categories = self._execute_sql(select_query, row_factory=dict_row,
                                        return_data=True)
         return categories
@@ -153,11 +387,11 @@ class DBHandler:
         Returns a Movie object from the data returned by searching for movie by
         IMDb's unique ID
         """
-        select_query = """SELECT movie_id, imdb_id, title, stripped_title,
-        release_year FROM movies WHERE imdb_id=%s"""
+        select_query = queries.SELECT_MOVIE_BY_IMDB_ID
         record = None
         print(f'Finding {imdb_id}')
-        with self.connection.cursor(row_factory=class_row(Movie)) as cur:
+        with self._connect() as connection, \
+                connection.cursor(row_factory=class_row(Movie)) as cur:
             try:
                 cur.execute(select_query, [imdb_id])
                 record = cur.fetchone()
@@ -170,11 +404,11 @@ class DBHandler:
         Returns a Movie object from the data returned by searching for movie by
         IMDb's unique ID
         """
-        select_query = """SELECT movie_id, imdb_id, title, stripped_title,
-        release_year FROM movies WHERE movie_id=%s"""
+        select_query = queries.SELECT_MOVIE_BY_MOVIE_ID
         record = None
         print(f'Finding {movie_id}')
-        with self.connection.cursor(row_factory=class_row(Movie)) as cur:
+        with self._connect() as connection, \
+                connection.cursor(row_factory=class_row(Movie)) as cur:
             try:
                 record = cur.execute(select_query, [movie_id]).fetchone()
             except errors.InFailedSqlTransaction as error:
@@ -183,28 +417,60 @@ class DBHandler:
 
     def add_clue(self, clue_obj: Clue):
         """
-        Add new Clue to `clues` table when scraped from IMDB
+        Add new Clue to `clues` table when scraped from IMDB. Clues whose text
+        is already stored for the same movie and category are skipped.
         Args:
             clue_obj: instance of Clue class
+        Returns:
+            UUID - the clue_id of the new clue, or None if it was a duplicate
+        """
+        insert_query = queries.INSERT_CLUE
+        result = self._execute_sql(insert_query, values=clue_obj.dict(),
+                                   return_data=True)
+        return result[0][0] if result else None
+
+    def add_guess(self, player_id: UUID, clue_id: UUID, guess_text: str,
+                  is_correct: bool, guessed_movie_id: UUID = None,
+                  game_id: UUID = None):
         """
-        insert_query = """
-            INSERT INTO clues (movie_id, category_id, clue_text, spoiler)
-            VALUES (%(movie_id)s, %(category_id)s, %(clue_text)s, %(spoiler)s)
+        Adds new player guess to `guesses` table when a player makes a guess,
+        along with the clue they were looking at
         """
-        result = self._execute_sql(insert_query, values=clue_obj.dict())
+        self._execute_sql(queries.INSERT_GUESS, {
+            'player_id': player_id, 'game_id': game_id, 'clue_id': clue_id,
+            'guess_text': guess_text, 'guessed_movie_id': guessed_movie_id,
+            'is_correct': is_correct})
 
-    # def add_guess(self, player_id: UUID, guessed_movie_id: UUID,
-    #               is_correct: bool):
-    #     """
-    #     Adds new player guess to `guesses` table when a player makes a guess
-    #     """
-    #     insert_query = """
-    #         INSERT INTO guesses (player_id, guessed_movie_id, is_correct, guess_text)
-    #         VALUES (%s, %s, %s, %s)
-    #     """
-    #     insert_values = (player_id, guessed_movie_id, is_correct)
-    #     self._execute_sql(insert_query, insert_values)
-    #     print("Guess added successfully")
+    def add_player_clue(self, player_id: UUID, clue_id: UUID):
+        """
+        Records in `player_clues` that the player was shown this clue
+        """
+        self._execute_sql(queries.INSERT_PLAYER_CLUE, [player_id, clue_id])
+
+    def get_clue_guess_stats(self) -> list[tuple]:
+        """
+        Returns (clue_id, category_id, clue_text, wrong guesses, right
+        guesses) for every playable clue, counting the guesses made while
+        looking at that clue
+        """
+        return self._execute_sql(queries.SELECT_CLUE_GUESS_STATS,
+                                 return_data=True)
+
+    def set_clue_difficulties(self, difficulties: dict) -> int:
+        """
+        Stores the difficulty of many clues, given by clue_id, in one
+        transaction
+        Returns:
+            int - the number of clues updated
+        """
+        if not difficulties:
+            return 0
+        with self._connect() as connection, connection.transaction(), \
+                connection.cursor() as cur:
+            cur.executemany(queries.UPDATE_CLUE_DIFFICULTY,
+                            [(difficulty, clue_id) for clue_id, difficulty
+                             in difficulties.items()])
+        return len(difficulties)
 
     # def add_score(self, player_id: UUID, score: int):
     #     """
@@ -235,43 +501,137 @@ class DBHandler:
     #     results = self._execute_sql(select_query, movie_object.dict(), True)
     #     return results
 
-    def get_three_movie_options(self):
+    def get_three_movie_options(self, player_id: UUID = None):
         """
-        Selects three random rows from `movies`
+        Picks three random movies from distinct release years using the
+        in-process MovieSampler, reloading it from `movies` when it is stale.
+        When a player_id is given, movies the player already played are
+        skipped for as long as unplayed ones remain.
         Returns:
-            dict_row
-        """
-        select_query = """
-            SELECT movie_id, release_year
-            FROM movies
-            --WHERE movie_id NOT IN (
-            --    SELECT movie_id
-            --    FROM player_movies
-            --    WHERE player_id = %s
-            --)
-            ORDER BY random() DESC
-            LIMIT 3;
-        """
-        # TODO: Figure out how to quickly filter movies that the player has
-        #  already played
-        records = None
-        with self.connection.cursor(row_factory=dict_row) as cur:
-            try:
-                records = cur.execute(select_query, {}).fetchall()
-            except Exception as e:
-                print(e)
-            except errors.InFailedSqlTransaction as e:
-                print(e)
-            return records
+            list[dict] - movie_id and release_year of each option
+        """
+        if self.movie_sampler.is_stale():
+            self.movie_sampler.load(self._execute_sql(
+                queries.SELECT_MOVIE_YEARS, return_data=True))
+        played = self.get_played_movie_ids(player_id) if player_id else None
+        return self.movie_sampler.sample(3, played)
+
+    def match_title(self, stripped_guess: str, prefer: UUID = None):
+        """
+        Returns the movie_id whose title or alternate title is closest to a
+        guess passed through strip_text(), or None, using the in-process
+        TitleMatcher reloaded from `movies` and `alternate_titles` when it
+        is stale. Among equally close movies, `prefer` wins.
+        """
+        if self.title_matcher.is_stale():
+            self.title_matcher.load(self._execute_sql(
+                queries.SELECT_MOVIE_TITLES, return_data=True))
+        return self.title_matcher.match(stripped_guess, prefer)
+
+    def complete_titles(self, prefix: str, limit: int = 10,
+                        include_years: bool = False) -> list[dict]:
+        """
+        Suggests up to `limit` titles starting with what the player typed,
+        using the in-process TitleCompleter reloaded from `movies` and
+        `alternate_titles` when it is stale, so typing never queries the
+        database. See TitleCompleter.complete().
+        Returns:
+            list[dict] - title, and release_year with `include_years`
+        """
+        if self.title_completer.is_stale():
+            self.title_completer.load(self._execute_sql(
+                queries.SELECT_TITLE_SUGGESTIONS, return_data=True))
+        return self.title_completer.complete(strip_text(prefix), limit,
+                                             include_years)
+
+    def add_alternate_title(self, movie_id: UUID, title: str):
+        """
+        Adds another title a movie may be guessed as, such as its original
+        or international title
+        """
+        self._execute_sql(queries.INSERT_ALTERNATE_TITLE,
+                          [movie_id, title, strip_text(title)])
+        self.title_matcher.invalidate()
+        self.title_completer.invalidate()
+
+    def get_played_movie_ids(self, player_id: UUID) -> set:
+        """
+        Returns the set of movie ids the player has played, loaded from
+        `player_movies` once and then kept up to date in memory
+        """
+        played = self.played_movies.get(player_id)
+        if played is None:
+            records = self._execute_sql(queries.SELECT_PLAYER_MOVIES,
+                                        [player_id], return_data=True)
+            played = self.played_movies.put(player_id,
+                                            (row[0] for row in records))
+        return played
+
+    def add_player_movie(self, player_id: UUID, movie_id: UUID):
+        """
+        Records in `player_movies` that the player was given this movie
+        """
+        try:
+            self._execute_sql(queries.INSERT_PLAYER_MOVIE,
+                              [player_id, movie_id])
+        except errors.ForeignKeyViolation as err:
+            print(f'Not recording movie for unknown player {player_id}')
+            print(err)
+            return
+        self.played_movies.add(player_id, movie_id)
+
+    def get_round_packs(self, movie_ids) -> dict:
+        """
+        Fetches several movies and all of their playable clues in a single
+        query, so the options offered to a player can be played without
+        further round trips.
+        Returns:
+            dict - RoundPack by movie_id, for the movies that exist
+        """
+        records = self._execute_sql(queries.SELECT_ROUND_PACKS,
+                                    [list(movie_ids)], return_data=True,
+                                    prepare=True)
+        return RoundPack.from_records(records)
+
+    def load_round(self, movie_id: UUID):
+        """
+        Loads everything needed to play a movie, the movie, its clues and the
+        display names of their categories, with one prepared statement.
+        Returns:
+            RoundPack - or None if there is no such movie
+        """
+        return self.get_round_packs([movie_id]).get(movie_id)
+
+    def get_catalogue_records(self) -> list[tuple]:
+        """
+        Selects every movie with playable clues together with those clues,
+        ordered by movie, to build a Catalogue from in one query
+        """
+        return self._execute_sql(queries.SELECT_CATALOGUE,
+                                 return_data=True)
+
+    def get_movies(self) -> list[Movie]:
+        """
+        Selects every movie from `movies` table.
+        Returns a list of Movie objects.
+        """
+        return self._execute_sql(queries.SELECT_MOVIES, return_data=True,
+                                 row_factory=class_row(Movie))
+
+    def get_clues(self) -> list[Clue]:
+        """
+        Selects every clue from `clues` table, playable or not.
+        Returns a list of Clue objects.
+        """
+        return self._execute_sql(queries.SELECT_CLUES, return_data=True,
+                                 row_factory=class_row(Clue))
 
     def get_clues_by_movie_id(self, movie_id: UUID):
         """
         Selects all clues for a given movie id from `clues` table.
         Returns a list of Clue objects.
         """
-        select_query = """
-        SELECT * FROM clues WHERE movie_id = %s
-        """
+        select_query = queries.SELECT_CLUES_BY_MOVIE_ID
         records = self._execute_sql(select_query, [movie_id], return_data=True,
                                     row_factory=class_row(Clue))
         return records
@@ -281,9 +641,47 @@ class DBHandler:
         Selects a player by username from `players` table.
         Returns a Player object.
         """
-        select_query = "SELECT * FROM players WHERE username = %s"
+        select_query = queries.SELECT_PLAYER_BY_USERNAME
         player_data = self._execute_sql(select_query, [player.username],
                                    row_factory=class_row(Player),
                                    return_data=True)[0]
         print(f'player is {player_data}')
         return player_data
+
+    def get_game_state(self, state_key: str):
+        """
+        Selects a serialized game state from `game_states`.
+        Returns:
+            tuple - (state bytes, version), or None if there is none
+        """
+        records = self._execute_sql(queries.SELECT_GAME_STATE, [state_key],
+                                    return_data=True)
+        return (bytes(records[0][0]), records[0][1]) if records else None
+
+    def save_game_state(self, state_key: str, state: bytes, version: int):
+        """
+        Stores a serialized game state if the stored version still matches
+        `version`, 0 meaning no state was stored yet.
+        Returns:
+            int - the new version, or None if another writer got there first
+        """
+        if version:
+            records = self._execute_sql(queries.UPDATE_GAME_STATE,
+                                        [state, state_key, version],
+                                        return_data=True)
+        else:
+            records = self._execute_sql(queries.INSERT_GAME_STATE,
+                                        [state_key, state], return_data=True)
+        return records[0][0] if records else None
+
+    def delete_game_state(self, state_key: str):
+        """
+        Deletes a game state from `game_states`
+        """
+        self._execute_sql(queries.DELETE_GAME_STATE, [state_key])
+
+    def delete_expired_game_states(self, max_age: float):
+        """
+        Deletes game states not updated in the last `max_age` seconds
+        """
+        self._execute_sql(queries.DELETE_EXPIRED_GAME_STATES, [max_age])
@@ -0,0 +1,240 @@
+"""
+SQL statements shared by DBHandler and AsyncDBHandler
+"""
+
+UPDATE_PLAYER_LAST_PLAYED = """
+    UPDATE players SET date_last_played = now()
+    WHERE player_id = %s"""
+
+INSERT_PLAYER_BY_USERNAME = """
+    INSERT INTO players (username)
+    VALUES (%s)
+"""
+
+INSERT_FULL_PLAYER = """
+    INSERT INTO players (player_id, username, date_created,
+    date_last_played)
+    VALUES (%(player_id)s, %(username)s, %(date_created)s,
+    %(date_last_played)s)
+"""
+
+SELECT_PLAYER_BY_USERNAME = "SELECT * FROM players WHERE username = %s"
+
+INSERT_GAME = """
+    INSERT INTO games(player_id, score, round)
+    VALUES (%(player_id)s, %(score)s, %(round)s)
+"""
+
+UPSERT_MOVIE = """
+    INSERT INTO movies (title, release_year, imdb_id,
+                        stripped_title)
+    VALUES (%(title)s, %(release_year)s, %(imdb_id)s,
+            %(stripped_title)s)
+    ON CONFLICT (imdb_id) DO UPDATE
+    SET title = EXCLUDED.title,
+        release_year = EXCLUDED.release_year,
+        stripped_title = EXCLUDED.stripped_title
+    RETURNING movie_id
+"""
+
+# Parameters in the order of Movie.row()
+UPSERT_MOVIE_KEEPING_ID = """
+    INSERT INTO movies (imdb_id, title, stripped_title, release_year,
+                        movie_id)
+    VALUES (%s, %s, %s, %s, coalesce(%s::uuid, gen_random_uuid()))
+    ON CONFLICT (imdb_id) DO UPDATE
+    SET title = EXCLUDED.title,
+        release_year = EXCLUDED.release_year,
+        stripped_title = EXCLUDED.stripped_title
+    RETURNING movie_id
+"""
+
+SELECT_MOVIE_BY_IMDB_ID = """SELECT movie_id, imdb_id, title, stripped_title,
+    release_year FROM movies WHERE imdb_id=%s"""
+
+SELECT_MOVIE_BY_MOVIE_ID = """SELECT movie_id, imdb_id, title, stripped_title,
+    release_year FROM movies WHERE movie_id=%s"""
+
+SELECT_GUIDE_HASHES = """SELECT imdb_id, guide_hash FROM movies"""
+
+UPDATE_GUIDE_HASH = """
+    UPDATE movies SET guide_hash = %s
+    WHERE movie_id = %s"""
+
+SELECT_MOVIE_YEARS = """
+    SELECT movie_id, release_year FROM movies m
+    WHERE EXISTS (SELECT 1 FROM clues c
+                  WHERE c.movie_id = m.movie_id AND c.playable)"""
+
+SELECT_MOVIE_TITLES = """
+    SELECT movie_id, title, stripped_title FROM movies
+    UNION ALL
+    SELECT movie_id, title, stripped_title FROM alternate_titles"""
+
+SELECT_TITLE_SUGGESTIONS = """
+    SELECT title, stripped_title, release_year FROM movies
+    UNION ALL
+    SELECT a.title, a.stripped_title, m.release_year
+    FROM alternate_titles a
+    JOIN movies m ON m.movie_id = a.movie_id"""
+
+INSERT_ALTERNATE_TITLE = """
+    INSERT INTO alternate_titles (movie_id, title, stripped_title)
+    VALUES (%s, %s, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+SELECT_PLAYER_MOVIES = """
+    SELECT movie_id FROM player_movies WHERE player_id = %s"""
+
+INSERT_PLAYER_MOVIE = """
+    INSERT INTO player_movies (player_id, movie_id)
+    VALUES (%s, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+SELECT_CATEGORIES = """SELECT category_id, display_name, short_name
+    FROM categories"""
+
+INSERT_CLUE = """
+    INSERT INTO clues (movie_id, category_id, clue_text, spoiler,
+                       title_leak)
+    VALUES (%(movie_id)s, %(category_id)s, %(clue_text)s, %(spoiler)s,
+            %(title_leak)s)
+    ON CONFLICT (movie_id, category_id, clue_hash) DO NOTHING
+    RETURNING clue_id
+"""
+
+CREATE_CLUES_STAGING = """
+    CREATE TEMP TABLE clues_staging
+    (
+        movie_id     UUID,
+        category_id  INT,
+        clue_text    TEXT,
+        spoiler      BOOL,
+        date_created TIMESTAMP,
+        clue_id      UUID,
+        title_leak   BOOL,
+        difficulty   REAL
+    ) ON COMMIT DROP
+"""
+
+# Columns in the order of Clue.row()
+COPY_CLUES_STAGING = """
+    COPY clues_staging (movie_id, category_id, clue_text, spoiler,
+                        date_created, clue_id, title_leak, difficulty)
+    FROM STDIN
+"""
+
+INSERT_CLUES_FROM_STAGING = """
+    INSERT INTO clues (clue_id, movie_id, category_id, clue_text,
+                       spoiler, date_created, title_leak, difficulty)
+    SELECT coalesce(clue_id, gen_random_uuid()), movie_id, category_id,
+           clue_text, spoiler, coalesce(date_created, now()),
+           coalesce(title_leak, false), difficulty
+    FROM clues_staging
+    ON CONFLICT DO NOTHING
+"""
+
+SELECT_CLUES_BY_MOVIE_ID = """
+    SELECT clue_id, movie_id, category_id, clue_text, spoiler, date_created,
+           title_leak, difficulty
+    FROM clues WHERE movie_id = %s
+"""
+
+SELECT_MOVIES = """SELECT movie_id, imdb_id, title, stripped_title,
+    release_year FROM movies"""
+
+SELECT_CLUES = """
+    SELECT clue_id, movie_id, category_id, clue_text, spoiler, date_created,
+           title_leak, difficulty
+    FROM clues
+"""
+
+SELECT_GAME_STATE = """
+    SELECT state, version FROM game_states WHERE state_key = %s"""
+
+INSERT_GAME_STATE = """
+    INSERT INTO game_states (state_key, version, state)
+    VALUES (%s, 1, %s)
+    ON CONFLICT DO NOTHING
+    RETURNING version
+"""
+
+UPDATE_GAME_STATE = """
+    UPDATE game_states
+    SET state = %s, version = version + 1, date_updated = now()
+    WHERE state_key = %s AND version = %s
+    RETURNING version
+"""
+
+DELETE_GAME_STATE = "DELETE FROM game_states WHERE state_key = %s"
+
+DELETE_EXPIRED_GAME_STATES = """
+    DELETE FROM game_states
+    WHERE date_updated < now() - %s * interval '1 second'"""
+
+# Clues in clue_order(), 0.5 being Round.DEFAULT_DIFFICULTY
+SELECT_ROUND_PACKS = """
+    SELECT m.movie_id, m.imdb_id, m.title, m.stripped_title, m.release_year,
+           c.clue_id, c.category_id, c.clue_text, c.spoiler, c.date_created,
+           c.difficulty, cat.display_name
+    FROM movies m
+    LEFT JOIN clues c ON c.movie_id = m.movie_id AND c.playable
+    LEFT JOIN categories cat ON cat.category_id = c.category_id
+    WHERE m.movie_id = ANY(%s::uuid[])
+    ORDER BY m.movie_id, COALESCE(c.difficulty, 0.5), c.clue_id
+"""
+
+# Clues in clue_order(), as for SELECT_ROUND_PACKS
+SELECT_CATALOGUE = """
+    SELECT m.movie_id, m.imdb_id, m.title, m.stripped_title, m.release_year,
+           c.clue_id, c.category_id, c.clue_text, c.date_created, c.difficulty
+    FROM movies m
+    JOIN clues c ON c.movie_id = m.movie_id AND c.playable
+    JOIN categories cat ON cat.category_id = c.category_id
+    ORDER BY m.movie_id, COALESCE(c.difficulty, 0.5), c.clue_id
+"""
+
+SELECT_CLUE_TITLES = """
+    SELECT c.clue_id, c.clue_text, m.title, c.title_leak
+    FROM clues c
+    JOIN movies m ON m.movie_id = c.movie_id"""
+
+UPDATE_TITLE_LEAK = """
+    UPDATE clues SET title_leak = %s
+    WHERE clue_id = %s"""
+
+INSERT_PLAYER_CLUE = """
+    INSERT INTO player_clues (player_id, clue_id)
+    VALUES (%s, %s)
+    ON CONFLICT DO NOTHING
+"""
+
+INSERT_GUESS = """
+    INSERT INTO guesses (player_id, game_id, clue_id, guess_text,
+                         guessed_movie_id, is_correct)
+    VALUES (%(player_id)s, %(game_id)s, %(clue_id)s, %(guess_text)s,
+            %(guessed_movie_id)s, %(is_correct)s)
+"""
+
+SELECT_CLUE_GUESS_STATS = """
+    SELECT c.clue_id, c.category_id, c.clue_text,
+           count(g.clue_id) FILTER (WHERE NOT g.is_correct),
+           count(g.clue_id) FILTER (WHERE g.is_correct)
+    FROM clues c
+    LEFT JOIN guesses g ON g.clue_id = c.clue_id
+    WHERE c.playable
+    GROUP BY c.clue_id"""
+
+UPDATE_CLUE_DIFFICULTY = """
+    UPDATE clues SET difficulty = %s
+    WHERE clue_id = %s"""
+
+CATALOGUE_CHANNEL = 'catalogue_changed'
+
+LISTEN_CATALOGUE_CHANGED = f"LISTEN {CATALOGUE_CHANNEL}"
+
+NOTIFY_CATALOGUE_CHANGED = f"NOTIFY {CATALOGUE_CHANNEL}"
+
+POLL_NOTIFICATIONS = "SELECT 1"
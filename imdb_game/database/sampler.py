@@ -0,0 +1,159 @@
+"""
+In-process index used to pick random movie options without scanning and
+sorting the `movies` table on every request
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+
+class MovieSampler:
+    """
+    Holds every (movie_id, release_year) pair grouped by release year. Picking
+    options costs the same no matter how many movies are loaded, and options
+    come from distinct years whenever enough years exist, since the player
+    chooses a movie by its year.
+    The index is rebuilt by the owning handler with load() when is_stale()
+    says so, either because `max_age` seconds passed or invalidate() was
+    called after the movies changed.
+    """
+
+    def __init__(self, max_age: float = 300.0, rng: random.Random = None):
+        self.max_age = max_age
+        self._rng = rng or random.Random()
+        # (years, movie ids by year, all (movie_id, year) pairs), replaced as
+        # a whole so readers never see a half-built index
+        self._index = ([], {}, [])
+        self._loaded_at = None
+
+    def is_stale(self) -> bool:
+        """
+        Returns True if the index was never loaded, was invalidated, or is
+        older than max_age
+        """
+        return self._loaded_at is None or \
+            time.monotonic() - self._loaded_at > self.max_age
+
+    def invalidate(self):
+        """
+        Marks the index as stale so the next request reloads it
+        """
+        self._loaded_at = None
+
+    def load(self, rows):
+        """
+        Rebuilds the index from (movie_id, release_year) rows
+        """
+        by_year: dict[int, list[UUID]] = {}
+        movies = []
+        for movie_id, release_year in rows:
+            by_year.setdefault(release_year, []).append(movie_id)
+            movies.append((movie_id, release_year))
+        self._index = (list(by_year), by_year, movies)
+        self._loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._index[2])
+
+    def sample(self, count: int = 3, exclude: set = None) -> list[dict]:
+        """
+        Returns `count` distinct random movies as dicts of movie_id and
+        release_year, from distinct years if there are enough of them.
+        Movies in `exclude` are only offered once every other movie has been.
+        """
+        years, by_year, movies = self._index
+        if not exclude:
+            if len(years) >= count:
+                return [{'movie_id': self._rng.choice(by_year[year]),
+                         'release_year': year}
+                        for year in self._rng.sample(years, count)]
+            return [{'movie_id': movie_id, 'release_year': year}
+                    for movie_id, year in
+                    self._rng.sample(movies, min(count, len(movies)))]
+        options = []
+        # Visit years in random order until enough of them have an unseen
+        # movie, so the cost is bound by the number of years, not movies
+        for year in self._rng.sample(years, len(years)):
+            movie_id = self._pick_unseen(by_year[year], exclude)
+            if movie_id is not None:
+                options.append({'movie_id': movie_id, 'release_year': year})
+                if len(options) == count:
+                    return options
+        # The player has seen nearly everything, top up with unseen movies
+        # from repeated years first, then with movies they already played
+        chosen = {option['movie_id'] for option in options}
+        shuffled = self._rng.sample(movies, len(movies))
+        for allow_played in (False, True):
+            for movie_id, year in shuffled:
+                if len(options) == count:
+                    return options
+                if movie_id in chosen or \
+                        (movie_id in exclude and not allow_played):
+                    continue
+                chosen.add(movie_id)
+                options.append({'movie_id': movie_id, 'release_year': year})
+        return options
+
+    def _pick_unseen(self, movie_ids: list, exclude: set):
+        """
+        Returns a random movie_id from movie_ids that is not in exclude, or
+        None. A few random probes find one quickly unless the year is almost
+        fully played, then the year is scanned from a random offset.
+        """
+        for _ in range(3):
+            movie_id = self._rng.choice(movie_ids)
+            if movie_id not in exclude:
+                return movie_id
+        start = self._rng.randrange(len(movie_ids))
+        for offset in range(len(movie_ids)):
+            movie_id = movie_ids[(start + offset) % len(movie_ids)]
+            if movie_id not in exclude:
+                return movie_id
+        return None
+
+
+class PlayedMovies:
+    """
+    Thread-safe bounded LRU of the movie ids each player has already
+    played, so repeat lookups for active players don't query
+    `player_movies` again
+    """
+
+    def __init__(self, max_players: int = 10000):
+        self.max_players = max_players
+        self._played: OrderedDict[UUID, set] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, player_id: UUID):
+        """
+        Returns the cached set of played movie ids for a player, or None
+        """
+        with self._lock:
+            played = self._played.get(player_id)
+            if played is not None:
+                self._played.move_to_end(player_id)
+            return played
+
+    def put(self, player_id: UUID, movie_ids) -> set:
+        """
+        Caches the played movie ids for a player, evicting the least recently
+        used player when full
+        """
+        played = set(movie_ids)
+        with self._lock:
+            self._played[player_id] = played
+            self._played.move_to_end(player_id)
+            while len(self._played) > self.max_players:
+                self._played.popitem(last=False)
+        return played
+
+    def add(self, player_id: UUID, movie_id: UUID):
+        """
+        Records a newly played movie for a cached player
+        """
+        with self._lock:
+            played = self._played.get(player_id)
+            if played is not None:
+                played.add(movie_id)
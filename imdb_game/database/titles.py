@@ -0,0 +1,297 @@
+"""
+In-process indexes over movie titles, used to match a player's guess to a
+movie, forgiving a missing leading article and a few typos, and to suggest
+titles as the player types
+"""
+import time
+from bisect import bisect_left
+from collections import Counter
+from operator import itemgetter
+from uuid import UUID
+
+from ..utils.utils import LEADING_ARTICLES, split_words, strip_text
+
+GRAM_SIZE: int = 3
+# One typo is forgiven per this many characters of the stripped guess...
+CHARACTERS_PER_EDIT: int = 6
+# ...up to this many typos
+MAX_EDITS: int = 3
+# Trigram postings read beyond the minimum needed to find every candidate
+EXTRA_GRAMS: int = 3
+
+
+def title_keys(title: str) -> list[str]:
+    """
+    Returns the stripped forms a title can be guessed as: strip_text() of
+    the title, and the same without a leading article ("shawshankredemption").
+    The stored stripped_title isn't used, as older rows were stripped before
+    accents were removed ("amélie").
+    Returns:
+        list[str]
+    """
+    keys = [strip_text(title)]
+    words = split_words(title)
+    if len(words) > 1 and words[0] in LEADING_ARTICLES:
+        keys.append(''.join(words[1:]))
+    return keys
+
+
+def allowed_edits(stripped_guess: str) -> int:
+    """
+    Returns how many typos a stripped guess may have and still match
+    """
+    return min(len(stripped_guess) // CHARACTERS_PER_EDIT, MAX_EDITS)
+
+
+def title_grams(key: str) -> set[str]:
+    """
+    Returns the distinct trigrams of a key, padded so that its first and
+    last characters appear in as many trigrams as the others
+    """
+    padded = f'^{key}$'
+    return {padded[index:index + GRAM_SIZE]
+            for index in range(len(padded) - GRAM_SIZE + 1)}
+
+
+def pattern_masks(pattern: str) -> dict[str, int]:
+    """
+    Returns, for each character of pattern, a bit mask of the positions it
+    appears at, to pass to edit_distance() when comparing one pattern with
+    many strings
+    """
+    masks: dict[str, int] = {}
+    for position, character in enumerate(pattern):
+        masks[character] = masks.get(character, 0) | 1 << position
+    return masks
+
+
+def edit_distance(pattern: str, text: str, masks: dict = None) -> int:
+    """
+    Returns the Levenshtein distance between two strings, using Myers'
+    bit-parallel algorithm: each character of text updates the whole column
+    of the distance matrix with a few integer operations instead of one
+    operation per cell
+    Returns:
+        int
+    """
+    if not pattern:
+        return len(text)
+    if masks is None:
+        masks = pattern_masks(pattern)
+    full = (1 << len(pattern)) - 1
+    last = 1 << (len(pattern) - 1)
+    plus, minus, distance = full, 0, len(pattern)
+    for character in text:
+        match = masks.get(character, 0)
+        vertical = match | minus
+        horizontal = (((match & plus) + plus) ^ plus) | match
+        plus_h = (minus | ~(horizontal | plus)) & full
+        minus_h = plus & horizontal
+        if plus_h & last:
+            distance += 1
+        elif minus_h & last:
+            distance -= 1
+        plus_h = (plus_h << 1 | 1) & full
+        minus_h = (minus_h << 1) & full
+        plus = (minus_h | ~(vertical | plus_h)) & full
+        minus = plus_h & vertical
+    return distance
+
+
+class TitleMatcher:
+    """
+    Holds the stripped titles and alternate titles of every movie. An exact
+    guess is a dictionary lookup. Otherwise candidates come from a trigram
+    index: a title within k typos of the guess shares all but at most 3k of
+    the guess' trigrams, so only the postings of its rarest trigrams are
+    read, and only within the titles of a similar length. The few candidates
+    left are checked with a bit-parallel edit distance.
+    The index is rebuilt by the owning handler with load() when is_stale()
+    says so, either because `max_age` seconds passed or invalidate() was
+    called after the movies changed.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        # (exact key -> key index, keys, movie ids by key index, key indexes
+        # by trigram, first key index of each length), replaced as a whole so
+        # readers never see a half-built index
+        self._index = ({}, [], [], {}, [0])
+        self._loaded_at = None
+
+    def is_stale(self) -> bool:
+        """
+        Returns True if the index was never loaded, was invalidated, or is
+        older than max_age
+        """
+        return self._loaded_at is None or \
+            time.monotonic() - self._loaded_at > self.max_age
+
+    def invalidate(self):
+        """
+        Marks the index as stale so the next guess reloads it
+        """
+        self._loaded_at = None
+
+    def load(self, rows):
+        """
+        Rebuilds the index from (movie_id, title, stripped_title) rows
+        """
+        movie_ids_by_key: dict[str, list[UUID]] = {}
+        for movie_id, title, _ in rows:
+            for key in title_keys(title):
+                if not key:
+                    continue
+                movie_ids = movie_ids_by_key.setdefault(key, [])
+                if movie_id not in movie_ids:
+                    movie_ids.append(movie_id)
+        # Keys are numbered shortest first, so every posting list is sorted
+        # by key length and a guess only reads the stretch of similar length
+        keys = sorted(movie_ids_by_key, key=len)
+        length_starts = [0] * (len(keys[-1]) + 2 if keys else 1)
+        grams: dict[str, list[int]] = {}
+        for key_index, key in enumerate(keys):
+            length_starts[len(key) + 1] = key_index + 1
+            for gram in title_grams(key):
+                grams.setdefault(gram, []).append(key_index)
+        for length in range(1, len(length_starts)):
+            length_starts[length] = max(length_starts[length],
+                                        length_starts[length - 1])
+        self._index = ({key: key_index for key_index, key in enumerate(keys)},
+                       keys, [movie_ids_by_key[key] for key in keys], grams,
+                       length_starts)
+        self._loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._index[1])
+
+    def match(self, stripped_guess: str, prefer: UUID = None):
+        """
+        Returns the movie_id of the title closest to a guess already passed
+        through strip_text(), or None if no title is close enough. When
+        several movies are equally close, `prefer` wins if it is one of them.
+        """
+        exact, keys, movie_ids, grams, length_starts = self._index
+        key_index = exact.get(stripped_guess)
+        if key_index is not None:
+            return self._pick(movie_ids[key_index], prefer)
+        max_edits = allowed_edits(stripped_guess)
+        guess_grams = title_grams(stripped_guess)
+        # Too short for the trigram filter to be sound
+        if not max_edits or len(guess_grams) <= GRAM_SIZE * max_edits:
+            return None
+        # Titles more than max_edits characters longer or shorter can't match
+        last_length = len(length_starts) - 1
+        first = length_starts[min(max(len(stripped_guess) - max_edits, 0),
+                                  last_length)]
+        last = length_starts[min(len(stripped_guess) + max_edits + 1,
+                                 last_length)]
+        # A title within max_edits typos lacks at most GRAM_SIZE * max_edits
+        # of the guess' trigrams, so among the guess' rarest trigrams it has
+        # all but that many. Reading a few more than strictly needed makes
+        # the count weed out nearly every candidate before the edit distance.
+        windows = []
+        for gram in guess_grams:
+            posting = grams.get(gram, ())
+            start = bisect_left(posting, first)
+            end = bisect_left(posting, last, start)
+            windows.append((end - start, start, end, posting))
+        windows.sort(key=itemgetter(0))
+        lacking = GRAM_SIZE * max_edits
+        scanned = windows[:lacking + EXTRA_GRAMS]
+        counts = Counter()
+        for _, start, end, posting in scanned:
+            counts.update(posting[start:end])
+        needed = len(scanned) - lacking
+        masks = pattern_masks(stripped_guess)
+        best_distance, best_ids = max_edits + 1, []
+        for candidate in sorted(key_index for key_index, count
+                                in counts.items() if count >= needed):
+            distance = edit_distance(stripped_guess, keys[candidate], masks)
+            if distance < best_distance:
+                best_distance, best_ids = distance, list(movie_ids[candidate])
+            elif distance == best_distance <= max_edits:
+                best_ids.extend(movie_ids[candidate])
+        return self._pick(best_ids, prefer) if best_ids else None
+
+    @staticmethod
+    def _pick(movie_ids: list, prefer: UUID = None):
+        return prefer if prefer in movie_ids else movie_ids[0]
+
+
+class TitleCompleter:
+    """
+    Suggests titles for what a player has typed so far, from an array of
+    every title key kept in sorted order: the keys starting with a prefix
+    are next to each other, so a suggestion costs one binary search plus one
+    step per suggestion, however many movies are loaded.
+    The index is rebuilt by the owning handler with load() when is_stale()
+    says so, either because `max_age` seconds passed or invalidate() was
+    called after the movies changed.
+    """
+    # Prefixes shorter than this match too much of the catalogue to help
+    MIN_PREFIX: int = 2
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        # (sorted keys, (title, release_year) of each key), replaced as a
+        # whole so readers never see a half-built index
+        self._index = ([], [])
+        self._loaded_at = None
+
+    def is_stale(self) -> bool:
+        """
+        Returns True if the index was never loaded, was invalidated, or is
+        older than max_age
+        """
+        return self._loaded_at is None or \
+            time.monotonic() - self._loaded_at > self.max_age
+
+    def invalidate(self):
+        """
+        Marks the index as stale so the next suggestion reloads it
+        """
+        self._loaded_at = None
+
+    def load(self, rows):
+        """
+        Rebuilds the index from (title, stripped_title, release_year) rows
+        """
+        entries = sorted(
+            (key, title, release_year)
+            for title, _, release_year in rows
+            for key in title_keys(title) if key)
+        self._index = ([key for key, _, _ in entries],
+                       [(title, release_year) for _, title, release_year
+                        in entries])
+        self._loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._index[0])
+
+    def complete(self, stripped_prefix: str, limit: int = 10,
+                 include_years: bool = False) -> list[dict]:
+        """
+        Returns up to `limit` distinct titles, as dicts of title and, with
+        `include_years`, release_year, whose title or title without a
+        leading article starts with a prefix passed through strip_text().
+        Years are left out by default: the player picked the movie by its
+        year, so showing them would point straight at the answer.
+        """
+        if len(stripped_prefix) < self.MIN_PREFIX or limit < 1:
+            return []
+        keys, titles = self._index
+        suggestions = []
+        seen = set()
+        for position in range(bisect_left(keys, stripped_prefix), len(keys)):
+            if len(suggestions) >= limit or \
+                    not keys[position].startswith(stripped_prefix):
+                break
+            title, release_year = titles[position]
+            suggestion = (title, release_year) if include_years else (title,)
+            if suggestion in seen:
+                continue
+            seen.add(suggestion)
+            suggestions.append(dict(zip(('title', 'release_year'),
+                                        suggestion)))
+        return suggestions
@@ -0,0 +1,90 @@
+"""
+Offline job scoring how hard each clue makes guessing its movie, from what
+players guessed while looking at it and from the clue text itself. Rounds
+then hand out clues hardest first without ranking anything at request time.
+Run with `python -m imdb_game.gameshow.difficulty`.
+"""
+import math
+import re
+
+from ..database.handler import DBHandler
+
+# How many guesses the text-based estimate is worth against real statistics
+PRIOR_WEIGHT: float = 5.0
+_QUOTE = re.compile(r'"[^"]+"')
+_NUMBER = re.compile(r'\d')
+_SENTENCE_END = ('.', '!', '?')
+
+
+def count_names(clue_text: str) -> int:
+    """
+    Counts the capitalized words that don't start a sentence, which are
+    mostly the names of characters, actors and places
+    Returns:
+        int
+    """
+    count = 0
+    sentence_start = True
+    for word in clue_text.split():
+        if not sentence_start and word[0].isupper() and word[1:].islower():
+            count += 1
+        sentence_start = word.endswith(_SENTENCE_END)
+    return count
+
+
+def text_difficulty(clue_text: str) -> float:
+    """
+    Estimates a clue's difficulty from its text alone, between 0 (easy) and
+    1 (hard). Names, quotes and numbers point at one specific movie, and
+    longer clues describe more of it, so they all make a clue easier; short
+    generic clues like "Some mild swearing." are the hardest.
+    Returns:
+        float
+    """
+    specifics = count_names(clue_text) + \
+        2 * len(_QUOTE.findall(clue_text)) + \
+        (1 if _NUMBER.search(clue_text) else 0)
+    words = len(clue_text.split())
+    easiness = 0.6 * specifics + 0.8 * math.log1p(words) - 3.0
+    return 1 / (1 + math.exp(easiness))
+
+
+def clue_difficulty(clue_text: str, missed: int, solved: int) -> float:
+    """
+    Blends the text estimate with the share of wrong guesses among the
+    guesses made while looking at the clue, trusting the statistics more as
+    more guesses are made. Clues shown without a guess don't count either
+    way, so the clues handed out first don't collect misses just for being
+    on screen.
+    Returns:
+        float
+    """
+    prior = text_difficulty(clue_text)
+    return (prior * PRIOR_WEIGHT + missed) / (PRIOR_WEIGHT + missed + solved)
+
+
+def score_clue_difficulty(database_handler) -> int:
+    """
+    Scores every playable clue and stores the scores in `clues.difficulty`
+    Returns:
+        int - the number of clues scored
+    """
+    difficulties = {
+        clue_id: clue_difficulty(clue_text, missed, solved)
+        for clue_id, _, clue_text, missed, solved
+        in database_handler.get_clue_guess_stats()}
+    database_handler.set_clue_difficulties(difficulties)
+    database_handler.notify_catalogue_changed()
+    print(f'{len(difficulties)} clues scored')
+    return len(difficulties)
+
+
+def main():
+    """
+    Run to score clue difficulties, such as from a nightly cron job
+    """
+    score_clue_difficulty(DBHandler())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+GameEngine class, the request/response rules of IMDb Game shared by the
+console and web front ends
+"""
+import random
+from uuid import UUID
+
+from ..database.handler import DBHandler
+from ..database.dataclasses import Game, Player, Round
+from ..utils.utils import strip_text
+
+
+class InvalidActionError(Exception):
+    """
+    Raised when an action doesn't fit the current state of the game, like
+    guessing before a movie was chosen
+    """
+
+
+class GameEngine:
+    """
+    Plays a game of IMDb Game one action at a time. Every method returns
+    plain data for the front end to show and never prints or waits for
+    input, so a web request is never held up by the game. The only I/O is
+    through the database handler passed in.
+    Args:
+        player_instance (Player): The player object for the current game
+        game_instance (Game): The game object to resume, if any
+        database (DBHandler): The database handler to read movies from
+        rng (random.Random): Draws the seed of each round, seed it to replay
+            whole games
+    """
+    WRONG_ANSWER_DEDUCTION: int = 1
+    PASS: str = '/pass'
+
+    def __init__(self, player_instance: Player,
+                 game_instance: Game = None,
+                 database: DBHandler = None, rng: random.Random = None):
+        self.DB = database or DBHandler()
+        self._rng = rng or random.Random()
+        self.categories = self.DB.get_categories()
+        self.categories_by_id: dict[int, dict] = {
+            category['category_id']: category for category in self.categories}
+        self.player: Player = player_instance
+        self.game: Game = game_instance or Game(
+            player_id=player_instance.player_id)
+        # Movies and clues of the options last offered, by movie_id
+        self._round_packs: dict = {}
+
+    def start_game(self) -> list[dict]:
+        """
+        Starts a new game for the player
+        :return: list[dict] - the movie options of the first round
+        """
+        self.game = Game(player_id=self.player.player_id)
+        return self.get_options()
+
+    def get_options(self) -> list[dict]:
+        """
+        Get data to populate the Choose A Year Screen of the game. The options
+        are kept in the game until one is chosen, so asking again (such as
+        reloading the page) offers the same movies. The movies and clues of
+        all three options are fetched at once, so the round can start without
+        querying again whichever the player picks.
+        :return: list[dict] - movie_id and release_year of three movies
+        """
+        if not self.game.options:
+            self.game.options = self.DB.get_three_movie_options(
+                self.player.player_id)
+            self._round_packs = self.DB.get_round_packs(
+                [option['movie_id'] for option in self.game.options])
+        return list(self.game.options)
+
+    def _offered_movie_ids(self) -> set:
+        return {option['movie_id'] for option in self.game.options}
+
+    def round_in_progress(self) -> bool:
+        """
+        Returns True if a movie was chosen for the current round and the
+        round hasn't been won or lost yet
+        """
+        current_round = self.game.current_round
+        return current_round is not None and \
+            current_round.round_number == self.game.round
+
+    def choose_movie(self, movie_id: UUID) -> dict:
+        """
+        Starts the current round with the chosen movie
+        :return: dict - the first clue of the round, see next_clue()
+        :raises InvalidActionError: if the game is over, a round is already
+            being played, the movie isn't one of the options offered, or it
+            doesn't exist or has no clues
+        """
+        if self.game.GAME_OVER:
+            raise InvalidActionError('The game is over')
+        if self.round_in_progress():
+            raise InvalidActionError('A movie was already chosen this round')
+        if movie_id not in self._offered_movie_ids():
+            raise InvalidActionError(f'Movie {movie_id} was not offered')
+        # Options offered by another worker or process aren't prefetched here
+        pack = self._round_packs.get(movie_id) or \
+            self.DB.load_round(movie_id)
+        if pack is None:
+            raise InvalidActionError(f'Unknown movie {movie_id}')
+        if not pack.clues:
+            raise InvalidActionError(f'Movie {movie_id} has no clues')
+        self._round_packs = {}
+        self.game.options = []
+        self.game.current_round = Round(self.game.round, pack.movie,
+                                        clues_pool=list(pack.clues),
+                                        seed=self._rng.getrandbits(64))
+        if self.player.player_id:
+            self.DB.add_player_movie(self.player.player_id,
+                                     pack.movie.movie_id)
+        return self.next_clue()
+
+    def next_clue(self) -> dict:
+        """
+        Returns the clue the player should be looking at, hardest first. A
+        new clue is only drawn once the previous one was answered, so asking
+        again (such as reloading the page) shows the same clue.
+        :return: dict - clue_text, category, clue_number and round_number
+        :raises InvalidActionError: if no round is being played
+        """
+        if not self.round_in_progress():
+            raise InvalidActionError('No movie was chosen this round')
+        current_round = self.game.current_round
+        if len(current_round.clues_played) > current_round.current_clue_number:
+            clue = current_round.clues_played[-1]
+        else:
+            clue = current_round.get_random_clue()
+            if self.player.player_id:
+                self.DB.add_player_clue(self.player.player_id, clue.clue_id)
+        return {
+            'clue_text': clue.clue_text,
+            'category': self.categories_by_id[clue.category_id],
+            'clue_number': current_round.get_clue_number(),
+            'round_number': self.game.get_round(),
+        }
+
+    def submit_guess(self, guess: str) -> dict:
+        """
+        Scores the player's guess for the current round. A guess is correct
+        if it is closest to the movie's title, or an alternate title, allowing
+        for a missing leading article and a few typos. A correct guess ends
+        the round; a wrong guess or a pass moves on to the next clue,
+        and the round is lost once its clues run out.
+        :return: dict - result ('correct', 'wrong' or 'pass'), points, score,
+            action ('next_round' or 'next_clue'), the movie title if the
+            round ended, and game_over
+        :raises InvalidActionError: if no round is being played
+        """
+        if not self.round_in_progress():
+            raise InvalidActionError('No movie was chosen this round')
+        current_round = self.game.current_round
+        movie = current_round.current_movie
+        guessed_movie_id = None
+        if guess.strip().lower() == self.PASS:
+            result, points = 'pass', 0
+        else:
+            stripped_guess = strip_text(guess)
+            guessed_movie_id = movie.movie_id \
+                if stripped_guess == movie.stripped_title else \
+                self.DB.match_title(stripped_guess, prefer=movie.movie_id)
+            if guessed_movie_id == movie.movie_id:
+                result, points = 'correct', \
+                    current_round.get_current_points()
+            else:
+                result, points = 'wrong', -self.WRONG_ANSWER_DEDUCTION
+        if self.player.player_id and result != 'pass':
+            # Guess statistics feed the clue difficulty scores
+            self.DB.add_guess(self.player.player_id,
+                              current_round.clues_played[-1].clue_id, guess,
+                              result == 'correct', guessed_movie_id,
+                              self.game.game_id)
+        self.game.increment_score(points)
+        if result != 'correct':
+            current_round.increment_clue_number()
+        if result == 'correct' or self._out_of_clues():
+            self.game.increment_round()
+            action, title = 'next_round', current_round.current_movie.title
+        else:
+            action, title = 'next_clue', None
+        return {
+            'result': result,
+            'points': points,
+            'score': self.game.score,
+            'action': action,
+            'title': title,
+            'game_over': self.game.GAME_OVER,
+        }
+
+    def _out_of_clues(self) -> bool:
+        """
+        Returns True if the current round has no clues left to give
+        """
+        current_round = self.game.current_round
+        return current_round.current_clue_number >= \
+            current_round.total_clues or not current_round.clues_pool
@@ -3,42 +3,47 @@ GameShowHost class
 """
 from uuid import UUID, uuid4
 
+from .engine import GameEngine
 from ..database.handler import DBHandler
-from ..database.dataclasses import Clue, Game, Player, Round
-from ..utils.utils import justify_text, strip_text
+from ..database.dataclasses import Game, Player
+from ..utils.utils import justify_text
 
 
 class GameShowHost:
     """
-    The "game show host" class of the IMDb Game. Controls functions for playing
-    a game of IMDb. Currently only for running in the console.
+    The "game show host" class of the IMDb Game. The console front end of
+    GameEngine: prompts the player for choices and guesses, and prints what
+    the engine returns.
     Args:
         player_instance (Player): The player object for the current game
         game_instance (Game): The game object for the current game
     """
     ID: UUID = uuid4()
-    WRONG_ANSWER_DEDUCTION: int = 1
     PROMPT: str = '=> '
 
     def __init__(self, player_instance: Player,
                  game_instance: Game = None,
                  database: DBHandler = None):
-        if not database:
-            self.DB = DBHandler()
-        else:
-            self.DB = database
-        self.categories = self.DB.get_categories()
-        self.player: Player = player_instance
-        self.game: Game = game_instance or Game(
-            player_id=player_instance.player_id)
+        self.engine = GameEngine(player_instance, game_instance, database)
+        self.DB = self.engine.DB
+        self.categories = self.engine.categories
+        self.categories_by_id = self.engine.categories_by_id
         self._greet_player()
 
+    @property
+    def player(self) -> Player:
+        return self.engine.player
+
+    @property
+    def game(self) -> Game:
+        return self.engine.game
+
     def get_three_years(self) -> list[dict]:
         """
         Get data to populate the Choose A Year Screen of the game
         :return: list[dict] - list of movie data
         """
-        return self.DB.get_three_movie_options()
+        return self.engine.get_options()
 
     def prompt_user_for_year_choice(self) -> dict:
         """
@@ -68,51 +73,6 @@ class GameShowHost:
                 print("Invalid input. Please enter a valid year.")
         return chosen_movie
 
-    def __setup_current_round(self, chosen_movie: dict):
-        """
-        Creates a Round object that tracks clues played for a round
-        Args:
-            chosen_movie (dict): The movie data for the chosen movie
-        Returns:
-            None
-        """
-        movie = self.DB.get_movie_by_movie_id(chosen_movie['movie_id'])
-        self.game.current_round = Round(self.game.round, movie)
-        self.__set_clues_for_current_movie_choice()
-
-    def __set_clues_for_current_movie_choice(self):
-        """
-        Accepts a player movie choice dict and requests all clues associated
-        with the movie
-        :return: list[dict] - list of clue objects
-        """
-        self.game.current_round.clues_pool = self.DB.get_clues_by_movie_id(
-            self.game.current_round.current_movie.movie_id)
-
-    def _get_category_by_category_id(self, category_id: int):
-        """
-        Returns category dict pertaining to the provided category_id from
-        `self.categories`
-        Returns:
-            dict
-        """
-        category = list(filter(lambda item: item['category_id'] == category_id,
-                               self.categories))[0]
-        return category
-
-    def _announce_category_name(self, clue: Clue):
-        """
-        Print console message to player to say what kind of warning the clue is
-        intended to convey
-        Args:
-            clue (Clue): The clue object
-        Returns:
-            str - category name as string
-        """
-        category = self._get_category_by_category_id(clue.category_id)
-        print(f'This is a {category["display_name"]} warning!')
-        return category
-
     def _announce_categories(self):
         """
         Print console message to announce all possible categories and indicate
@@ -129,74 +89,30 @@ class GameShowHost:
         print(f'\n***Hello there {self.player.username}! Welcome to the '
               f'Inappropriate Movie Database!***\n\n')
 
-    def _evaluate_guess(self, guess) -> str:
-        """
-        Takes a player's guess text and decides whether it matches the title of
-        the round's movie or not.
-        """
-        if strip_text(
-                guess) == self.game.current_round.current_movie.stripped_title:
-            return self._player_answer_correct()
-        if strip_text(guess) == '/pass':
-            return self._player_skip()
-        else:
-            return self._player_answer_wrong(guess)
-
-    def _next_round(self) -> str:
-        """
-        Advances the game to the next round by increasing the round count and
-        returns the 'next_round' action.
-        """
-        self.game.increment_round()
-        return 'next_round'
-
-    def _next_clue(self) -> str:
-        """
-        Increase Round.current_clue_number and return 'next_clue' as action.
-        """
-        self.game.current_round.increment_clue_number()
-        return 'next_clue'
-
     def present_clue(self):
         """
-        Get a random clue from Round.clues_pool and pretty print to the console
-        """
-        clue = self.game.current_round.get_random_clue()
-        category = self._announce_category_name(clue)
-        print(justify_text(clue.clue_text, 80))
-        return {
-            'clue_text': clue.clue_text,
-            'category': category,
-            'clue_number': self.game.current_round.current_clue_number,
-            'round_number': self.game.get_round(),
-        }
-
-    def _player_answer_correct(self):
-        """
-        Actions to execute when the player answers correctly: increasing score
-        by the amount of points per current clue number
-        returns _next_round() actions
-        """
-        print(f'CORRECT: +{self.game.current_round.get_current_points()}')
-        self.game.increment_score(self.game.current_round.get_current_points())
-        return self._next_round()
-
-    def _player_answer_wrong(self, guess):
-        """
-        Actions to execute when the player answers incorrectly: decreasing score
-        by the default point decrement amount (self.WRONG_ANSWER_DEDUCTION)
-        returns _next_clue() actions
+        Get the current clue from the engine and pretty print it to the
+        console, along with what kind of warning it is
         """
-        print(f'WRONG: -{self.WRONG_ANSWER_DEDUCTION}')
-        self.game.decrement_score(self.WRONG_ANSWER_DEDUCTION)
-        return self._next_clue()
+        clue = self.engine.next_clue()
+        print(f'This is a {clue["category"]["display_name"]} warning!')
+        print(justify_text(clue['clue_text'], 80))
+        return clue
 
-    def _player_skip(self) -> str:
+    def _announce_guess_result(self, outcome: dict):
         """
-        Returns _next_clue() actions without changing score
+        Print console message for the outcome of a guess
+        Args:
+            outcome (dict): The result of GameEngine.submit_guess()
         """
-        print("Okay, let's try the next clue, then!")
-        return self._next_clue()
+        if outcome['result'] == 'correct':
+            print(f'CORRECT: +{outcome["points"]}')
+        elif outcome['result'] == 'wrong':
+            print(f'WRONG: {outcome["points"]}')
+        else:
+            print("Okay, let's try the next clue, then!")
+        if outcome['result'] != 'correct' and outcome['title']:
+            print(f'Out of clues! The movie was {outcome["title"]}')
 
     def _get_player_guess(self) -> str:
         """
@@ -215,13 +131,6 @@ class GameShowHost:
                 print("Invalid input. Please enter a valid guess.")
         return player_guess
 
-    def web_start_round(self):
-        """
-        Starts a new round for the web app
-        """
-        self.__setup_current_round(self.prompt_user_for_year_choice())
-        return self.present_clue()
-
     def game_loop(self):
         """
         Runs through the gameplay loop of IMDb Game. Will go until
@@ -231,12 +140,11 @@ class GameShowHost:
         while not self.game.GAME_OVER:
             if next_action == 'next_round':
                 player_movie_choice = self.prompt_user_for_year_choice()
-                self.__setup_current_round(player_movie_choice)
-                self.present_clue()
-            elif next_action == 'next_clue':
-                self.present_clue()
-            guess = self._get_player_guess()
-            next_action = self._evaluate_guess(guess)
+                self.engine.choose_movie(player_movie_choice['movie_id'])
+            self.present_clue()
+            outcome = self.engine.submit_guess(self._get_player_guess())
+            self._announce_guess_result(outcome)
+            next_action = outcome['action']
             self.game.report_score()
         print('GAME OVER')
         print(f'Final Score: {self.game.score}')
@@ -0,0 +1,157 @@
+"""
+Registry of per-user GameEngine instances for serving many games from one
+web process
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class _Session:
+    """
+    A registered host, the lock serializing requests against it and the time
+    it was last used
+    """
+    __slots__ = ('host', 'lock', 'last_used')
+
+    def __init__(self, host, last_used: float):
+        self.host = host
+        self.lock = threading.Lock()
+        self.last_used = last_used
+
+
+class SessionRegistry:
+    """
+    Creates, looks up and expires one game host per session id. Memory stays
+    bounded: sessions idle for more than `idle_timeout` seconds are dropped,
+    and once `max_sessions` are registered the least recently used one is
+    evicted to make room.
+    The registry lock is only held for dictionary bookkeeping. Requests for
+    the same session are serialized by that session's own lock, so one slow
+    game never blocks the others.
+    Unknown session ids passed to session() are registered as given, so a
+    session started by another worker can be picked up from shared state.
+    Args:
+        factory (callable): Returns a new host, given its session id
+        max_sessions (int): The most sessions kept in memory
+        idle_timeout (float): Seconds of inactivity before a session expires
+    """
+
+    def __init__(self, factory, max_sessions: int = 1000,
+                 idle_timeout: float = 30 * 60, clock=time.monotonic):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        return self._lookup(session_id, touch=False) is not None
+
+    def _lookup(self, session_id, touch: bool = True):
+        """
+        Returns the live _Session for session_id, or None if it is unknown or
+        has expired
+        """
+        now = self._clock()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if now - session.last_used > self.idle_timeout:
+                del self._sessions[session_id]
+                return None
+            if touch:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def get(self, session_id):
+        """
+        Returns the host for session_id, or None
+        """
+        session = self._lookup(session_id)
+        return session.host if session else None
+
+    def create(self, session_id: str = None):
+        """
+        Registers a host from the factory under session_id, or a new random
+        session id.
+        Returns:
+            tuple - (session_id, host)
+        """
+        session_id, session = self._create(session_id)
+        return session_id, session.host
+
+    def _create(self, session_id: str = None):
+        session_id = session_id or secrets.token_urlsafe(24)
+        # Build the host outside the registry lock, it may query the database
+        host = self.factory(session_id)
+        now = self._clock()
+        session = _Session(host, now)
+        with self._lock:
+            self._sessions[session_id] = session
+            self._expire(now)
+        return session_id, session
+
+    def get_or_create(self, session_id=None):
+        """
+        Returns the host for session_id, creating a new session if it is
+        missing or expired.
+        Returns:
+            tuple - (session_id, host)
+        """
+        if session_id:
+            host = self.get(session_id)
+            if host is not None:
+                return session_id, host
+        return self.create(session_id)
+
+    @contextmanager
+    def session(self, session_id=None):
+        """
+        Context manager yielding (session_id, host) for session_id, or a new
+        session, while holding that session's lock
+        """
+        session = self._lookup(session_id) if session_id else None
+        if session is None:
+            session_id, session = self._create(session_id)
+        with session.lock:
+            yield session_id, session.host
+
+    def discard(self, session_id):
+        """
+        Removes a session, if it is registered
+        """
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def expire(self) -> int:
+        """
+        Removes every idle session.
+        Returns:
+            int - the number of sessions removed
+        """
+        with self._lock:
+            return self._expire(self._clock())
+
+    def _expire(self, now: float) -> int:
+        """
+        Drops idle sessions from the least recently used end, then evicts the
+        oldest sessions while over max_sessions. Caller holds the lock.
+        """
+        removed = 0
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_timeout and \
+                    len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+            removed += 1
+        return removed
@@ -0,0 +1,277 @@
+"""
+Game state stores, so that any web worker can serve the next request of any
+game instead of games living in one process' memory
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from uuid import UUID
+
+import msgpack
+
+from ..database.dataclasses import Clue, Game, Movie, Player, Round
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class StaleStateError(Exception):
+    """
+    Raised when saving a game state that was changed by another writer since
+    it was loaded
+    """
+
+    def __init__(self, state_key: str):
+        super().__init__(f'Game state {state_key} was changed by another '
+                         f'request')
+        self.state_key = state_key
+
+
+@dataclass
+class GameState:
+    """
+    The player and game of one session, along with the stored version they
+    were loaded at (0 if never saved)
+    """
+    player: Player
+    game: Game
+    version: int = 0
+
+
+def _pack_uuid(value: UUID):
+    return value.bytes if value is not None else None
+
+
+def _unpack_uuid(value: bytes):
+    return UUID(bytes=value) if value is not None else None
+
+
+def _pack_datetime(value: datetime):
+    return (value - _EPOCH) // _MICROSECOND if value is not None else None
+
+
+def _unpack_datetime(value: int):
+    return _EPOCH + value * _MICROSECOND if value is not None else None
+
+
+def _pack_clue(clue: Clue) -> list:
+    # movie_id is left out, it is always the movie of the round
+    return [_pack_uuid(clue.clue_id), clue.category_id, clue.clue_text,
+            clue.spoiler, _pack_datetime(clue.date_created), clue.difficulty]
+
+
+def _unpack_clue(values: list, movie_id: UUID) -> Clue:
+    clue_id, category_id, clue_text, spoiler, date_created, difficulty = \
+        values
+    return Clue(movie_id=movie_id, category_id=category_id,
+                clue_text=clue_text, spoiler=spoiler,
+                date_created=_unpack_datetime(date_created),
+                clue_id=_unpack_uuid(clue_id), difficulty=difficulty)
+
+
+def _pack_round(game_round: Round):
+    if game_round is None:
+        return None
+    movie = game_round.current_movie
+    return [game_round.round_number,
+            [_pack_uuid(movie.movie_id), movie.imdb_id, movie.title,
+             movie.stripped_title, movie.release_year],
+            [_pack_clue(clue) for clue in game_round.clues_pool],
+            [_pack_clue(clue) for clue in game_round.clues_played],
+            game_round.current_clue_number, game_round.total_clues,
+            _pack_uuid(game_round.game_id), game_round.seed,
+            game_round.shuffled]
+
+
+def _unpack_round(values: list):
+    if values is None:
+        return None
+    (round_number, movie_values, clues_pool, clues_played,
+     current_clue_number, total_clues, game_id, seed, shuffled) = values
+    movie_id, imdb_id, title, stripped_title, release_year = movie_values
+    movie = Movie(imdb_id=imdb_id, title=title,
+                  stripped_title=stripped_title, release_year=release_year,
+                  movie_id=_unpack_uuid(movie_id))
+    return Round(round_number, movie,
+                 clues_pool=[_unpack_clue(clue, movie.movie_id)
+                             for clue in clues_pool],
+                 clues_played=[_unpack_clue(clue, movie.movie_id)
+                               for clue in clues_played],
+                 current_clue_number=current_clue_number,
+                 total_clues=total_clues, game_id=_unpack_uuid(game_id),
+                 seed=seed, shuffled=shuffled)
+
+
+def pack_state(state: GameState) -> bytes:
+    """
+    Serializes the player and game of a GameState to compact msgpack bytes,
+    with fields stored by position and UUIDs and datetimes as binary and
+    integers
+    """
+    player, game = state.player, state.game
+    return msgpack.packb([
+        [player.username, _pack_uuid(player.player_id),
+         _pack_datetime(player.date_created),
+         _pack_datetime(player.date_last_played)],
+        [_pack_uuid(game.player_id), game.score, game.round,
+         _pack_datetime(game.start_time), _pack_datetime(game.end_time),
+         _pack_uuid(game.game_id), _pack_round(game.current_round),
+         game.MAX_ROUNDS, game.GAME_OVER,
+         [[_pack_uuid(option['movie_id']), option['release_year']]
+          for option in game.options]]])
+
+
+def unpack_state(data: bytes, version: int = 0) -> GameState:
+    """
+    Rebuilds a GameState from bytes made by pack_state()
+    """
+    player_values, game_values = msgpack.unpackb(data)
+    username, player_id, date_created, date_last_played = player_values
+    player = Player(username=username, player_id=_unpack_uuid(player_id),
+                    date_created=_unpack_datetime(date_created),
+                    date_last_played=_unpack_datetime(date_last_played))
+    (player_id, score, game_round, start_time, end_time, game_id,
+     current_round, max_rounds, game_over, options) = game_values
+    game = Game(player_id=_unpack_uuid(player_id), score=score,
+                round=game_round, start_time=_unpack_datetime(start_time),
+                end_time=_unpack_datetime(end_time),
+                game_id=_unpack_uuid(game_id),
+                current_round=_unpack_round(current_round),
+                MAX_ROUNDS=max_rounds, GAME_OVER=game_over,
+                options=[{'movie_id': _unpack_uuid(movie_id),
+                          'release_year': release_year}
+                         for movie_id, release_year in options])
+    return GameState(player, game, version)
+
+
+class MemoryGameStateStore:
+    """
+    Keeps packed game states in memory, for a single process or for tests.
+    Shares the load/save/delete/expire interface of PostgresGameStateStore.
+    Memory stays bounded like in SessionRegistry: states not saved for
+    `idle_timeout` seconds are dropped, and once `max_states` are stored the
+    least recently saved one is evicted to make room.
+    """
+
+    def __init__(self, max_states: int = 10000,
+                 idle_timeout: float = 30 * 60, clock=time.monotonic):
+        self.max_states = max_states
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        # state_key -> (packed state, version, time saved), least recently
+        # saved first
+        self._states: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._states)
+
+    def load(self, state_key: str):
+        """
+        Returns the stored GameState, or None if it is missing or expired
+        """
+        with self._lock:
+            stored = self._states.get(state_key)
+            if stored and self._clock() - stored[2] > self.idle_timeout:
+                del self._states[state_key]
+                stored = None
+        return unpack_state(stored[0], stored[1]) if stored else None
+
+    def save(self, state_key: str, state: GameState) -> int:
+        """
+        Stores the state and bumps state.version.
+        Raises:
+            StaleStateError - if the stored version is not state.version
+        """
+        data = pack_state(state)
+        now = self._clock()
+        with self._lock:
+            stored = self._states.get(state_key)
+            if stored and now - stored[2] > self.idle_timeout:
+                stored = None
+            if (stored[1] if stored else 0) != state.version:
+                raise StaleStateError(state_key)
+            state.version += 1
+            self._states[state_key] = (data, state.version, now)
+            self._states.move_to_end(state_key)
+            self._expire(now, self.idle_timeout)
+        return state.version
+
+    def delete(self, state_key: str):
+        """
+        Removes a stored state
+        """
+        with self._lock:
+            self._states.pop(state_key, None)
+
+    def expire(self, max_age: float = None) -> int:
+        """
+        Removes states not saved in the last `max_age` seconds, idle_timeout
+        by default
+        Returns:
+            int - the number of states removed
+        """
+        with self._lock:
+            return self._expire(
+                self._clock(),
+                self.idle_timeout if max_age is None else max_age)
+
+    def _expire(self, now: float, max_age: float) -> int:
+        """
+        Drops old states from the least recently saved end, then evicts the
+        oldest states while over max_states. Caller holds the lock.
+        """
+        removed = 0
+        while self._states:
+            state_key, (_, _, saved_at) = next(iter(self._states.items()))
+            if now - saved_at <= max_age and \
+                    len(self._states) <= self.max_states:
+                break
+            del self._states[state_key]
+            removed += 1
+        return removed
+
+
+class PostgresGameStateStore:
+    """
+    Keeps packed game states in the `game_states` table so every worker
+    connected to the database sees the same games. Saves are a single
+    conditional UPDATE on the version column.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def load(self, state_key: str):
+        """
+        Returns the stored GameState, or None
+        """
+        stored = self.database.get_game_state(state_key)
+        return unpack_state(*stored) if stored else None
+
+    def save(self, state_key: str, state: GameState) -> int:
+        """
+        Stores the state and bumps state.version.
+        Raises:
+            StaleStateError - if the stored version is not state.version
+        """
+        version = self.database.save_game_state(state_key, pack_state(state),
+                                                state.version)
+        if version is None:
+            raise StaleStateError(state_key)
+        state.version = version
+        return version
+
+    def delete(self, state_key: str):
+        """
+        Removes a stored state
+        """
+        self.database.delete_game_state(state_key)
+
+    def expire(self, max_age: float):
+        """
+        Removes states not saved in the last `max_age` seconds
+        """
+        self.database.delete_expired_game_states(max_age)
@@ -0,0 +1,180 @@
+"""
+On-disk cache of scraped pages, so that repeated scraper runs can revalidate
+or skip downloads instead of fetching every page again
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+DEFAULT_CACHE_PATH: str = os.path.join(os.path.expanduser('~'), '.cache',
+                                       'imdb_game', 'pages.sqlite3')
+DEFAULT_TTL: float = 24 * 60 * 60
+DEFAULT_MAX_BYTES: int = 256 * 1024 * 1024
+
+
+@dataclass
+class CachedPage:
+    """
+    A page body stored in the PageCache along with its HTTP validators
+    """
+    url: str
+    body: str
+    etag: str = None
+    last_modified: str = None
+    fetched_at: float = 0
+
+    def is_fresh(self, ttl: float) -> bool:
+        """
+        Returns True if the page was fetched or revalidated within `ttl`
+        seconds
+        """
+        return time.time() - self.fetched_at < ttl
+
+    def validators(self) -> dict:
+        """
+        Returns the conditional request headers for revalidating this page
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """
+    SQLite-backed page cache keyed by a hash of the URL. Bodies are stored
+    zlib-compressed, entries go stale after `ttl` seconds and the least
+    recently used entries are evicted once the cache grows past `max_bytes`.
+    In `offline` mode, stored pages are served regardless of age.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 ttl: float = DEFAULT_TTL,
+                 max_bytes: int = DEFAULT_MAX_BYTES,
+                 offline: bool = False):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self.connection:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages
+                (
+                    key           TEXT PRIMARY KEY,
+                    url           TEXT NOT NULL,
+                    body          BLOB NOT NULL,
+                    size          INTEGER NOT NULL,
+                    etag          TEXT,
+                    last_modified TEXT,
+                    fetched_at    REAL NOT NULL,
+                    accessed_at   REAL NOT NULL
+                )""")
+            self.connection.execute("""
+                CREATE INDEX IF NOT EXISTS idx_accessed_at
+                ON pages (accessed_at)""")
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def get(self, url: str):
+        """
+        Returns the CachedPage stored for the url, or None
+        """
+        key = self._key(url)
+        with self._lock, self.connection:
+            row = self.connection.execute(
+                """SELECT body, etag, last_modified, fetched_at
+                FROM pages WHERE key = ?""", [key]).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                'UPDATE pages SET accessed_at = ? WHERE key = ?',
+                [time.time(), key])
+        body, etag, last_modified, fetched_at = row
+        return CachedPage(url=url, body=zlib.decompress(body).decode('utf-8'),
+                          etag=etag, last_modified=last_modified,
+                          fetched_at=fetched_at)
+
+    def put(self, url: str, body: str, etag: str = None,
+            last_modified: str = None):
+        """
+        Stores a freshly fetched page body, then evicts old entries if the
+        cache is over its size limit
+        """
+        compressed = zlib.compress(body.encode('utf-8'))
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute(
+                """INSERT OR REPLACE INTO pages (key, url, body, size, etag,
+                last_modified, fetched_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [self._key(url), url, compressed, len(compressed), etag,
+                 last_modified, now, now])
+            self._evict()
+
+    def touch(self, url: str, etag: str = None, last_modified: str = None):
+        """
+        Marks a stored page as fresh again after a 304 Not Modified, keeping
+        any new validators the response came with
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute(
+                """UPDATE pages SET fetched_at = ?, accessed_at = ?,
+                etag = COALESCE(?, etag),
+                last_modified = COALESCE(?, last_modified)
+                WHERE key = ?""",
+                [now, now, etag, last_modified, self._key(url)])
+
+    def size(self) -> int:
+        """
+        Returns the total compressed size of all stored pages in bytes
+        """
+        with self._lock:
+            return self._size()
+
+    def _size(self) -> int:
+        return self.connection.execute(
+            'SELECT coalesce(sum(size), 0) FROM pages').fetchone()[0]
+
+    def _evict(self):
+        """
+        Deletes least recently used pages until the cache fits in max_bytes
+        """
+        excess = self._size() - self.max_bytes
+        if excess <= 0:
+            return
+        rows = self.connection.execute(
+            'SELECT key, size FROM pages ORDER BY accessed_at')
+        doomed = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            doomed.append([key])
+            excess -= size
+        self.connection.executemany('DELETE FROM pages WHERE key = ?', doomed)
+
+    def clear(self):
+        """
+        Deletes every stored page
+        """
+        with self._lock, self.connection:
+            self.connection.execute('DELETE FROM pages')
+
+    def close(self):
+        """
+        Closes the connection to the cache database
+        """
+        self.connection.close()
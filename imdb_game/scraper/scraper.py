@@ -1,14 +1,57 @@
 """
 Functions for scraping imdb.com for movie clues
 """
+import csv
+import hashlib
+import os
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from uuid import UUID
 import requests
 from bs4 import BeautifulSoup
-from database import DBHandler
-from utils import strip_text, IMDB_ROOT
-from imdb_dataclasses import Movie, Clue
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .cache import (PageCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES,
+                    DEFAULT_TTL)
+from ..database.catalogue import Catalogue
+from ..database.corpus import write_corpus
+from ..database.handler import DBHandler
+from ..database.dataclasses import Movie, Clue
+from ..utils.utils import clue_leaks_title, strip_texts, IMDB_ROOT
 import argparse
 
+DEFAULT_DATA_DIR: str = os.path.join(os.path.dirname(__file__), '..', '..',
+                                     'db', 'data')
+DEFAULT_CONCURRENCY: int = 8
+DEFAULT_RATE_LIMIT: float = 5.0
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT: tuple = (3.05, 20)
+DEFAULT_RETRIES: int = 4
+DEFAULT_BACKOFF: float = 0.5
+RETRY_STATUSES: tuple = (429, 500, 502, 503, 504)
+USER_AGENT: str = ('Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+_session: requests.Session = None
+_session_settings: dict = {}
+_session_lock = threading.Lock()
+_page_cache: PageCache = None
+
+
+class PageLoadError(Exception):
+    """
+    Raised when a page could not be loaded, after retries where they apply
+    """
+
+    def __init__(self, url: str, reason: str, status_code: int = None):
+        self.url = url
+        self.reason = reason
+        self.status_code = status_code
+        super().__init__(f'Failed to load {url}: {reason}')
+
 
 def clean_whitespace(text: str):
     """
@@ -18,16 +61,144 @@ def clean_whitespace(text: str):
     return text.replace('\n', '').replace(warning_whitespace, '').strip()
 
 
-def load_webpage(url: str):
+class HostRateLimiter:
+    """
+    Spaces out requests so that no more than `rate` requests per second are
+    started against any single host, no matter how many workers are fetching.
+    A rate of 0 disables the limit.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE_LIMIT):
+        self.interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_slot: dict[str, float] = {}
+
+    def wait(self, url: str):
+        """
+        Blocks the calling thread until it may send a request to the host of
+        the provided url
+        """
+        if not self.interval:
+            return
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def configure_session(pool_size: int = DEFAULT_CONCURRENCY,
+                      retries: int = DEFAULT_RETRIES,
+                      backoff_factor: float = DEFAULT_BACKOFF):
+    """
+    Replaces the shared scraper session with one that keeps up to `pool_size`
+    connections per host alive and retries failed connections and 429/5xx
+    responses `retries` times with exponential backoff, honouring Retry-After.
+    Returns:
+        requests.Session
+    """
+    global _session, _session_settings
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET', 'HEAD']),
+                  respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    with _session_lock:
+        old_session, _session = _session, session
+        _session_settings = {'pool_size': pool_size, 'retries': retries,
+                             'backoff_factor': backoff_factor}
+    if old_session:
+        old_session.close()
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the shared scraper session, creating it on first use
     """
-    Returns a BeautifulSoup object for the provided url.
-    If the url is invalid, returns None.
+    if _session is None:
+        configure_session()
+    return _session
+
+
+def configure_cache(path: str = DEFAULT_CACHE_PATH, ttl: float = DEFAULT_TTL,
+                    max_bytes: int = DEFAULT_MAX_BYTES,
+                    offline: bool = False):
     """
+    Routes every page load through an on-disk PageCache at `path`. Passing
+    None as the path turns the cache off.
+    Returns:
+        PageCache or None
+    """
+    global _page_cache
+    old_cache = _page_cache
+    _page_cache = PageCache(path, ttl, max_bytes, offline) if path else None
+    if old_cache:
+        old_cache.close()
+    return _page_cache
+
+
+def fetch_page(url: str, timeout: tuple = DEFAULT_TIMEOUT,
+               limiter: HostRateLimiter = None) -> str:
+    """
+    Returns the body of the page at the provided url. Fresh cached pages are
+    served without a request and stale ones are revalidated with their
+    ETag/Last-Modified validators. If revalidation fails or answers with an
+    error status, the stale copy is served rather than failing. Only
+    requests that go out over the network wait for the `limiter`.
+    Raises:
+        PageLoadError - if the page could not be loaded or kept answering with
+        an error status
+    """
+    cache = _page_cache
+    cached = cache.get(url) if cache else None
+    if cached and (cache.offline or cached.is_fresh(cache.ttl)):
+        return cached.body
+    if cache and cache.offline:
+        raise PageLoadError(url, 'not in the offline page cache')
+    headers = cached.validators() if cached else {}
+    if limiter:
+        limiter.wait(url)
     try:
-        response = requests.get(url)
-        return BeautifulSoup(response.text, "html.parser")
-    except requests.exceptions.RequestException:
-        return None
+        response = get_session().get(url, timeout=timeout, headers=headers)
+    except requests.exceptions.RequestException as exc:
+        if cached:
+            print(f'Serving stale {url}: {exc}')
+            return cached.body
+        raise PageLoadError(url, str(exc)) from exc
+    if response.status_code == 304 and cached:
+        cache.touch(url, response.headers.get('ETag'),
+                    response.headers.get('Last-Modified'))
+        return cached.body
+    if response.status_code >= 400:
+        if cached:
+            print(f'Serving stale {url}: {response.status_code} '
+                  f'{response.reason}')
+            return cached.body
+        raise PageLoadError(url, response.reason, response.status_code)
+    if cache:
+        cache.put(url, response.text, response.headers.get('ETag'),
+                  response.headers.get('Last-Modified'))
+    return response.text
+
+
+def load_webpage(url: str, timeout: tuple = DEFAULT_TIMEOUT,
+                 limiter: HostRateLimiter = None):
+    """
+    Returns a BeautifulSoup object for the provided url, fetched over the
+    shared pooled session or served from the page cache.
+    Raises:
+        PageLoadError - if the page could not be loaded or kept answering with
+        an error status
+    """
+    return BeautifulSoup(fetch_page(url, timeout, limiter), "html.parser")
 
 
 def create_clues_list(soup: BeautifulSoup, categories, movie_object: Movie):
@@ -53,7 +224,9 @@ def create_clues_list(soup: BeautifulSoup, categories, movie_object: Movie):
                 entry = Clue(
                     clue_text=text, spoiler=spoiler,
                     movie_id=movie_object.movie_id,
-                    category_id=category[0]['category_id']
+                    category_id=category[0]['category_id'],
+                    date_created=datetime.utcnow(),
+                    title_leak=clue_leaks_title(text, movie_object.title)
                 )
                 clues.append(entry)
     return clues
@@ -78,6 +251,8 @@ def get_title(url):
     url = f'{IMDB_ROOT}{url}'
     print(url)
     soup = load_webpage(url)
+    if soup.h1 is None:
+        raise PageLoadError(url, 'page has no title')
     return soup.h1.text
 
 
@@ -87,50 +262,250 @@ def get_top_250_movies():
     """
     print('Loading the top 250 Movies to MongoDB...')
     soup = load_webpage(f'{IMDB_ROOT}/chart/top/')
-    movies = []
-    for tag in soup.find_all(class_='titleColumn'):
-        movies.append(Movie(
-            imdb_id=tag.a['href'].split('/')[-2], title=tag.a.text,
-            stripped_title=strip_text(tag.a.text),
-            release_year=int(tag.span.text.replace('(', '').replace(')', ''))
-        ))
-    return movies
+    tags = soup.find_all(class_='titleColumn')
+    stripped_titles = strip_texts(tag.a.text for tag in tags)
+    return [Movie(imdb_id=tag.a['href'].split('/')[-2], title=tag.a.text,
+                  stripped_title=stripped_title,
+                  release_year=int(
+                      tag.span.text.replace('(', '').replace(')', '')))
+            for tag, stripped_title in zip(tags, stripped_titles)]
 
 
 def insert_movies(database_handler, movies: list[Movie]):
     """
     Populates the `movies` table with IMDb's top 250 Movies as a starter set
     """
-    for movie in movies:
-        movie_id = database_handler.add_movie(movie.dict())
+    movie_ids = database_handler.add_movies_bulk(movies)
+    for movie, movie_id in zip(movies, movie_ids):
         movie.movie_id = movie_id
 
 
-def initial_setup():
+def get_parental_guide_url(movie: Movie, root: str = IMDB_ROOT) -> str:
+    """
+    Returns the parental guide URL for the Movie under the provided root
+    """
+    return f'{root}/title/{movie.imdb_id}/parentalguide'
+
+
+def scrape_parental_guide(movie: Movie, categories,
+                          limiter: HostRateLimiter = None,
+                          root: str = IMDB_ROOT):
+    """
+    Loads and parses the parental guide for a single Movie.
+    Returns:
+        tuple - (Movie, list of Clue objects), the list is None if the page
+        failed to load or to parse
+    """
+    url = get_parental_guide_url(movie, root)
+    try:
+        soup_page = load_webpage(url, limiter=limiter)
+    except PageLoadError as exc:
+        print(f'{exc}, skipping')
+        return movie, None
+    try:
+        return movie, create_clues_list(soup_page, categories, movie)
+    except (AttributeError, IndexError, KeyError, TypeError,
+            ValueError) as exc:
+        # One malformed page must not abort the rest of the crawl
+        print(f'Failed to parse {url}: {exc!r}, skipping')
+        return movie, None
+
+
+def crawl_parental_guides(movies: list[Movie], categories,
+                          concurrency: int = DEFAULT_CONCURRENCY,
+                          rate_limit: float = DEFAULT_RATE_LIMIT,
+                          root: str = IMDB_ROOT):
+    """
+    Fetches and parses the parental guides of all movies on a bounded pool of
+    `concurrency` worker threads, sharing one per-host rate limit.
+    Yields (Movie, list of Clue objects) as each page finishes, so the caller
+    can write results from a single thread while the crawl continues. Pages
+    that fail to load or to parse yield None instead of a list.
+    """
+    if _session_settings.get('pool_size', 0) < concurrency:
+        configure_session(**{**_session_settings, 'pool_size': concurrency})
+    limiter = HostRateLimiter(rate_limit)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(scrape_parental_guide, movie, categories,
+                                   limiter, root)
+                   for movie in movies]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def hash_parental_guide(clues: list[Clue]) -> str:
+    """
+    Returns a content hash of a parsed parental guide. Only the advisory
+    entries are hashed, so markup changes on IMDb's side do not count as a
+    changed guide.
+    """
+    digest = hashlib.sha256()
+    for clue in clues:
+        digest.update(f'{clue.category_id}|{clue.spoiler:d}|'
+                      f'{clue.clue_text}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def store_parental_guides(database_handler, crawl_results,
+                          known_hashes: dict = None) -> dict:
+    """
+    Writes crawled clues to the `clues` table from the calling thread.
+    Movies whose guide hash matches `known_hashes` (imdb_id -> hash) are
+    skipped, and clues already stored for a movie are not inserted again.
+    Returns:
+        dict - counts of 'updated', 'unchanged' and 'failed' movies and of
+        'new_clues'
+    """
+    known_hashes = known_hashes or {}
+    stats = {'updated': 0, 'unchanged': 0, 'failed': 0, 'new_clues': 0}
+    failed = []
+    for movie, clues in crawl_results:
+        if clues is None:
+            failed.append(movie.imdb_id)
+            continue
+        guide_hash = hash_parental_guide(clues)
+        if known_hashes.get(movie.imdb_id) == guide_hash:
+            stats['unchanged'] += 1
+            continue
+        stats['new_clues'] += database_handler.add_clues_bulk(clues)
+        database_handler.set_guide_hash(movie.movie_id, guide_hash)
+        stats['updated'] += 1
+    stats['failed'] = len(failed)
+    if failed:
+        print(f'Failed to load {len(failed)} parental guides: '
+              f'{", ".join(failed)}')
+    return stats
+
+
+def initial_setup(concurrency: int = DEFAULT_CONCURRENCY,
+                  rate_limit: float = DEFAULT_RATE_LIMIT,
+                  incremental: bool = False, notify: bool = True):
     """
     Sets up a database with the top 250 movies and clues for each movie.
     This is usually for the first time the scraper is run.
+    Parental guides are crawled concurrently, while this thread is the only
+    one writing to the database. With `incremental`, movies whose parental
+    guide has not changed since the last run are skipped and only new clues
+    are inserted. Without `notify`, the web workers aren't told the
+    catalogue changed, such as when a snapshot is published afterwards.
     """
     db = DBHandler()
     movies = get_top_250_movies()
     insert_movies(db, movies)
     categories = db.get_categories()
-    for movie in movies:
-        parental_guide_link = f'{movie.get_link()}/parentalguide'
-        soup_page = load_webpage(parental_guide_link)
-        clues = create_clues_list(soup_page, categories, movie)
-        for clue in clues:
-            db.add_clue(clue.dict())
+    known_hashes = db.get_guide_hashes() if incremental else None
+    stats = store_parental_guides(
+        db, crawl_parental_guides(movies, categories, concurrency, rate_limit),
+        known_hashes)
+    print(f"Updated {stats['updated']} movies with {stats['new_clues']} new "
+          f"clues, {stats['unchanged']} unchanged, {stats['failed']} failed")
+    if notify:
+        db.notify_catalogue_changed()
     del db
 
 
+def refresh(concurrency: int = DEFAULT_CONCURRENCY,
+            rate_limit: float = DEFAULT_RATE_LIMIT, notify: bool = True):
+    """
+    Incrementally re-scrapes the top 250 movies, only writing clues for
+    movies whose parental guide changed since the last run
+    """
+    initial_setup(concurrency, rate_limit, incremental=True, notify=notify)
+
+
+def read_csv_data(data_dir: str = DEFAULT_DATA_DIR) -> tuple:
+    """
+    Reads the movies.csv and clues.csv exports in `data_dir`, flagging title
+    leaks the same way as at ingest
+    Returns:
+        tuple - list[Movie], list[Clue]
+    """
+    with open(os.path.join(data_dir, 'movies.csv'), encoding='utf-8') as file:
+        movies = [Movie(movie_id=UUID(row['movie_id']), imdb_id=row['imdb_id'],
+                        title=row['title'],
+                        stripped_title=row['stripped_title'],
+                        release_year=int(row['release_year']))
+                  for row in csv.DictReader(file)]
+    titles = {movie.movie_id: movie.title for movie in movies}
+    with open(os.path.join(data_dir, 'clues.csv'), encoding='utf-8') as file:
+        clues = [Clue(clue_id=UUID(row['clue_id']),
+                      movie_id=UUID(row['movie_id']),
+                      category_id=int(row['category_id']),
+                      clue_text=row['clue_text'],
+                      spoiler=row['spoiler'] == 'true',
+                      date_created=datetime.fromisoformat(row['date_created']),
+                      title_leak=clue_leaks_title(
+                          row['clue_text'], titles[UUID(row['movie_id'])]))
+                 for row in csv.DictReader(file)]
+    return movies, clues
+
+
+def load_csv_data(database_handler, data_dir: str = DEFAULT_DATA_DIR,
+                  notify: bool = True):
+    """
+    Seeds the `movies` and `clues` tables from the movies.csv and clues.csv
+    exports in `data_dir` using the bulk ingestion path
+    """
+    movies, clues = read_csv_data(data_dir)
+    database_handler.add_movies_bulk(movies)
+    inserted = database_handler.add_clues_bulk(clues)
+    if notify:
+        database_handler.notify_catalogue_changed()
+    return inserted
+
+
+def classify_clues(database_handler, notify: bool = True) -> int:
+    """
+    Runs the title leak check again on every stored clue, storing the flags
+    that changed, such as after improving clue_leaks_title()
+    Returns:
+        int - the number of clues whose flag changed
+    """
+    changed = {clue_id: not title_leak
+               for clue_id, clue_text, title, title_leak
+               in database_handler.get_clue_titles()
+               if clue_leaks_title(clue_text, title) != title_leak}
+    database_handler.set_title_leaks(changed)
+    if changed and notify:
+        database_handler.notify_catalogue_changed()
+    print(f'{len(changed)} clues reclassified')
+    return len(changed)
+
+
+def write_snapshot(database_handler, path: str) -> Catalogue:
+    """
+    Writes every playable movie and clue to a catalogue snapshot file, which
+    web workers started afterwards load instead of querying the database
+    """
+    catalogue = Catalogue.from_database(database_handler)
+    catalogue.save(path)
+    print(f'Wrote {len(catalogue)} movies and {catalogue.clue_count} clues '
+          f'to {path}')
+    return catalogue
+
+
+def export_corpus(database_handler, path: str, data_dir: str = None) -> int:
+    """
+    Writes a memory-mapped clue corpus file of every movie and clue, read
+    from the `movies` and `clues` tables, or from the CSV exports in
+    `data_dir` if given. Categories always come from the database.
+    Returns:
+        int - the number of clues written
+    """
+    if data_dir:
+        movies, clues = read_csv_data(data_dir)
+    else:
+        movies, clues = database_handler.get_movies(), \
+            database_handler.get_clues()
+    write_corpus(path, movies, clues, database_handler.get_categories())
+    print(f'Wrote {len(movies)} movies and {len(clues)} clues to {path}')
+    return len(clues)
+
+
 def get_args(override: list = None):
     """
     Parses the command line arguments
     """
-    if override is None:
-        override = []
-    # """
     parser = argparse.ArgumentParser(
         prog='scraper',
         description='Scrapes IMDb')
@@ -138,6 +513,22 @@ def get_args(override: list = None):
                         action='store_true', default=False,
                         help='Generate movies and clues from the IMDB Top'
                              '250 Movies of All Time')
+    parser.add_argument('--refresh', '-R', dest='refresh',
+                        action='store_true', default=False,
+                        help='Only store clues for movies whose parental '
+                             'guide changed since the last run')
+    parser.add_argument('--from-csv', dest='from_csv', nargs='?',
+                        const=DEFAULT_DATA_DIR, default=None,
+                        help='Seed the database from the movies.csv and '
+                             'clues.csv exports in this directory')
+    parser.add_argument('--classify-clues', dest='classify_clues',
+                        action='store_true', default=False,
+                        help='Check every stored clue for title leaks again')
+    parser.add_argument('--snapshot', dest='snapshot', default=None,
+                        help='Write a catalogue snapshot file here once done')
+    parser.add_argument('--corpus', dest='corpus', default=None,
+                        help='Write a memory-mapped clue corpus file here '
+                             'once done')
     # add and argument for verbose output
     parser.add_argument('--verbose', '-v', dest='verbose',
                         action='store_true', default=False,
@@ -146,14 +537,53 @@ def get_args(override: list = None):
     parser.add_argument('--database', '-d', dest='database',
                         default='imdb',
                         help='The name of the database to use')
+    # arguments to tune the parental guide crawl
+    parser.add_argument('--concurrency', '-c', dest='concurrency', type=int,
+                        default=DEFAULT_CONCURRENCY,
+                        help='Number of parental guide pages fetched at once')
+    parser.add_argument('--rate-limit', '-r', dest='rate_limit', type=float,
+                        default=DEFAULT_RATE_LIMIT,
+                        help='Maximum requests per second sent to one host, '
+                             '0 for no limit')
+    # arguments to control the page cache
+    parser.add_argument('--cache', dest='cache', default=DEFAULT_CACHE_PATH,
+                        help='Path of the on-disk page cache')
+    parser.add_argument('--no-cache', dest='cache', action='store_const',
+                        const=None, help='Always download pages')
+    parser.add_argument('--cache-ttl', dest='cache_ttl', type=float,
+                        default=DEFAULT_TTL,
+                        help='Seconds before a cached page is revalidated')
+    parser.add_argument('--cache-size', dest='cache_size', type=int,
+                        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help='Maximum size of the page cache in MiB')
+    parser.add_argument('--offline', dest='offline', action='store_true',
+                        default=False,
+                        help='Only use pages already in the cache')
     args = parser.parse_args(override)
     return args
 
 
 def main():
     args = get_args()
+    configure_cache(args.cache, args.cache_ttl,
+                    args.cache_size * 1024 * 1024, args.offline)
+    # Web workers serving a snapshot reload it when told the catalogue
+    # changed, so only tell them once the new files are written
+    publish = bool(args.snapshot or args.corpus)
     if args.initial_setup:
-        initial_setup()
+        initial_setup(args.concurrency, args.rate_limit, notify=not publish)
+    elif args.refresh:
+        refresh(args.concurrency, args.rate_limit, notify=not publish)
+    elif args.from_csv:
+        load_csv_data(DBHandler(), args.from_csv, notify=not publish)
+    elif args.classify_clues:
+        classify_clues(DBHandler(), notify=not publish)
+    if args.snapshot:
+        write_snapshot(DBHandler(), args.snapshot)
+    if args.corpus:
+        export_corpus(DBHandler(), args.corpus)
+    if publish:
+        DBHandler().notify_catalogue_changed()
 
 
 # Todo:
@@ -0,0 +1,82 @@
+"""
+Fast title normalisation for comparing guesses with titles, equivalent to
+decomposing with NFKD, dropping accents and anything that isn't a letter or
+a digit, then lowercasing
+"""
+import unicodedata
+from functools import lru_cache
+
+# Every ASCII byte that isn't a letter or a digit, deleted in one pass
+_ASCII_DELETE: bytes = bytes(
+    byte for byte in range(128) if not chr(byte).isalnum())
+# Joins the ASCII texts of a batch, kept by the translation
+_BATCH_SEPARATOR: str = '\x00'
+_ASCII_BATCH_DELETE: bytes = _ASCII_DELETE.replace(
+    _BATCH_SEPARATOR.encode('ascii'), b'')
+
+
+class _StripTable(dict):
+    """
+    str.translate() table from a codepoint to what is left of it once
+    decomposed and stripped of accents and anything but letters and digits.
+    Each codepoint is worked out the first time it is seen, then reused.
+    Decomposing one codepoint at a time gives the same result as NFKD on the
+    whole text, since NFKD only reorders combining characters and those are
+    never letters or digits.
+    """
+
+    def __missing__(self, codepoint: int) -> str:
+        stripped = ''.join(
+            character for character in
+            unicodedata.normalize('NFKD', chr(codepoint))
+            if unicodedata.category(character) != 'Mn' and
+            character.isalnum())
+        self[codepoint] = stripped
+        return stripped
+
+
+_STRIP_TABLE = _StripTable()
+
+
+@lru_cache(maxsize=8192)
+def strip_text(input_text: str) -> str:
+    """
+    Returns input string in lowercase, with spaces removed, special characters
+    removed, and accented characters normalized. Repeated inputs are served
+    from an LRU cache.
+    Returns:
+        str
+    """
+    if input_text.isascii():
+        return input_text.encode('ascii').translate(None, _ASCII_DELETE) \
+            .decode('ascii').lower()
+    # Lowercased after joining, as Greek final sigma depends on its neighbours
+    return input_text.translate(_STRIP_TABLE).lower()
+
+
+def strip_texts(input_texts) -> list[str]:
+    """
+    Returns strip_text() of every string in input_texts without going
+    through the cache, such as for the titles of a scraping run. The ASCII
+    texts, nearly all of them, are normalised together in one pass.
+    Returns:
+        list[str]
+    """
+    stripped = list(input_texts)
+    ascii_positions = [position for position, input_text
+                       in enumerate(stripped) if input_text.isascii()]
+    joined = _BATCH_SEPARATOR.join(stripped[position]
+                                   for position in ascii_positions)
+    done = set()
+    # Unless a text contains the separator itself
+    if joined.count(_BATCH_SEPARATOR) == len(ascii_positions) - 1:
+        ascii_stripped = joined.encode('ascii') \
+            .translate(None, _ASCII_BATCH_DELETE).decode('ascii').lower() \
+            .split(_BATCH_SEPARATOR)
+        for position, stripped_text in zip(ascii_positions, ascii_stripped):
+            stripped[position] = stripped_text
+        done.update(ascii_positions)
+    for position, input_text in enumerate(stripped):
+        if position not in done:
+            stripped[position] = strip_text.__wrapped__(input_text)
+    return stripped
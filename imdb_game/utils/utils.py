@@ -1,54 +1,61 @@
 """
 Shared functions for imdb_game
 """
+import re
 import unicodedata
 import textwrap
+from functools import lru_cache
+
+# Imported from here throughout the package
+from .normalize import strip_text, strip_texts
 
 IMDB_ROOT: str = 'https://www.imdb.com'
+LEADING_ARTICLES: frozenset = frozenset({'the', 'a', 'an'})
+# Words too common to give a title away when they appear next to each other
+STOP_WORDS: frozenset = frozenset({
+    'a', 'an', 'and', 'at', 'by', 'for', 'from', 'he', 'her', 'his', 'i',
+    'in', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 'our', 'part',
+    's', 'she', 'that', 'the', 'their', 'they', 'this', 'to', 'vs', 'we',
+    'with', 'you', 'your'})
+# Titles shorter than this, once stripped, match inside too many words
+MIN_STRIPPED_TITLE_LEAK: int = 6
+_WORD = re.compile(r'[^\W_]+')
 
 
+@lru_cache(maxsize=4096)
 def justify_text(text: str, width: int) -> str:
     """
-    Formats long strings for more readable console output
+    Formats long strings for more readable console output. Clues are shown
+    again and again, so layouts are memoised by text and width.
     Returns:
-        str
+        str - '' for text with no words
     """
     # Wrap the input text into lines with the specified width
     wrapped_lines = textwrap.wrap(text, width=width)
+    if not wrapped_lines:
+        return ''
 
-    # Justify each line except for the last one
+    # Justify each line except for the last one, spreading the spaces left
+    # over from the words across the gaps, widest gaps first
     justified_lines = []
     for line in wrapped_lines[:-1]:
         words = line.split()
-        word_count = len(words)
-        spaces = width - sum(len(word) for word in words)
-        spaces_per_gap = spaces // (word_count - 1) if word_count > 1 else 0
-        extra_spaces = spaces % (word_count - 1) if word_count > 1 else 0
-
-        justified_line = ""
-        for word in words[:-1]:
-            justified_line += word + " " * (spaces_per_gap + (extra_spaces > 0))
-            extra_spaces -= 1
-
-        justified_line += words[-1]
-        justified_lines.append(justified_line)
+        gap_count = len(words) - 1
+        if not gap_count:
+            justified_lines.append(words[0])
+            continue
+        spaces_per_gap, extra_spaces = divmod(
+            width - sum(map(len, words)), gap_count)
+        gaps = [' ' * (spaces_per_gap + 1)] * extra_spaces + \
+            [' ' * spaces_per_gap] * (gap_count - extra_spaces) + ['']
+        justified_lines.append(''.join(
+            word + gap for word, gap in zip(words, gaps)))
 
     # Add the last line without justification
     justified_lines.append(wrapped_lines[-1])
 
     # Join the lines with newline characters
-    justified_text = "\n".join(justified_lines)
-
-    return justified_text
-def strip_text(input_text: str) -> str:
-    """
-    Returns input string in lowercase, with spaces removed, special characters
-    removed, and accented characters normalized
-    Returns:
-        str
-    """
-    input_text = remove_accents(input_text)
-    return ''.join(e for e in input_text if e.isalnum()).lower()
+    return '\n'.join(justified_lines)
 
 
 def remove_accents(input_str: str) -> str:
@@ -58,9 +65,50 @@ def remove_accents(input_str: str) -> str:
     Returns:
         str
     """
+    if input_str.isascii():
+        return input_str
     # Normalize the string to the NFKD form (Compatibility Decomposition)
     normalized_str = unicodedata.normalize("NFKD", input_str)
     # Filter out non-spacing marks and join the characters
     unaccented_str = "".join(
         c for c in normalized_str if unicodedata.category(c) != "Mn")
     return unaccented_str
+
+
+def split_words(input_text: str) -> list[str]:
+    """
+    Returns the lowercase words of a string with accents removed, splitting
+    on anything that isn't a letter or a digit
+    Returns:
+        list[str]
+    """
+    return _WORD.findall(remove_accents(input_text).lower())
+
+
+def clue_leaks_title(clue_text: str, title: str) -> bool:
+    """
+    Decides whether a clue gives away the movie title: the whole title
+    (ignoring case, accents, punctuation and a leading article) appears in
+    the clue as words or run together, or two neighbouring title words
+    appear together in the clue, unless both are stop words.
+    Returns:
+        bool
+    """
+    title_words = split_words(title)
+    if len(title_words) > 1 and title_words[0] in LEADING_ARTICLES:
+        title_words = title_words[1:]
+    if not title_words:
+        return False
+    clue_words = split_words(clue_text)
+    size = len(title_words)
+    for start in range(len(clue_words) - size + 1):
+        if clue_words[start:start + size] == title_words:
+            return True
+    stripped_title = strip_text(title)
+    if len(stripped_title) >= MIN_STRIPPED_TITLE_LEAK and \
+            stripped_title in strip_text(clue_text):
+        return True
+    title_pairs = {pair for pair in zip(title_words, title_words[1:])
+                   if not (pair[0] in STOP_WORDS and pair[1] in STOP_WORDS)}
+    return any(pair in title_pairs
+               for pair in zip(clue_words, clue_words[1:]))
@@ -0,0 +1,95 @@
+"""
+Tests for imdb_game.database.async_handler module
+"""
+import asyncio
+import pytest
+import testing.postgresql
+from datetime import datetime
+from uuid import UUID
+import imdb_game.database.dataclasses as dc
+from imdb_game.database.async_handler import AsyncDBHandler
+from imdb_game.database.handler import DBHandler
+from test_tools import init_test_db
+
+
+@pytest.fixture(scope="module")
+def db_url():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield postgresql.url()
+
+
+def run(coroutine_function, db_url):
+    """
+    Runs a coroutine function against an open AsyncDBHandler
+    """
+    async def wrapper():
+        async with AsyncDBHandler(pg_url=db_url, pool_max_size=4) as db:
+            return await coroutine_function(db)
+    return asyncio.run(wrapper())
+
+
+def test_get_categories(db_url):
+    categories = run(lambda db: db.get_categories(), db_url)
+    assert len(categories) == 5
+    assert categories[0]['short_name'] == 'nudity'
+
+
+def test_players_and_games(db_url):
+    async def scenario(db):
+        player = dc.Player(username='async_player')
+        await db.add_player_by_username(player)
+        player_data = await db.get_player_by_username(player)
+        await db.add_game(dc.Game(player_id=player_data.player_id))
+        return player_data
+    player_data = run(scenario, db_url)
+    assert player_data.username == 'async_player'
+    assert isinstance(player_data.player_id, UUID)
+
+
+def test_duplicates_are_skipped_like_sync(db_url):
+    player = dc.Player(username='duplicate_player')
+    sync_db = DBHandler(pg_url=db_url)
+    sync_db.add_player_by_username(player)
+    sync_db.add_player_by_username(player)
+
+    async def scenario(db):
+        await db.add_player_by_username(player)
+        stored = await db.get_player_by_username(player)
+        await db.add_full_player(stored)
+        return stored
+    stored = run(scenario, db_url)
+    assert stored == sync_db.get_player_by_username(player)
+    sync_db.close()
+
+
+def test_movies_and_clues(db_url):
+    movies = [dc.Movie(imdb_id=f'ttAS{index}XX', title=f'Async Movie {index}',
+                       stripped_title=f'asyncmovie{index}',
+                       release_year=2000 + index)
+              for index in range(3)]
+
+    async def scenario(db):
+        movie_ids = await db.add_movies_bulk(movies)
+        clues = [dc.Clue(movie_id=movie_id, category_id=1,
+                         clue_text=f'Async clue {index}', spoiler=False,
+                         date_created=datetime.utcnow())
+                 for index, movie_id in enumerate(movie_ids)]
+        inserted = await db.add_clues_bulk(clues)
+        single = await db.add_clue(clues[0])
+        # Queries run concurrently on separate pooled connections
+        fetched = await asyncio.gather(
+            *(db.get_clues_by_movie_id(movie_id) for movie_id in movie_ids),
+            db.get_movie_by_movie_id(movie_ids[0]),
+            db.get_three_movie_options(),
+            db.get_round_packs(movie_ids))
+        return movie_ids, inserted, single, fetched
+    movie_ids, inserted, single, fetched = run(scenario, db_url)
+    assert inserted == 3
+    assert single is None
+    for clues, movie_id in zip(fetched[:3], movie_ids):
+        assert [clue.movie_id for clue in clues] == [movie_id]
+    assert fetched[3].imdb_id == 'ttAS0XX'
+    assert len(fetched[4]) == 3
+    assert [fetched[5][movie_id].clues for movie_id in movie_ids] == \
+           list(fetched[:3])
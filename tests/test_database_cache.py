@@ -0,0 +1,142 @@
+"""
+Tests for imdb_game.database.cache module
+"""
+import time
+import pytest
+import testing.postgresql
+from datetime import datetime
+import imdb_game.database.dataclasses as dc
+from imdb_game.database.cache import LRUCache, CachedDBHandler
+from imdb_game.database.handler import DBHandler
+from test_tools import init_test_db
+
+
+@pytest.fixture(scope="module")
+def db_handler():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield DBHandler(pg_url=postgresql.url())
+
+
+@pytest.fixture(scope="module")
+def movie_id(db_handler):
+    movie = dc.Movie(imdb_id='ttCA123XX', title='Cached Movie',
+                     stripped_title='cachedmovie', release_year=2001)
+    movie_id = db_handler.add_movie(movie)
+    db_handler.add_clue(dc.Clue(movie_id=movie_id, category_id=1,
+                                clue_text='Cached clue', spoiler=False,
+                                date_created=datetime.utcnow()))
+    yield movie_id
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert len(cache) == 2
+
+
+def test_lru_ttl():
+    cache = LRUCache(ttl=0.01)
+    cache.put('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_lru_get_or_load_stats():
+    cache = LRUCache()
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_load('a', lambda: calls.append(1) or 'value') == \
+               'value'
+    assert len(calls) == 1
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'size': 1}
+    # None results are not cached
+    cache.get_or_load('missing', lambda: None)
+    assert cache.get('missing', 'default') == 'default'
+
+
+def test_lru_drops_loads_racing_clear():
+    cache = LRUCache()
+
+    def loader():
+        cache.clear()
+        return 'stale'
+    assert cache.get_or_load('a', loader) == 'stale'
+    assert cache.get('a') is None
+
+
+def test_cached_reads(db_handler, movie_id):
+    cached = CachedDBHandler(db_handler)
+    for _ in range(3):
+        assert cached.get_movie_by_movie_id(movie_id).title == 'Cached Movie'
+        clues = cached.get_clues_by_movie_id(movie_id)
+        assert [clue.clue_text for clue in clues] == ['Cached clue']
+        # Callers may consume their copy of the clue list
+        clues.clear()
+        assert len(cached.get_categories()) == 5
+    assert cached.cache_stats() == {
+        'movies': {'hits': 2, 'misses': 1, 'size': 1},
+        'clues': {'hits': 2, 'misses': 1, 'size': 1},
+        'packs': {'hits': 0, 'misses': 0, 'size': 0},
+        'categories': {'hits': 2, 'misses': 1, 'size': 1}}
+    # Everything else is passed through
+    assert cached.get_movie_by_imdb_id('ttCA123XX').movie_id == movie_id
+
+
+def test_cached_writes_invalidate(db_handler, movie_id):
+    cached = CachedDBHandler(db_handler)
+    assert len(cached.get_clues_by_movie_id(movie_id)) == 1
+    cached.add_clue(dc.Clue(movie_id=movie_id, category_id=2,
+                            clue_text='Second cached clue', spoiler=False,
+                            date_created=datetime.utcnow()))
+    assert len(cached.get_clues_by_movie_id(movie_id)) == 2
+
+
+def test_notify_invalidates_listeners(db_handler, movie_id):
+    listened = DBHandler(pg_url=db_handler.pg_url)
+    cached = CachedDBHandler(listened, listen=True)
+    # The listener connects in the background and resyncs once it listens
+    assert listened.listeners[0].listening.wait(10)
+    cached.get_movie_by_movie_id(movie_id)
+    deadline = time.monotonic() + 10
+    while len(cached.movies) and time.monotonic() < deadline:
+        db_handler.notify_catalogue_changed()
+        time.sleep(0.05)
+    assert len(cached.movies) == 0
+    listened.close()
+
+
+def test_cached_round_packs(db_handler, movie_id):
+    spoiled_movie_id = db_handler.add_movie(dc.Movie(
+        imdb_id='ttCA456XX', title='Alien', stripped_title='alien',
+        release_year=1979))
+    for clue_text, spoiler in (('ok clue', False), ('spoiler clue', True),
+                               ('The Alien bursts out', False)):
+        db_handler.add_clue(dc.Clue(movie_id=spoiled_movie_id, category_id=1,
+                                    clue_text=clue_text, spoiler=spoiler,
+                                    date_created=datetime.utcnow()))
+    db_handler.set_title_leaks({
+        clue.clue_id: True
+        for clue in db_handler.get_clues_by_movie_id(spoiled_movie_id)
+        if 'Alien' in clue.clue_text})
+    cached = CachedDBHandler(db_handler)
+    # Full clue lists and round packs don't leak into each other
+    assert len(cached.get_clues_by_movie_id(spoiled_movie_id)) == 3
+    packs = cached.get_round_packs([movie_id, spoiled_movie_id])
+    assert packs[movie_id].movie.title == 'Cached Movie'
+    assert [clue.clue_text for clue in packs[spoiled_movie_id].clues] == \
+           ['ok clue']
+    assert len(cached.get_clues_by_movie_id(spoiled_movie_id)) == 3
+    # Callers may consume their copy, the next packs come from memory
+    packs[movie_id].clues.clear()
+    assert cached.get_round_packs([movie_id])[movie_id].clues != []
+    assert [clue.clue_text for clue in
+            cached.load_round(spoiled_movie_id).clues] == ['ok clue']
+    assert cached.packs.stats() == {'hits': 2, 'misses': 2, 'size': 2}
+    pack = cached.load_round(movie_id)
+    assert pack.category_names == {1: 'Sex & Nudity', 2: 'Violence & Gore'}
@@ -0,0 +1,150 @@
+"""
+Tests for imdb_game.database.catalogue module
+"""
+import time
+import pytest
+import testing.postgresql
+from datetime import datetime
+from uuid import uuid4
+import imdb_game.database.dataclasses as dc
+from imdb_game.database.catalogue import Catalogue, CatalogueDBHandler
+from imdb_game.database.handler import DBHandler
+from test_tools import init_test_db
+
+
+@pytest.fixture(scope="module")
+def db_handler():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield DBHandler(pg_url=postgresql.url())
+
+
+@pytest.fixture(scope="module")
+def movie_id(db_handler):
+    movie = dc.Movie(imdb_id='ttCT123XX', title='Catalogued Movie',
+                     stripped_title='cataloguedmovie', release_year=1999)
+    movie_id = db_handler.add_movie(movie)
+    db_handler.add_clue(dc.Clue(movie_id=movie_id, category_id=1,
+                                clue_text='Catalogued clue', spoiler=False,
+                                date_created=datetime.utcnow()))
+    db_handler.add_clue(dc.Clue(movie_id=movie_id, category_id=2,
+                                clue_text='Spoiled clue', spoiler=True,
+                                date_created=datetime.utcnow()))
+    db_handler.add_clue(dc.Clue(movie_id=movie_id, category_id=3,
+                                clue_text='Unflagged clue', spoiler=None,
+                                date_created=datetime.utcnow()))
+    yield movie_id
+
+
+def test_catalogue_round_pack(db_handler, movie_id):
+    catalogue = Catalogue.from_database(db_handler)
+    assert movie_id in catalogue
+    pack = catalogue.get_round_pack(movie_id)
+    assert pack.movie == db_handler.get_movie_by_movie_id(movie_id)
+    # Spoilers aren't playable, so they aren't in the catalogue
+    assert sorted(clue.clue_text for clue in pack.clues) == \
+           ['Catalogued clue', 'Unflagged clue']
+    assert pack.category_names == {1: 'Sex & Nudity',
+                                   3: 'Profanity'}
+    stored = {clue.clue_id: clue
+              for clue in db_handler.get_clues_by_movie_id(movie_id)}
+    for clue in pack.clues:
+        assert clue.date_created == stored[clue.clue_id].date_created
+        assert clue.difficulty is None
+    assert catalogue.get_round_pack(movie_id) is not pack
+    assert catalogue.get_round_pack(uuid4()) is None
+    assert (movie_id, 1999) in catalogue.movie_years()
+
+
+def test_catalogue_columns_are_read_only(db_handler, movie_id):
+    catalogue = Catalogue.from_database(db_handler)
+    assert catalogue.clue_offsets[0] == 0
+    assert catalogue.clue_offsets[len(catalogue)] == catalogue.clue_count
+    with pytest.raises(TypeError):
+        catalogue.release_years[0] = 2000
+
+
+def test_catalogue_snapshot(db_handler, movie_id, tmp_path):
+    catalogue = Catalogue.from_database(db_handler)
+    path = str(tmp_path / 'catalogue.snapshot')
+    catalogue.save(path)
+    loaded = Catalogue.load(path)
+    assert loaded.movie_ids == catalogue.movie_ids
+    assert loaded.categories == catalogue.categories
+    assert loaded.get_round_pack(movie_id) == \
+           catalogue.get_round_pack(movie_id)
+    with pytest.raises(ValueError):
+        Catalogue.from_bytes(b'\x91\x00')
+
+
+def test_catalogue_from_records():
+    assert len(Catalogue.from_records([], [])) == 0
+    movie_id, clue_ids = uuid4(), [uuid4(), uuid4()]
+    catalogue = Catalogue.from_records(
+        [(movie_id, 'tt1', 'Movie', 'movie', 2001, clue_ids[0], 4, 'First',
+          datetime(2023, 3, 11, 22, 9, 30, 883325), 0.25),
+         (movie_id, 'tt1', 'Movie', 'movie', 2001, clue_ids[1], 5, 'Second',
+          None, None)],
+        [{'category_id': 4, 'display_name': 'Four', 'short_name': 'four'},
+         {'category_id': 5, 'display_name': 'Five', 'short_name': 'five'}])
+    loaded = Catalogue.from_bytes(catalogue.to_bytes())
+    for pack in (catalogue.get_round_pack(movie_id),
+                 loaded.get_round_pack(movie_id)):
+        assert [(clue.clue_id, clue.date_created, clue.difficulty)
+                for clue in pack.clues] == \
+               [(clue_ids[0], datetime(2023, 3, 11, 22, 9, 30, 883325), 0.25),
+                (clue_ids[1], None, None)]
+        assert pack.category_names == {4: 'Four', 5: 'Five'}
+
+
+def test_catalogue_handler(db_handler, movie_id, tmp_path):
+    catalogued = CatalogueDBHandler(db_handler)
+    options = catalogued.get_three_movie_options()
+    assert options and all(option['movie_id'] in catalogued.catalogue
+                           for option in options)
+    assert catalogued.get_categories() == db_handler.get_categories()
+    assert catalogued.load_round(movie_id).movie.title == 'Catalogued Movie'
+    assert list(catalogued.get_round_packs([movie_id, uuid4()])) == \
+           [movie_id]
+    # Snapshots are loaded without querying the catalogue
+    path = str(tmp_path / 'catalogue.snapshot')
+    catalogued.catalogue.save(path)
+    from_snapshot = CatalogueDBHandler(db_handler, snapshot_path=path)
+    assert from_snapshot.load_round(movie_id) == \
+           catalogued.load_round(movie_id)
+
+
+def test_catalogue_reload_swaps(db_handler, movie_id):
+    catalogued = CatalogueDBHandler(
+        DBHandler(pg_url=db_handler.pg_url), listen=True)
+    before = catalogued.catalogue
+    new_movie_id = db_handler.add_movie(dc.Movie(
+        imdb_id='ttCT456XX', title='Published Movie',
+        stripped_title='publishedmovie', release_year=2011))
+    db_handler.add_clue(dc.Clue(movie_id=new_movie_id, category_id=1,
+                                clue_text='Published clue', spoiler=False,
+                                date_created=datetime.utcnow()))
+    # Writes only show once the new version is published
+    assert catalogued.load_round(new_movie_id) is None
+    deadline = time.monotonic() + 10
+    # The listener connects in the background, notify until it hears one
+    while catalogued.catalogue is before and time.monotonic() < deadline:
+        db_handler.notify_catalogue_changed()
+        time.sleep(0.05)
+    assert catalogued.load_round(new_movie_id).movie.title == \
+           'Published Movie'
+    # The old version is left untouched for requests still using it
+    assert new_movie_id not in before
+    catalogued.database.close()
+
+
+def test_catalogue_writes_reload(db_handler, movie_id):
+    catalogued = CatalogueDBHandler(db_handler)
+    written_movie_id = catalogued.add_movie(dc.Movie(
+        imdb_id='ttCT789XX', title='Written Movie',
+        stripped_title='writtenmovie', release_year=2012))
+    catalogued.add_clue(dc.Clue(movie_id=written_movie_id, category_id=1,
+                                clue_text='Written clue', spoiler=False,
+                                date_created=datetime.utcnow()))
+    assert [clue.clue_text for clue in
+            catalogued.load_round(written_movie_id).clues] == ['Written clue']
@@ -0,0 +1,158 @@
+"""
+Tests for imdb_game.database.corpus module
+"""
+import gc
+import weakref
+import pytest
+import testing.postgresql
+from datetime import datetime
+from uuid import uuid4
+import imdb_game.database.dataclasses as dc
+from imdb_game.database.catalogue import Catalogue, CatalogueDBHandler
+from imdb_game.database.corpus import MappedCorpus, is_corpus, write_corpus
+from imdb_game.database.handler import DBHandler
+from test_tools import init_test_db
+
+CATEGORIES = [
+    {'category_id': 1, 'display_name': 'Sex & Nudity', 'short_name': 'nudity'},
+    {'category_id': 2, 'display_name': 'Violence & Gore',
+     'short_name': 'violence'}]
+
+
+@pytest.fixture(scope="module")
+def db_handler():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield DBHandler(pg_url=postgresql.url())
+
+
+@pytest.fixture
+def movies():
+    return [dc.Movie(imdb_id=f'tt{year}', title=f'Amélie {year}',
+                     stripped_title=f'amelie{year}', release_year=year,
+                     movie_id=uuid4())
+            for year in (1994, 2001, 2008)]
+
+
+@pytest.fixture
+def clues(movies):
+    return [dc.Clue(movie_id=movies[0].movie_id, category_id=1,
+                    clue_text='Un baiser à la fin.', spoiler=False,
+                    date_created=datetime(2023, 3, 11, 22, 9, 30, 883325),
+                    clue_id=uuid4(), difficulty=0.25),
+            dc.Clue(movie_id=movies[0].movie_id, category_id=2,
+                    clue_text='Spoiled', spoiler=True,
+                    date_created=datetime.utcnow(), clue_id=uuid4()),
+            dc.Clue(movie_id=movies[0].movie_id, category_id=2,
+                    clue_text='Leaked', spoiler=False,
+                    date_created=datetime.utcnow(), clue_id=uuid4(),
+                    title_leak=True),
+            dc.Clue(movie_id=movies[1].movie_id, category_id=2,
+                    clue_text='Undated', spoiler=None, date_created=None,
+                    clue_id=uuid4())]
+
+
+def test_corpus_round_pack(movies, clues, tmp_path):
+    path = str(tmp_path / 'clues.corpus')
+    write_corpus(path, movies, clues, CATEGORIES)
+    assert is_corpus(path)
+    corpus = MappedCorpus(path)
+    assert len(corpus) == 3 and corpus.clue_count == 4
+    assert list(corpus.categories) == CATEGORIES
+    pack = corpus.get_round_pack(movies[0].movie_id)
+    assert pack.movie == movies[0]
+    # Spoilers and title leaks are kept in the file but never handed out
+    assert pack.clues == [clues[0]]
+    assert pack.category_names == {1: 'Sex & Nudity'}
+    undated = corpus.get_round_pack(movies[1].movie_id).clues[0]
+    assert undated.date_created is None and undated.spoiler is False
+    assert corpus.get_round_pack(movies[2].movie_id).clues == []
+    assert corpus.get_round_pack(uuid4()) is None
+    assert 'not-a-uuid' not in corpus
+    # Only movies with playable clues are offered
+    assert sorted(corpus.movie_years(), key=lambda pair: pair[1]) == \
+           [(movies[0].movie_id, 1994), (movies[1].movie_id, 2001)]
+
+
+def test_corpus_matches_catalogue(movies, clues, tmp_path):
+    path = str(tmp_path / 'clues.corpus')
+    write_corpus(path, movies, clues, CATEGORIES)
+    corpus = MappedCorpus(path)
+    playable = [clue for clue in clues
+                if not clue.spoiler and not clue.title_leak]
+    movie_index = {movie.movie_id: movie for movie in movies}
+    catalogue = Catalogue.from_records(
+        [(clue.movie_id, *movie_index[clue.movie_id].row()[:4],
+          clue.clue_id, clue.category_id, clue.clue_text, clue.date_created,
+          clue.difficulty)
+         for clue in sorted(playable, key=lambda clue:
+                            (clue.movie_id, dc.clue_order(clue)))],
+        CATEGORIES)
+    for movie_id in catalogue.movie_ids:
+        assert corpus.get_round_pack(movie_id) == \
+               catalogue.get_round_pack(movie_id)
+
+
+def test_corpus_rejects_other_files(tmp_path):
+    path = tmp_path / 'clues.corpus'
+    path.write_bytes(Catalogue.from_records([], []).to_bytes())
+    assert not is_corpus(str(path))
+    with pytest.raises(ValueError):
+        MappedCorpus(str(path))
+    path.write_bytes(b'IMDBCRPS')
+    with pytest.raises(ValueError):
+        MappedCorpus(str(path))
+
+
+def test_corpus_replaced_while_mapped(movies, clues, tmp_path):
+    path = str(tmp_path / 'clues.corpus')
+    write_corpus(path, movies, clues, CATEGORIES)
+    corpus = MappedCorpus(path)
+    write_corpus(path, movies[1:], clues[3:], CATEGORIES)
+    # The old mapping keeps reading the file it opened
+    assert corpus.get_round_pack(movies[0].movie_id).clues == [clues[0]]
+    assert movies[0].movie_id not in MappedCorpus(path)
+    corpus.close()
+    with pytest.raises(ValueError):
+        corpus.get_round_pack(movies[0].movie_id)
+
+
+def test_catalogue_handler_maps_corpus(db_handler, tmp_path):
+    movie_id = db_handler.add_movie(dc.Movie(
+        imdb_id='ttCR123XX', title='Mapped Movie',
+        stripped_title='mappedmovie', release_year=1987))
+    db_handler.add_clue(dc.Clue(movie_id=movie_id, category_id=1,
+                                clue_text='Mapped clue', spoiler=False,
+                                date_created=datetime.utcnow()))
+    path = str(tmp_path / 'clues.corpus')
+    write_corpus(path, db_handler.get_movies(), db_handler.get_clues(),
+                 db_handler.get_categories())
+    catalogued = CatalogueDBHandler(db_handler, snapshot_path=path)
+    assert isinstance(catalogued.catalogue, MappedCorpus)
+    assert catalogued.get_categories() == db_handler.get_categories()
+    assert catalogued.get_three_movie_options() == \
+           [{'movie_id': movie_id, 'release_year': 1987}]
+    clue = catalogued.load_round(movie_id).clues[0]
+    assert clue.clue_text == 'Mapped clue' and clue.difficulty is None
+    # Without a new file, a reload keeps the mapped file
+    corpus = catalogued.catalogue
+    catalogued.reload()
+    assert catalogued.catalogue is corpus
+    write_corpus(path, db_handler.get_movies(), db_handler.get_clues(),
+                 db_handler.get_categories())
+    catalogued.reload()
+    assert isinstance(catalogued.catalogue, MappedCorpus)
+    assert catalogued.catalogue is not corpus
+    # A request holding the replaced corpus keeps reading it across reloads
+    for _ in range(2):
+        write_corpus(path, db_handler.get_movies(), db_handler.get_clues(),
+                     db_handler.get_categories())
+        catalogued.reload()
+        assert corpus.get_round_pack(movie_id).clues[0].clue_text == \
+               'Mapped clue'
+    # and the mapping is released along with the last reference
+    replaced = weakref.ref(corpus)
+    del corpus
+    gc.collect()
+    assert replaced() is None
+    assert movie_id in catalogued.catalogue
@@ -119,6 +119,23 @@ def test_clue_dict(clue):
     assert cdict['clue_id'] == clue.clue_id
 
 
+def test_clue_row(clue):
+    assert clue.row() == tuple(clue.dict().values())
+    assert dc.Clue(*clue.row()) == clue
+
+
+def test_slotted_dataclasses(clue, movie, player, game, round):
+    for record in (clue, movie, player, game, round):
+        assert not hasattr(record, '__dict__')
+        with pytest.raises(AttributeError):
+            record.not_a_field = 1
+    assert movie.row() == ('ttXX789XX', movie.title, movie.stripped_title,
+                           1984, None)
+    # Defaults and default factories still apply
+    assert dc.Round(1, movie).clues_pool == []
+    assert dc.Game(player.player_id).MAX_ROUNDS == 5
+
+
 def test_create_game(game, player):
     assert isinstance(game, dc.Game)
     game_2 = dc.Game(player_id=player.player_id)
@@ -207,7 +224,55 @@ def test_round_dict(round):
     assert isinstance(rdict, dict)
     assert rdict['round_number'] == round.round_number
     assert rdict['current_movie'] == round.current_movie.dict()
-    assert rdict['clues_pool'] == round.clues_pool
-    assert rdict['clues_played'] == round.clues_played
+    assert rdict['clues_pool'] == [clue.dict() for clue in round.clues_pool]
+    assert rdict['clues_played'] == \
+           [clue.dict() for clue in round.clues_played]
     assert rdict['current_clue_number'] == round.current_clue_number
     assert rdict['total_clues'] == round.total_clues
+
+
+def make_clues(movie, count):
+    return [dc.Clue(movie_id=movie.movie_id, category_id=1,
+                    clue_text=f'Clue {index}', spoiler=False,
+                    date_created=datetime.utcnow(), clue_id=uuid4())
+            for index in range(count)]
+
+
+def test_round_get_random_clue(movie):
+    clues = make_clues(movie, 20)
+    new_round = dc.Round(1, movie, clues_pool=list(clues))
+    drawn = [new_round.get_random_clue() for _ in range(20)]
+    assert sorted(clue.clue_text for clue in drawn) == \
+           sorted(clue.clue_text for clue in clues)
+    assert new_round.clues_played == drawn
+    assert new_round.clues_pool == []
+
+
+def test_round_seed_replays_draws(movie):
+    clues = make_clues(movie, 50)
+    draws = []
+    # However the clues were fetched, packs hold them in clue_order()
+    for pool in (list(clues), list(reversed(clues))):
+        new_round = dc.Round(1, movie,
+                             clues_pool=sorted(pool, key=dc.clue_order),
+                             seed=1234)
+        draws.append([new_round.get_random_clue() for _ in range(5)])
+    assert draws[0] == draws[1]
+    other_round = dc.Round(1, movie,
+                           clues_pool=sorted(clues, key=dc.clue_order),
+                           seed=4321)
+    assert [other_round.get_random_clue() for _ in range(5)] != draws[0]
+
+
+def test_round_draws_hardest_clue_first(movie):
+    clues = make_clues(movie, 10)
+    for index, clue in enumerate(clues):
+        clue.difficulty = index / 10
+    clues[3].difficulty = None
+    clues[5].difficulty = 0.55
+    new_round = dc.Round(1, movie,
+                         clues_pool=sorted(clues, key=dc.clue_order), seed=99)
+    drawn = [new_round.get_random_clue() for _ in range(10)]
+    # Unscored clues are treated as dc.Round.DEFAULT_DIFFICULTY
+    assert [clue.difficulty for clue in drawn] == \
+           [0.9, 0.8, 0.7, 0.6, 0.55, None, 0.4, 0.2, 0.1, 0.0]
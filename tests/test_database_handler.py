@@ -1,11 +1,14 @@
 import pytest
 import os
+from concurrent.futures import ThreadPoolExecutor
 from uuid import UUID, uuid4
 import imdb_game.database.handler as database_handler
 import imdb_game.database.dataclasses as dc
+from imdb_game.database import queries
 from test_tools import init_test_db
 import testing.postgresql
 from datetime import datetime, timedelta
+import time
 from psycopg import Connection
 
 DEFAULT_CATEGORIES = [{'category_id': 1, 'display_name': 'Sex & Nudity',
@@ -69,6 +72,24 @@ def test__get_postgres_connection(db_handler):
     assert isinstance(conn, Connection)
 
 
+def test_pooled_db_handler(db_handler):
+    """
+    Verifies that a pooled handler serves queries from many threads at once
+    """
+    pooled_handler = database_handler.DBHandler(pg_url=TEST_DB_URL,
+                                                use_pool=True,
+                                                pool_min_size=1,
+                                                pool_max_size=4,
+                                                pool_timeout=5)
+    assert pooled_handler.connection is None
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda _: pooled_handler.get_categories(),
+                                    range(32)))
+    assert all(categories == DEFAULT_CATEGORIES for categories in results)
+    assert pooled_handler.pool.get_stats()['pool_max'] == 4
+    del pooled_handler
+
+
 def test__execute_sql(db_handler):
     """
     Tests a basic SELECT query on the categories table
@@ -184,12 +205,154 @@ def test_add_clue(db_handler, movie_1):
     assert any([clue_from_db.clue_text == clue.clue_text for clue_from_db in
                 clues_from_db])
 
+def test_add_clue_skips_duplicates(db_handler, movie_1):
+    movie_from_db = db_handler.get_movie_by_imdb_id(movie_1.imdb_id)
+    clue = dc.Clue(movie_id=movie_from_db.movie_id,
+                   category_id=2, clue_text='Duplicate clue', spoiler=False,
+                   date_created=datetime.utcnow())
+    assert isinstance(db_handler.add_clue(clue), UUID)
+    assert db_handler.add_clue(clue) is None
+    clues_from_db = db_handler.get_clues_by_movie_id(movie_from_db.movie_id)
+    assert [clue_from_db.clue_text for clue_from_db in clues_from_db].count(
+        'Duplicate clue') == 1
+
+
+def test_add_movie_twice_returns_same_id(db_handler, movie_1):
+    first_id = db_handler.add_movie(movie_1)
+    assert db_handler.add_movie(movie_1) == first_id
+
+
+def test_guide_hashes(db_handler, movie_2):
+    movie_from_db = db_handler.get_movie_by_imdb_id(movie_2.imdb_id)
+    assert db_handler.get_guide_hashes()[movie_2.imdb_id] is None
+    db_handler.set_guide_hash(movie_from_db.movie_id, 'abc123')
+    assert db_handler.get_guide_hashes()[movie_2.imdb_id] == 'abc123'
+
+
+def test_add_movies_bulk(db_handler, movie_1):
+    movies = [dc.Movie(imdb_id=f'ttXX9{index}XX', title=f'Bulk Movie {index}',
+                       stripped_title=f'bulkmovie{index}',
+                       release_year=1990 + index)
+              for index in range(5)]
+    existing_id = db_handler.get_movie_by_imdb_id(movie_1.imdb_id).movie_id
+    movie_ids = db_handler.add_movies_bulk([*movies, movie_1])
+    assert len(movie_ids) == 6
+    assert movie_ids[-1] == existing_id
+    for movie, movie_id in zip(movies, movie_ids):
+        assert db_handler.get_movie_by_imdb_id(movie.imdb_id).movie_id == \
+               movie_id
+    assert db_handler.add_movies_bulk([]) == []
+
+
+def test_add_clues_bulk(db_handler, movie_2):
+    movie_id = db_handler.get_movie_by_imdb_id(movie_2.imdb_id).movie_id
+    clues = [dc.Clue(movie_id=movie_id, category_id=category_id,
+                     clue_text=f'Bulk clue {index}', spoiler=index % 2 == 0,
+                     date_created=datetime.utcnow())
+             for index, category_id in enumerate([1, 2, 3, 4, 5])]
+    assert db_handler.add_clues_bulk(clues) == 5
+    # A repeated load, including a duplicate within the batch, adds nothing
+    assert db_handler.add_clues_bulk([*clues, clues[0]]) == 0
+    texts = [clue.clue_text for clue in
+             db_handler.get_clues_by_movie_id(movie_id)]
+    assert all(texts.count(f'Bulk clue {index}') == 1 for index in range(5))
+    assert db_handler.add_clues_bulk([]) == 0
+
+
 def test_get_clues_by_movie_id(db_handler, movie_1):
     clues = db_handler.get_clues_by_movie_id(movie_1.movie_id)
     assert isinstance(clues, list)
     for clue in clues:
         assert isinstance(clue, dc.Clue)
 
+def test_get_round_packs(db_handler, movie_1, movie_2):
+    movie_ids = [db_handler.get_movie_by_imdb_id(movie.imdb_id).movie_id
+                 for movie in (movie_1, movie_2)]
+    packs = db_handler.get_round_packs([*movie_ids, uuid4()])
+    assert set(packs) == set(movie_ids)
+    for movie_id in movie_ids:
+        assert packs[movie_id].movie == \
+               db_handler.get_movie_by_movie_id(movie_id)
+        # Only clues that are neither spoilers nor give the title away
+        assert sorted(clue.clue_id for clue in packs[movie_id].clues) == \
+               sorted(clue.clue_id for clue in
+                      db_handler.get_clues_by_movie_id(movie_id)
+                      if not clue.spoiler and not clue.title_leak)
+    assert db_handler.get_round_packs([]) == {}
+
+
+def test_load_round(db_handler, movie_2):
+    movie_id = db_handler.get_movie_by_imdb_id(movie_2.imdb_id).movie_id
+    display_names = {category['category_id']: category['display_name']
+                     for category in db_handler.get_categories()}
+    for _ in range(2):
+        pack = db_handler.load_round(movie_id)
+        assert pack.movie.movie_id == movie_id
+        assert pack.clues
+        assert pack.category_names == {
+            clue.category_id: display_names[clue.category_id]
+            for clue in pack.clues}
+    assert db_handler.load_round(uuid4()) is None
+
+
+def add_playable_clue(db_handler, movie_id):
+    db_handler.add_clue(dc.Clue(movie_id=movie_id, category_id=3,
+                                clue_text='Playable clue', spoiler=False,
+                                date_created=datetime.utcnow()))
+
+
+def test_get_three_movie_options(db_handler):
+    for index in range(5):
+        add_playable_clue(db_handler, db_handler.get_movie_by_imdb_id(
+            f'ttXX9{index}XX').movie_id)
+    options = db_handler.get_three_movie_options()
+    assert len(options) == 3
+    assert len({option['release_year'] for option in options}) == 3
+    for option in options:
+        movie = db_handler.get_movie_by_movie_id(option['movie_id'])
+        assert movie.release_year == option['release_year']
+    # New movies are visible to the sampler straight away
+    new_movie = dc.Movie(imdb_id='ttXX777XX', title='Sampler Movie',
+                         stripped_title='samplermovie', release_year=1888)
+    add_playable_clue(db_handler, db_handler.add_movie(new_movie))
+    assert db_handler.movie_sampler.is_stale()
+    db_handler.get_three_movie_options()
+    assert 1888 in db_handler.movie_sampler._index[1]
+    # Movies without playable clues are never offered
+    leaky_movie = dc.Movie(imdb_id='ttXX778XX', title='Leaky Movie',
+                           stripped_title='leakymovie', release_year=1777)
+    db_handler.add_clue(dc.Clue(movie_id=db_handler.add_movie(leaky_movie),
+                                category_id=3, spoiler=False,
+                                clue_text='Leaky Movie has swearing',
+                                date_created=datetime.utcnow(),
+                                title_leak=True))
+    db_handler.get_three_movie_options()
+    assert 1777 not in db_handler.movie_sampler._index[1]
+
+
+def test_get_three_movie_options_skips_played(db_handler, player):
+    movie_ids = [row[0] for row in db_handler._execute_sql(
+        'SELECT DISTINCT movie_id FROM clues WHERE playable',
+        return_data=True)]
+    for movie_id in movie_ids[3:]:
+        db_handler.add_player_movie(player.player_id, movie_id)
+    # A fresh handler has to load the history from `player_movies`
+    fresh_handler = database_handler.DBHandler(pg_url=TEST_DB_URL)
+    for handler in (db_handler, fresh_handler):
+        options = handler.get_three_movie_options(player.player_id)
+        assert {option['movie_id'] for option in options} == \
+               set(movie_ids[:3])
+    # Playing the same movie twice is recorded once
+    db_handler.add_player_movie(player.player_id, movie_ids[0])
+    db_handler.add_player_movie(player.player_id, movie_ids[0])
+    assert movie_ids[0] in db_handler.get_played_movie_ids(player.player_id)
+    assert db_handler._execute_sql(
+        'SELECT count(*) FROM player_movies WHERE movie_id = %s',
+        [movie_ids[0]], return_data=True)[0][0] == 1
+    # Unknown players are not recorded
+    db_handler.add_player_movie(uuid4(), movie_ids[0])
+
+
 def test_get_categories(db_handler):
     """
     Tests getting the categories dictionary
@@ -198,3 +361,55 @@ def test_get_categories(db_handler):
     assert categories == DEFAULT_CATEGORIES
     assert len(categories) == len(DEFAULT_CATEGORIES)
 
+
+
+def test_match_title(db_handler, movie_2):
+    movie_id = db_handler.add_movie(movie_2)
+    assert db_handler.match_title('testmovie2thesequel') == movie_id
+    assert db_handler.match_title('testmovie2thesequal') == movie_id
+    assert db_handler.match_title('somethingelseentirely') is None
+    db_handler.add_alternate_title(movie_id, 'Test Movie Returns')
+    assert db_handler.title_matcher.is_stale()
+    assert db_handler.match_title('testmoviereturns') == movie_id
+
+
+def test_complete_titles(db_handler):
+    db_handler.add_movies_bulk([
+        dc.Movie(imdb_id=f'ttCT000{part}', title=f'The Completion Part {part}',
+                 stripped_title=f'thecompletionpart{part}',
+                 release_year=2000 + part)
+        for part in range(1, 4)])
+    assert db_handler.complete_titles('Completion P', 2,
+                                      include_years=True) == [
+        {'title': 'The Completion Part 1', 'release_year': 2001},
+        {'title': 'The Completion Part 2', 'release_year': 2002}]
+    assert db_handler.complete_titles('the completion part 3') == [
+        {'title': 'The Completion Part 3'}]
+
+
+def test_catalogue_listener(db_handler):
+    listened = database_handler.DBHandler(pg_url=TEST_DB_URL)
+    calls = []
+    listener = listened.listen_for_catalogue_changes(
+        lambda: calls.append(len(calls)), retry_delay=0.1)
+
+    def wait_for_calls(count):
+        deadline = time.monotonic() + 10
+        while len(calls) < count and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return len(calls)
+
+    # Called once LISTEN is active, to resync
+    assert listener.listening.wait(10)
+    assert wait_for_calls(1) == 1
+    db_handler.notify_catalogue_changed()
+    assert wait_for_calls(2) == 2
+    # Notifications missed while reconnecting are made up for by a resync
+    db_handler._execute_sql(
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+        "WHERE query IN (%s, %s)",
+        [queries.LISTEN_CATALOGUE_CHANGED, queries.POLL_NOTIFICATIONS])
+    assert wait_for_calls(3) == 3
+    listened.close()
+    assert not listener.thread.is_alive()
+    assert listened.listeners == []
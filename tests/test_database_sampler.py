@@ -0,0 +1,108 @@
+"""
+Tests for imdb_game.database.sampler module
+"""
+import random
+from concurrent.futures import ThreadPoolExecutor
+from uuid import uuid4
+import pytest
+from imdb_game.database.sampler import MovieSampler, PlayedMovies
+
+
+@pytest.fixture
+def rows():
+    # Ten years with a few movies each
+    yield [(uuid4(), 1990 + index % 10) for index in range(40)]
+
+
+def test_sampler_starts_stale():
+    sampler = MovieSampler()
+    assert sampler.is_stale()
+    assert sampler.sample(3) == []
+
+
+def test_sample_distinct_years(rows):
+    sampler = MovieSampler(rng=random.Random(7))
+    sampler.load(rows)
+    assert not sampler.is_stale()
+    assert len(sampler) == 40
+    year_of = dict(rows)
+    for _ in range(100):
+        options = sampler.sample(3)
+        assert len(options) == 3
+        assert len({option['release_year'] for option in options}) == 3
+        assert len({option['movie_id'] for option in options}) == 3
+        for option in options:
+            assert year_of[option['movie_id']] == option['release_year']
+
+
+def test_sample_with_few_years():
+    sampler = MovieSampler()
+    rows = [(uuid4(), 1999), (uuid4(), 1999), (uuid4(), 2001)]
+    sampler.load(rows)
+    options = sampler.sample(3)
+    assert {option['movie_id'] for option in options} == \
+           {movie_id for movie_id, _ in rows}
+    sampler.load(rows[:2])
+    assert len(sampler.sample(3)) == 2
+
+
+def test_invalidate_and_max_age(rows):
+    sampler = MovieSampler(max_age=60)
+    sampler.load(rows)
+    sampler.invalidate()
+    assert sampler.is_stale()
+    sampler = MovieSampler(max_age=0)
+    sampler.load(rows)
+    assert sampler.is_stale()
+
+
+def test_sample_excludes_played(rows):
+    sampler = MovieSampler()
+    sampler.load(rows)
+    played = {movie_id for movie_id, _ in rows[:35]}
+    unplayed = {movie_id for movie_id, _ in rows[35:]}
+    for _ in range(50):
+        options = sampler.sample(3, played)
+        assert {option['movie_id'] for option in options} <= unplayed
+        assert len({option['movie_id'] for option in options}) == 3
+
+
+def test_sample_tops_up_with_played(rows):
+    sampler = MovieSampler()
+    sampler.load(rows)
+    played = {movie_id for movie_id, _ in rows[1:]}
+    options = sampler.sample(3, played)
+    assert len({option['movie_id'] for option in options}) == 3
+    assert rows[0][0] in {option['movie_id'] for option in options}
+
+
+def test_played_movies_lru():
+    played = PlayedMovies(max_players=2)
+    first, second, third = uuid4(), uuid4(), uuid4()
+    movie_id = uuid4()
+    played.put(first, [movie_id])
+    played.put(second, [])
+    assert played.get(first) == {movie_id}
+    played.put(third, [])
+    assert played.get(second) is None
+    played.add(third, movie_id)
+    assert played.get(third) == {movie_id}
+
+
+def test_played_movies_threads():
+    played = PlayedMovies(max_players=4)
+    players = [uuid4() for _ in range(16)]
+    movie_id = uuid4()
+
+    def worker(offset):
+        for index in range(2000):
+            player_id = players[(index + offset) % len(players)]
+            if played.get(player_id) is None:
+                played.put(player_id, [])
+            played.add(player_id, movie_id)
+    # Gets racing evictions used to raise KeyError from move_to_end()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [executor.submit(worker, offset)
+                       for offset in range(8)]:
+            future.result()
+    assert len(played._played) <= 4
@@ -0,0 +1,153 @@
+"""
+Tests for imdb_game.database.titles module
+"""
+import random
+from uuid import uuid4
+import pytest
+from imdb_game.database.titles import TitleCompleter, TitleMatcher, \
+    edit_distance, title_keys
+from imdb_game.utils.utils import strip_text
+
+
+@pytest.fixture
+def movies():
+    titles = ['The Shawshank Redemption', 'The Godfather',
+              'The Godfather Part II', 'The Dark Knight', 'Pulp Fiction',
+              "Schindler's List", 'Jaws', 'Heat', 'A Beautiful Mind']
+    yield {title: uuid4() for title in titles}
+
+
+@pytest.fixture
+def matcher(movies):
+    matcher = TitleMatcher()
+    matcher.load((movie_id, title, strip_text(title))
+                 for title, movie_id in movies.items())
+    yield matcher
+
+
+def test_title_keys():
+    assert title_keys('The Godfather') == ['thegodfather', 'godfather']
+    assert title_keys('Jaws') == ['jaws']
+    assert title_keys('The The') == ['thethe', 'the']
+    assert title_keys('Léon: The Professional') == ['leontheprofessional']
+
+
+def test_edit_distance():
+    assert edit_distance('kitten', 'sitting') == 3
+    assert edit_distance('godfather', 'godfather') == 0
+    assert edit_distance('', 'heat') == 4
+    assert edit_distance('heat', '') == 4
+    rng = random.Random(3)
+    for _ in range(500):
+        first = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 9)))
+        second = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 9)))
+        previous = list(range(len(second) + 1))
+        for row, first_char in enumerate(first, 1):
+            current = [row]
+            for column, second_char in enumerate(second, 1):
+                current.append(min(previous[column] + 1,
+                                   current[column - 1] + 1,
+                                   previous[column - 1] +
+                                   (first_char != second_char)))
+            previous = current
+        assert edit_distance(first, second) == previous[-1]
+
+
+def test_matcher_starts_stale():
+    matcher = TitleMatcher()
+    assert matcher.is_stale()
+    assert matcher.match('thegodfather') is None
+
+
+def test_exact_and_article_matches(matcher, movies):
+    assert not matcher.is_stale()
+    assert matcher.match('thegodfather') == movies['The Godfather']
+    assert matcher.match('shawshankredemption') == \
+           movies['The Shawshank Redemption']
+    assert matcher.match('beautifulmind') == movies['A Beautiful Mind']
+    matcher.invalidate()
+    assert matcher.is_stale()
+
+
+@pytest.mark.parametrize('guess,title', [
+    ('the shawshank redemtion', 'The Shawshank Redemption'),
+    ('shawshank redemptoin', 'The Shawshank Redemption'),
+    ('godfathr', 'The Godfather'),
+    ('the godfather part 11', 'The Godfather Part II'),
+    ('the dark knigt', 'The Dark Knight'),
+    ('schindlers lsit', "Schindler's List"),
+])
+def test_near_misses(matcher, movies, guess, title):
+    assert matcher.match(strip_text(guess)) == movies[title]
+
+
+@pytest.mark.parametrize('guess', ['Jams', 'Heap', 'The Dark Night Rises',
+                                   'Pulp Friction Burns', 'xyzzy'])
+def test_misses(matcher, guess):
+    # Short titles must be exact, long ones only forgive a few typos
+    assert matcher.match(strip_text(guess)) is None
+
+
+def test_shared_titles_prefer(movies):
+    remake, original = uuid4(), uuid4()
+    matcher = TitleMatcher()
+    matcher.load([(original, 'Scarface', 'scarface'),
+                  (remake, 'Scarface', 'scarface'),
+                  (remake, 'Scarface (1983)', 'scarface1983')])
+    assert len(matcher) == 2
+    assert matcher.match('scarface') == original
+    assert matcher.match('scarface', prefer=remake) == remake
+    assert matcher.match('scarfase', prefer=remake) == remake
+
+
+@pytest.fixture
+def completer():
+    completer = TitleCompleter()
+    completer.load([('The Godfather', 'thegodfather', 1972),
+                    ('The Godfather Part II', 'thegodfatherpartii', 1974),
+                    ('Gods and Monsters', 'godsandmonsters', 1998),
+                    ('Good Will Hunting', 'goodwillhunting', 1997),
+                    ('Scarface', 'scarface', 1932),
+                    ('Scarface', 'scarface', 1983)])
+    yield completer
+
+
+def test_completer_starts_stale():
+    completer = TitleCompleter()
+    assert completer.is_stale()
+    assert completer.complete('thegod') == []
+
+
+def test_complete(completer):
+    assert not completer.is_stale()
+    assert completer.complete('thegod') == [
+        {'title': 'The Godfather'}, {'title': 'The Godfather Part II'}]
+    # Titles are also found without their leading article
+    assert [suggestion['title'] for suggestion in
+            completer.complete('god')] == \
+           ['The Godfather', 'The Godfather Part II', 'Gods and Monsters']
+    assert completer.complete('god', limit=1) == [{'title': 'The Godfather'}]
+    assert completer.complete('god', limit=0) == []
+    assert completer.complete('god', limit=-1) == []
+    assert completer.complete('go', limit=10)[-1] == \
+           {'title': 'Good Will Hunting'}
+    assert completer.complete('g') == []
+    assert completer.complete('xyz') == []
+
+
+def test_complete_accented_titles():
+    completer = TitleCompleter()
+    # Stored stripped_title values from before accents were removed
+    completer.load([('Amélie', 'amélie', 2001),
+                    ('Léon: The Professional', 'léontheprofessional', 1994)])
+    assert completer.complete(strip_text('Amel')) == [{'title': 'Amélie'}]
+    assert completer.complete(strip_text('Leon')) == \
+           [{'title': 'Léon: The Professional'}]
+
+
+def test_complete_years(completer):
+    # Remakes sharing a title are one suggestion unless years are shown
+    assert completer.complete('scar') == [{'title': 'Scarface'}]
+    assert completer.complete('scar', include_years=True) == [
+        {'title': 'Scarface', 'release_year': 1932},
+        {'title': 'Scarface', 'release_year': 1983}]
@@ -0,0 +1,90 @@
+"""
+Tests for imdb_game.gameshow.difficulty module
+"""
+import pytest
+import testing.postgresql
+from datetime import datetime
+from uuid import uuid4
+from imdb_game.database.catalogue import Catalogue
+from imdb_game.database.dataclasses import Clue, Movie, Player, Round, \
+    clue_order
+from imdb_game.database.handler import DBHandler
+from imdb_game.gameshow.difficulty import PRIOR_WEIGHT, clue_difficulty, \
+    count_names, score_clue_difficulty, text_difficulty
+from test_tools import init_test_db
+
+
+@pytest.fixture(scope="module")
+def db_handler():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield DBHandler(pg_url=postgresql.url())
+
+
+def test_count_names():
+    assert count_names('Some mild swearing.') == 0
+    assert count_names('Rick punches Ilsa. Sam plays the piano.') == 1
+    assert count_names('A man says "FUCK" to Laszlo.') == 1
+
+
+def test_text_difficulty():
+    generic = text_difficulty('Some mild swearing.')
+    named = text_difficulty('Rick Blaine shoots Major Strasser at the '
+                            'airport.')
+    quoted = text_difficulty('A man says "here\'s looking at you, kid" '
+                             'twice.')
+    assert 0 < named < generic < 1
+    assert quoted < generic
+
+
+def test_clue_difficulty():
+    clue_text = 'Some mild swearing.'
+    prior = text_difficulty(clue_text)
+    assert clue_difficulty(clue_text, 0, 0) == pytest.approx(prior)
+    # A few guesses only nudge the text estimate
+    assert prior < clue_difficulty(clue_text, 1, 0) < 1
+    # Many guesses outweigh it
+    assert clue_difficulty(clue_text, 100, 900) == \
+           pytest.approx(0.1, abs=PRIOR_WEIGHT / 1000)
+    assert clue_difficulty(clue_text, 1000, 0) == \
+           pytest.approx(1.0, abs=PRIOR_WEIGHT / 1000)
+
+
+def test_score_clue_difficulty(db_handler):
+    movie_id = db_handler.add_movie(Movie(
+        imdb_id='ttDF0001', title='Difficulty Movie',
+        stripped_title='difficultymovie', release_year=1990))
+    db_handler.add_clues_bulk([
+        Clue(movie_id=movie_id, category_id=1, clue_text=text,
+             spoiler=False, date_created=datetime.utcnow())
+        for text in ('Some mild swearing.', 'A kiss.', 'A brief fight.')])
+    clue_ids = {clue.clue_text: clue.clue_id
+                for clue in db_handler.get_clues_by_movie_id(movie_id)}
+    easy_id, hard_id, unguessed_id = clue_ids['A kiss.'], \
+        clue_ids['Some mild swearing.'], clue_ids['A brief fight.']
+    for index in range(20):
+        player = Player(f'difficulty_player_{index}', player_id=uuid4(),
+                        date_created=datetime.utcnow(),
+                        date_last_played=datetime.utcnow())
+        db_handler.add_full_player(player)
+        for clue_id in (easy_id, hard_id, unguessed_id):
+            db_handler.add_player_clue(player.player_id, clue_id)
+        db_handler.add_guess(player.player_id, easy_id, 'Difficulty Movie',
+                             True, movie_id)
+        db_handler.add_guess(player.player_id, hard_id, 'Other Movie', False)
+    assert score_clue_difficulty(db_handler) == 3
+    difficulties = {clue.clue_id: clue.difficulty for clue in
+                    db_handler.get_clues_by_movie_id(movie_id)}
+    assert difficulties[easy_id] < 0.5 < difficulties[hard_id]
+    # Being shown without a guess doesn't make a clue look harder
+    assert difficulties[unguessed_id] == \
+           pytest.approx(text_difficulty('A brief fight.'))
+    # Packs come ordered by difficulty and rounds draw the hardest first
+    pack = db_handler.load_round(movie_id)
+    assert pack.clues == sorted(pack.clues, key=clue_order)
+    assert pack.clues[-1].clue_id == hard_id
+    assert [clue.clue_id for clue in Catalogue.from_database(db_handler)
+            .get_round_pack(movie_id).clues] == \
+           [clue.clue_id for clue in pack.clues]
+    game_round = Round(1, pack.movie, clues_pool=pack.clues, seed=1)
+    assert game_round.get_random_clue().clue_id == hard_id
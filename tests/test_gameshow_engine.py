@@ -0,0 +1,187 @@
+"""
+Tests for imdb_game.gameshow.engine module
+"""
+import random
+import pytest
+import testing.postgresql
+from datetime import datetime
+from uuid import uuid4
+from imdb_game.database.dataclasses import Clue, Movie, Player
+from imdb_game.database.handler import DBHandler
+from imdb_game.gameshow.engine import GameEngine, InvalidActionError
+from test_tools import init_test_db
+
+
+@pytest.fixture(scope="module")
+def db_handler():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield DBHandler(pg_url=postgresql.url())
+
+
+@pytest.fixture(scope="module")
+def movie_id(db_handler):
+    movie_id = db_handler.add_movie(Movie(
+        imdb_id='ttEN0001', title='Engine Movie', stripped_title='enginemovie',
+        release_year=1984))
+    db_handler.add_clues_bulk([
+        Clue(movie_id=movie_id, category_id=index % 5 + 1,
+             clue_text=f'Engine clue {index}', spoiler=False,
+             date_created=datetime.utcnow())
+        for index in range(8)])
+    yield movie_id
+
+
+@pytest.fixture()
+def engine(db_handler):
+    yield GameEngine(Player('engine_player'), database=db_handler)
+
+
+def choose(engine, movie_id):
+    """
+    Offers the options of the round and picks movie_id, the only movie
+    """
+    engine.get_options()
+    return engine.choose_movie(movie_id)
+
+
+def test_choose_movie_and_next_clue(engine, movie_id):
+    first = choose(engine, movie_id)
+    assert first['clue_text'].startswith('Engine clue')
+    assert first['category']['category_id'] in range(1, 6)
+    assert first['clue_number'] == 1 and first['round_number'] == 1
+    # Asking again shows the same clue until the player answers
+    assert engine.next_clue() == first
+    with pytest.raises(InvalidActionError):
+        engine.choose_movie(movie_id)
+
+
+def test_wrong_pass_and_correct_guesses(engine, movie_id):
+    choose(engine, movie_id)
+    outcome = engine.submit_guess('Some Other Movie')
+    assert outcome == {'result': 'wrong', 'points': -1, 'score': -1,
+                       'action': 'next_clue', 'title': None,
+                       'game_over': False}
+    second = engine.next_clue()
+    assert second['clue_number'] == 2
+    assert engine.submit_guess(' /PASS ')['result'] == 'pass'
+    outcome = engine.submit_guess('engine movie!')
+    assert outcome['result'] == 'correct'
+    assert outcome['points'] == 3 and outcome['score'] == 2
+    assert outcome['action'] == 'next_round'
+    assert outcome['title'] == 'Engine Movie'
+    assert not engine.round_in_progress()
+    with pytest.raises(InvalidActionError):
+        engine.next_clue()
+    with pytest.raises(InvalidActionError):
+        engine.submit_guess('Engine Movie')
+
+
+def test_round_lost_when_out_of_clues(engine, movie_id):
+    choose(engine, movie_id)
+    for _ in range(4):
+        assert engine.submit_guess('/pass')['action'] == 'next_clue'
+        engine.next_clue()
+    outcome = engine.submit_guess('/pass')
+    assert outcome['action'] == 'next_round'
+    assert outcome['title'] == 'Engine Movie'
+    assert engine.game.round == 1
+
+
+def test_game_over(engine, movie_id):
+    for _ in range(engine.game.MAX_ROUNDS + 1):
+        choose(engine, movie_id)
+        engine.submit_guess('Engine Movie')
+    assert engine.game.GAME_OVER
+    with pytest.raises(InvalidActionError):
+        engine.choose_movie(movie_id)
+    assert engine.start_game() is not None
+    assert not engine.game.GAME_OVER and engine.game.score == 0
+
+
+def test_unknown_movie(engine):
+    with pytest.raises(InvalidActionError):
+        engine.choose_movie(uuid4())
+    assert not engine.round_in_progress()
+
+
+def test_only_offered_movies_can_be_chosen(engine, movie_id):
+    with pytest.raises(InvalidActionError):
+        engine.choose_movie(movie_id)
+    draws = []
+    database = engine.DB
+
+    class CountingHandler:
+        def __getattr__(self, name):
+            if name == 'get_three_movie_options':
+                draws.append(name)
+            return getattr(database, name)
+
+    engine.DB = CountingHandler()
+    options = engine.get_options()
+    # Asking again offers the same movies instead of drawing new ones
+    for _ in range(3):
+        assert engine.get_options() == options
+    assert len(draws) == 1
+    with pytest.raises(InvalidActionError):
+        engine.choose_movie(uuid4())
+    engine.choose_movie(movie_id)
+    assert engine.game.options == []
+
+
+def test_options_prefetch_rounds(engine, movie_id):
+    options = engine.get_options()
+    assert movie_id in {option['movie_id'] for option in options}
+    calls = []
+    database = engine.DB
+
+    class CountingHandler:
+        def __getattr__(self, name):
+            calls.append(name)
+            return getattr(database, name)
+
+    engine.DB = CountingHandler()
+    engine.choose_movie(movie_id)
+    assert calls == []
+
+
+def test_seeded_engine_replays_rounds(db_handler, movie_id):
+    played = []
+    for _ in range(2):
+        engine = GameEngine(Player('seeded_player'), database=db_handler,
+                            rng=random.Random(42))
+        clues = [choose(engine, movie_id)['clue_text']]
+        for _ in range(3):
+            engine.submit_guess('/pass')
+            clues.append(engine.next_clue()['clue_text'])
+        played.append(clues)
+    assert played[0] == played[1]
+    assert len(set(played[0])) == 4
+
+
+def test_guesses_recorded_for_registered_player(db_handler, movie_id):
+    player = Player('recorded_player', player_id=uuid4(),
+                    date_created=datetime.utcnow(),
+                    date_last_played=datetime.utcnow())
+    db_handler.add_full_player(player)
+    engine = GameEngine(player, database=db_handler)
+    choose(engine, movie_id)
+    engine.submit_guess('Wrong Movie')
+    engine.next_clue()
+    engine.submit_guess('/pass')
+    engine.next_clue()
+    engine.submit_guess('Engine Movie')
+    stats = {clue_text: (missed, solved) for _, _, clue_text, missed, solved
+             in db_handler.get_clue_guess_stats()
+             if clue_text.startswith('Engine clue')}
+    # One wrong guess, a pass that isn't a guess, then a right guess
+    assert sorted(stats.values(), reverse=True)[:3] == \
+           [(1, 0), (0, 1), (0, 0)]
+
+
+def test_near_miss_guess(engine, movie_id):
+    choose(engine, movie_id)
+    assert engine.submit_guess('Engine Movi')['result'] == 'correct'
+    engine.DB.add_alternate_title(movie_id, 'Motor Picture')
+    choose(engine, movie_id)
+    assert engine.submit_guess('motor picture')['result'] == 'correct'
@@ -0,0 +1,90 @@
+"""
+Tests for imdb_game.gameshow.sessions module
+"""
+import threading
+from imdb_game.gameshow.sessions import SessionRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_registry(**kwargs):
+    counter = iter(range(1000))
+    return SessionRegistry(
+        lambda session_id: {'host': next(counter), 'session_id': session_id},
+        **kwargs)
+
+
+def test_create_and_get():
+    registry = make_registry()
+    session_id, host = registry.create()
+    assert registry.get(session_id) is host
+    assert registry.get('unknown') is None
+    assert registry.get_or_create(session_id) == (session_id, host)
+    other_id, other = registry.get_or_create('unknown')
+    assert other_id != session_id and other is not host
+    assert len(registry) == 2
+
+
+def test_idle_sessions_expire():
+    clock = FakeClock()
+    registry = make_registry(idle_timeout=10, clock=clock)
+    stale_id, _ = registry.create()
+    clock.now = 5
+    fresh_id, _ = registry.create()
+    clock.now = 12
+    assert registry.expire() == 1
+    assert stale_id not in registry
+    assert fresh_id in registry
+    clock.now = 100
+    assert registry.get(fresh_id) is None
+    assert len(registry) == 0
+
+
+def test_least_recently_used_evicted():
+    registry = make_registry(max_sessions=2)
+    first_id, _ = registry.create()
+    second_id, _ = registry.create()
+    registry.get(first_id)
+    third_id, _ = registry.create()
+    assert len(registry) == 2
+    assert second_id not in registry
+    assert first_id in registry and third_id in registry
+
+
+def test_session_context_serializes_requests():
+    registry = make_registry()
+    with registry.session() as (session_id, host):
+        assert registry.get(session_id) is host
+        assert host['session_id'] == session_id
+    # Sessions started elsewhere keep their id
+    with registry.session('elsewhere') as (adopted_id, host):
+        assert adopted_id == 'elsewhere' == host['session_id']
+    entered = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def slow_request():
+        with registry.session(session_id):
+            entered.set()
+            release.wait(5)
+            order.append('slow')
+
+    thread = threading.Thread(target=slow_request)
+    thread.start()
+    entered.wait(5)
+    # Other sessions are not blocked by the slow one
+    with registry.session() as (other_id, _):
+        order.append('other')
+    release.set()
+    with registry.session(session_id):
+        order.append('same')
+    thread.join()
+    assert order == ['other', 'slow', 'same']
+    registry.discard(other_id)
+    assert other_id not in registry
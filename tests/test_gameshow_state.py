@@ -0,0 +1,115 @@
+"""
+Tests for imdb_game.gameshow.state module
+"""
+import json
+import pytest
+import testing.postgresql
+from datetime import datetime
+from uuid import uuid4
+from imdb_game.database.dataclasses import Clue, Game, Movie, Player, Round
+from imdb_game.database.handler import DBHandler
+from imdb_game.gameshow.state import GameState, MemoryGameStateStore, \
+    PostgresGameStateStore, StaleStateError, pack_state, unpack_state
+from test_tools import init_test_db
+
+
+@pytest.fixture(scope="module")
+def db_handler():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield DBHandler(pg_url=postgresql.url())
+
+
+def make_state() -> GameState:
+    player = Player(username='state_player', player_id=uuid4(),
+                    date_created=datetime(2023, 5, 1, 12, 30, 15, 123456))
+    movie = Movie(imdb_id='tt0000001', title='State Movie',
+                  stripped_title='statemovie', release_year=1999,
+                  movie_id=uuid4())
+    clues = [Clue(movie_id=movie.movie_id, category_id=index % 5 + 1,
+                  clue_text=f'Clue number {index}', spoiler=index % 2 == 0,
+                  date_created=datetime(2023, 1, 1, index), clue_id=uuid4(),
+                  difficulty=index / 10 if index % 3 else None)
+             for index in range(10)]
+    game_round = Round(2, movie, clues_pool=clues[2:], clues_played=clues[:2],
+                       current_clue_number=1)
+    game = Game(player_id=player.player_id, score=7, round=2,
+                start_time=datetime(2023, 5, 1, 12, 31), game_id=uuid4(),
+                current_round=game_round,
+                options=[{'movie_id': uuid4(), 'release_year': 1999}])
+    return GameState(player, game)
+
+
+def test_pack_round_trip():
+    state = make_state()
+    restored = unpack_state(pack_state(state), version=3)
+    assert restored.player == state.player
+    assert restored.game == state.game
+    assert restored.version == 3
+    empty = GameState(Player('new_player'), Game(player_id=None))
+    assert unpack_state(pack_state(empty)).game == empty.game
+
+
+def test_pack_is_compact():
+    state = make_state()
+    verbose = json.dumps([state.player.dict(), state.game.dict(),
+                          state.game.current_round.dict()], default=str)
+    assert len(pack_state(state)) < len(verbose) / 2
+
+
+def test_memory_store_versions():
+    store = MemoryGameStateStore()
+    assert store.load('key') is None
+    state = make_state()
+    assert store.save('key', state) == 1
+    assert store.save('key', state) == 2
+    loaded = store.load('key')
+    assert loaded.version == 2 and loaded.game == state.game
+    loaded.game.increment_score(1)
+    store.save('key', loaded)
+    with pytest.raises(StaleStateError):
+        store.save('key', state)
+    assert store.load('key').game.score == 8
+    store.delete('key')
+    assert store.load('key') is None
+
+
+def test_postgres_store_versions(db_handler):
+    store = PostgresGameStateStore(db_handler)
+    assert store.load('key') is None
+    state = make_state()
+    assert store.save('key', state) == 1
+    other_worker = store.load('key')
+    assert other_worker.game == state.game
+    assert store.save('key', other_worker) == 2
+    with pytest.raises(StaleStateError):
+        store.save('key', state)
+    # A second new state for the same key conflicts too
+    with pytest.raises(StaleStateError):
+        store.save('key', make_state())
+    store.expire(3600)
+    assert store.load('key').version == 2
+    store.expire(0)
+    assert store.load('key') is None
+    store.save('key', make_state())
+    store.delete('key')
+    assert store.load('key') is None
+
+
+def test_memory_store_expires_states():
+    now = [0.0]
+    store = MemoryGameStateStore(max_states=2, idle_timeout=10,
+                                 clock=lambda: now[0])
+    for key in ('a', 'b', 'c'):
+        store.save(key, make_state())
+    # The least recently saved state made room for the newest
+    assert len(store) == 2 and store.load('a') is None
+    now[0] = 5
+    store.save('c', store.load('c'))
+    now[0] = 12
+    assert store.load('b') is None
+    assert store.load('c').version == 2
+    # An expired state is saved again from scratch
+    assert store.save('b', make_state()) == 1
+    now[0] = 30
+    assert store.expire() == 2 and len(store) == 0
@@ -0,0 +1,322 @@
+"""
+Tests for imdb_game.scraper module, run against a local HTTP stand-in that
+serves saved IMDb pages.
+"""
+import csv
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import testing.postgresql
+import imdb_game.scraper.scraper as scraper
+import imdb_game.database.dataclasses as dc
+from imdb_game.database.catalogue import Catalogue
+from imdb_game.database.corpus import MappedCorpus
+from imdb_game.database.handler import DBHandler
+from test_tools import init_test_db
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+CATEGORIES = [{'category_id': 1, 'display_name': 'Sex & Nudity',
+               'short_name': 'nudity'},
+              {'category_id': 2, 'display_name': 'Violence & Gore',
+               'short_name': 'violence'},
+              {'category_id': 3, 'display_name': 'Profanity',
+               'short_name': 'profanity'}]
+
+
+class SavedPageHandler(BaseHTTPRequestHandler):
+    """
+    Serves tests/data/parentalguide.html for every parental guide path, except
+    for missing titles. Paths under /flaky/ answer 503 twice before succeeding
+    and pages are sent with an ETag that is honoured by If-None-Match
+    """
+    ETAG = '"saved-v1"'
+    requested_paths = []
+    flaky_attempts = {}
+    not_modified = []
+
+    def do_GET(self):
+        self.requested_paths.append(self.path)
+        if self.path.startswith('/flaky/'):
+            attempts = self.flaky_attempts.get(self.path, 0) + 1
+            self.flaky_attempts[self.path] = attempts
+            if attempts <= 2:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        if not self.path.endswith('/parentalguide') or \
+                'missing' in self.path:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == self.ETAG:
+            self.not_modified.append(self.path)
+            self.send_response(304)
+            self.end_headers()
+            return
+        with open(os.path.join(DATA_DIR, 'parentalguide.html'), 'rb') as page:
+            body = page.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', self.ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def saved_pages_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SavedPageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    scraper.configure_session(retries=3, backoff_factor=0)
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    scraper.configure_session()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='module')
+def db_handler():
+    with testing.postgresql.Postgresql() as postgresql:
+        init_test_db(postgresql)
+        yield DBHandler(pg_url=postgresql.url())
+
+
+@pytest.fixture(scope='module')
+def movies():
+    yield [dc.Movie(imdb_id=f'tt{index:07d}', title=f'Movie {index}',
+                    stripped_title=f'movie{index}', release_year=2000 + index)
+           for index in range(12)]
+
+
+def test_create_clues_list(movies):
+    with open(os.path.join(DATA_DIR, 'parentalguide.html'),
+              encoding='utf-8') as page:
+        soup = scraper.BeautifulSoup(page.read(), 'html.parser')
+    clues = scraper.create_clues_list(soup, CATEGORIES, movies[0])
+    assert len(clues) == 4
+    assert [clue.category_id for clue in clues] == [1, 1, 3, 2]
+    assert [clue.spoiler for clue in clues] == [False, False, False, True]
+    assert clues[0].clue_text == \
+           'A man and woman kiss passionately in the opening scene.'
+
+
+def test_get_parental_guide_url(movies):
+    assert scraper.get_parental_guide_url(movies[1]) == \
+           'https://www.imdb.com/title/tt0000001/parentalguide'
+
+
+def test_crawl_parental_guides(saved_pages_server, movies):
+    SavedPageHandler.requested_paths.clear()
+    results = list(scraper.crawl_parental_guides(movies, CATEGORIES,
+                                                 concurrency=4, rate_limit=0,
+                                                 root=saved_pages_server))
+    assert len(results) == len(movies)
+    assert {movie.imdb_id for movie, _ in results} == \
+           {movie.imdb_id for movie in movies}
+    for movie, clues in results:
+        assert len(clues) == 4
+        assert all(clue.movie_id == movie.movie_id for clue in clues)
+    assert sorted(SavedPageHandler.requested_paths) == \
+           sorted(f'/title/{movie.imdb_id}/parentalguide' for movie in movies)
+
+
+def test_crawl_skips_failed_pages(saved_pages_server, movies):
+    missing = dc.Movie(imdb_id='ttmissing', title='Missing',
+                       stripped_title='missing', release_year=1999)
+    results = dict((movie.imdb_id, clues) for movie, clues in
+                   scraper.crawl_parental_guides([missing, *movies[:2]],
+                                                 CATEGORIES, concurrency=2,
+                                                 rate_limit=0,
+                                                 root=saved_pages_server))
+    assert results['ttmissing'] is None
+    assert len(results[movies[0].imdb_id]) == 4
+
+
+def test_crawl_skips_malformed_pages(saved_pages_server, movies):
+    # Clues of unknown categories can't be parsed
+    results = list(scraper.crawl_parental_guides(movies[:3], CATEGORIES[:1],
+                                                 concurrency=2, rate_limit=0,
+                                                 root=saved_pages_server))
+    assert len(results) == 3
+    assert all(clues is None for _, clues in results)
+
+
+def test_load_webpage_retries(saved_pages_server):
+    soup = scraper.load_webpage(
+        f'{saved_pages_server}/flaky/title/tt0000001/parentalguide')
+    assert len(soup.find_all(class_='ipl-zebra-list__item')) == 5
+    assert SavedPageHandler.flaky_attempts[
+               '/flaky/title/tt0000001/parentalguide'] == 3
+
+
+def test_load_webpage_error(saved_pages_server):
+    with pytest.raises(scraper.PageLoadError) as exc_info:
+        scraper.load_webpage(f'{saved_pages_server}/find?q=nothing')
+    assert exc_info.value.status_code == 404
+
+
+def test_fetch_page_revalidates_cache(saved_pages_server, tmp_path):
+    url = f'{saved_pages_server}/title/tt0000002/parentalguide'
+    cache = scraper.configure_cache(str(tmp_path / 'pages.sqlite3'), ttl=0)
+    try:
+        first = scraper.fetch_page(url)
+        assert cache.get(url).etag == SavedPageHandler.ETAG
+        second = scraper.fetch_page(url)
+        assert second == first
+        assert SavedPageHandler.not_modified.count(
+            '/title/tt0000002/parentalguide') == 1
+    finally:
+        scraper.configure_cache(None)
+
+
+def test_fetch_page_serves_stale_on_error(saved_pages_server, tmp_path):
+    url = f'{saved_pages_server}/title/ttmissing/parentalguide'
+    cache = scraper.configure_cache(str(tmp_path / 'pages.sqlite3'), ttl=0)
+    try:
+        cache.put(url, 'stale body')
+        assert scraper.fetch_page(url) == 'stale body'
+    finally:
+        scraper.configure_cache(None)
+
+
+def test_fetch_page_offline(saved_pages_server, tmp_path):
+    url = f'{saved_pages_server}/title/tt0000003/parentalguide'
+    path = str(tmp_path / 'pages.sqlite3')
+    try:
+        scraper.configure_cache(path)
+        body = scraper.fetch_page(url)
+        scraper.configure_cache(path, ttl=0, offline=True)
+        SavedPageHandler.requested_paths.clear()
+        assert scraper.fetch_page(url) == body
+        assert SavedPageHandler.requested_paths == []
+        with pytest.raises(scraper.PageLoadError):
+            scraper.fetch_page(f'{saved_pages_server}/title/tt9/parentalguide')
+    finally:
+        scraper.configure_cache(None)
+
+
+def test_cached_crawl_is_not_throttled(saved_pages_server, movies, tmp_path):
+    class CountingLimiter(scraper.HostRateLimiter):
+        waits = 0
+
+        def wait(self, url):
+            CountingLimiter.waits += 1
+            super().wait(url)
+
+    scraper.configure_cache(str(tmp_path / 'pages.sqlite3'))
+    try:
+        list(scraper.crawl_parental_guides(movies[:3], CATEGORIES,
+                                           rate_limit=0,
+                                           root=saved_pages_server))
+        limiter = CountingLimiter(rate=1)
+        results = [scraper.scrape_parental_guide(movie, CATEGORIES, limiter,
+                                                 saved_pages_server)
+                   for movie in movies[:3]]
+        assert all(len(clues) == 4 for _, clues in results)
+        assert CountingLimiter.waits == 0
+    finally:
+        scraper.configure_cache(None)
+
+
+def test_hash_parental_guide(movies):
+    clues = [dc.Clue(movie_id=None, category_id=1, clue_text='Kissing.',
+                     spoiler=False, date_created=None),
+             dc.Clue(movie_id=None, category_id=2, clue_text='A fight.',
+                     spoiler=True, date_created=None)]
+    guide_hash = scraper.hash_parental_guide(clues)
+    assert guide_hash == scraper.hash_parental_guide(list(clues))
+    clues[1].clue_text = 'A long fight.'
+    assert guide_hash != scraper.hash_parental_guide(clues)
+
+
+def test_store_parental_guides_incremental(saved_pages_server, db_handler,
+                                           movies):
+    scraper.insert_movies(db_handler, movies[:3])
+    first = scraper.store_parental_guides(
+        db_handler, scraper.crawl_parental_guides(movies[:3], CATEGORIES,
+                                                  rate_limit=0,
+                                                  root=saved_pages_server))
+    assert first == {'updated': 3, 'unchanged': 0, 'failed': 0,
+                     'new_clues': 12}
+    # Nothing changed, so nothing is written again
+    second = scraper.store_parental_guides(
+        db_handler, scraper.crawl_parental_guides(movies[:3], CATEGORIES,
+                                                  rate_limit=0,
+                                                  root=saved_pages_server),
+        db_handler.get_guide_hashes())
+    assert second == {'updated': 0, 'unchanged': 3, 'failed': 0,
+                      'new_clues': 0}
+    # A full run over the same guides must not duplicate clues
+    third = scraper.store_parental_guides(
+        db_handler, scraper.crawl_parental_guides(movies[:3], CATEGORIES,
+                                                  rate_limit=0,
+                                                  root=saved_pages_server))
+    assert third['new_clues'] == 0
+    assert len(db_handler.get_clues_by_movie_id(movies[0].movie_id)) == 4
+
+
+def test_load_csv_data(db_handler):
+    assert scraper.load_csv_data(db_handler, os.path.join('db', 'data')) == \
+           6171
+    shawshank = db_handler.get_movie_by_imdb_id('tt0111161')
+    assert shawshank.title == 'The Shawshank Redemption'
+    assert len(db_handler.get_clues_by_movie_id(shawshank.movie_id)) > 0
+    # Seeding again is a no-op
+    assert scraper.load_csv_data(db_handler, os.path.join('db', 'data')) == 0
+    # Title leaks are flagged at ingest the same way as the seed export
+    with open(os.path.join('db', 'data', 'clues.csv'),
+              encoding='utf-8') as file:
+        leaks = sum(row['title_leak'] == 'true'
+                    for row in csv.DictReader(file))
+    assert leaks == sum(title_leak for _, _, _, title_leak
+                        in db_handler.get_clue_titles())
+    assert scraper.classify_clues(db_handler) == 0
+    clue_id = db_handler.get_clue_titles()[0][0]
+    db_handler.set_title_leaks({clue_id: True})
+    assert scraper.classify_clues(db_handler) == 1
+
+
+def test_write_snapshot(db_handler, tmp_path):
+    path = str(tmp_path / 'catalogue.snapshot')
+    catalogue = scraper.write_snapshot(db_handler, path)
+    assert len(catalogue) > 0
+    assert Catalogue.load(path).movie_ids == catalogue.movie_ids
+
+
+def test_export_corpus(db_handler, tmp_path):
+    from_csv = str(tmp_path / 'csv.corpus')
+    from_tables = str(tmp_path / 'tables.corpus')
+    assert scraper.export_corpus(db_handler, from_csv,
+                                 os.path.join('db', 'data')) == 6171
+    scraper.export_corpus(db_handler, from_tables)
+    shawshank = db_handler.get_movie_by_imdb_id('tt0111161')
+    csv_pack = MappedCorpus(from_csv).get_round_pack(shawshank.movie_id)
+    assert csv_pack.movie == shawshank
+    assert {clue.clue_id for clue in csv_pack.clues} == \
+           {clue.clue_id for clue in MappedCorpus(from_tables)
+            .get_round_pack(shawshank.movie_id).clues}
+
+
+def test_get_session_is_shared():
+    assert scraper.get_session() is scraper.get_session()
+
+
+def test_host_rate_limiter():
+    limiter = scraper.HostRateLimiter(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.wait('http://example.com/a')
+    # Five intervals of 20ms must have passed between the six requests
+    assert time.monotonic() - start >= 0.09
+    start = time.monotonic()
+    limiter.wait('http://other.example.com/a')
+    assert time.monotonic() - start < 0.02
@@ -0,0 +1,70 @@
+"""
+Tests for imdb_game.scraper.cache module
+"""
+import random
+import string
+import time
+import pytest
+from imdb_game.scraper.cache import PageCache, CachedPage
+
+URL = 'https://www.imdb.com/title/tt0111161/parentalguide'
+
+
+@pytest.fixture
+def page_cache(tmp_path):
+    cache = PageCache(str(tmp_path / 'pages.sqlite3'), ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_put_and_get(page_cache):
+    assert page_cache.get(URL) is None
+    page_cache.put(URL, '<html>Parents Guide</html>', etag='"abc"',
+                   last_modified='Sat, 11 Mar 2023 22:07:45 GMT')
+    page = page_cache.get(URL)
+    assert isinstance(page, CachedPage)
+    assert page.body == '<html>Parents Guide</html>'
+    assert page.is_fresh(page_cache.ttl)
+    assert page.validators() == {
+        'If-None-Match': '"abc"',
+        'If-Modified-Since': 'Sat, 11 Mar 2023 22:07:45 GMT'}
+
+
+def test_stale_page_and_touch(page_cache):
+    page_cache.put(URL, 'body')
+    page = page_cache.get(URL)
+    assert not page.is_fresh(0)
+    before = page.fetched_at
+    time.sleep(0.01)
+    page_cache.touch(URL)
+    assert page_cache.get(URL).fetched_at > before
+    # Validators sent with a 304 replace the stored ones
+    page_cache.put(URL, 'body', etag='"v1"', last_modified='Mon')
+    page_cache.touch(URL, etag='"v2"')
+    page = page_cache.get(URL)
+    assert (page.etag, page.last_modified) == ('"v2"', 'Mon')
+
+
+def test_size_eviction(tmp_path):
+    cache = PageCache(str(tmp_path / 'small.sqlite3'), max_bytes=2048)
+    try:
+        for index in range(20):
+            # Random bodies so each entry keeps a real compressed size
+            body = ''.join(random.Random(index).choices(string.printable,
+                                                        k=1000))
+            cache.put(f'{URL}?page={index}', body)
+        assert cache.size() <= 2048
+        assert cache.get(f'{URL}?page=19') is not None
+        assert cache.get(f'{URL}?page=0') is None
+    finally:
+        cache.close()
+
+
+def test_persists_between_instances(tmp_path):
+    path = str(tmp_path / 'pages.sqlite3')
+    cache = PageCache(path)
+    cache.put(URL, 'saved')
+    cache.close()
+    reopened = PageCache(path)
+    assert reopened.get(URL).body == 'saved'
+    reopened.close()
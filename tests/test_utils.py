@@ -56,6 +56,9 @@ def test_justify_text():
     assert utils.justify_text(CLUE_TEXT, 10) == CLUE_RESULTS['ten']
     assert utils.justify_text(CLUE_TEXT, 5) == CLUE_RESULTS['five']
     assert utils.justify_text(CLUE_TEXT, 1) == CLUE_RESULTS['one']
+    assert utils.justify_text('', 80) == ''
+    assert utils.justify_text('   ', 80) == ''
+    assert utils.justify_text('Gore.', 80) == 'Gore.'
 
 
 def test_strip_text():
@@ -65,3 +68,25 @@ def test_strip_text():
 def test_remove_accents():
     for text, unaccented_text in zip(ACCENTED_TEXTS, UNACCENTED_TEXTS):
         assert utils.remove_accents(text) == unaccented_text
+
+
+def test_split_words():
+    assert utils.split_words("Schindler's List: Élan_2") == \
+           ['schindler', 's', 'list', 'elan', '2']
+
+
+def test_clue_leaks_title():
+    leaks = [('An alien bursts through his chest', 'Alien'),
+             ('WALL-E sacrifices himself', 'WALL·E'),
+             ('The Dark Knight appears', 'The Dark Knight Rises'),
+             ('the toystory franchise', 'Toy Story'),
+             ('Most violent Lord of rings movie.',
+              'The Lord of the Rings: The Return of the King')]
+    for clue_text, title in leaks:
+        assert utils.clue_leaks_title(clue_text, title)
+    safe = [('A love scene with no nudity', 'Love Actually'),
+            ('Aliens are mentioned', 'Alien'),
+            ('Some of the characters smoke', 'Lord of the Flies'),
+            ('A man is shot', 'The')]
+    for clue_text, title in safe:
+        assert not utils.clue_leaks_title(clue_text, title)
@@ -0,0 +1,51 @@
+"""
+Tests for imdb_game.utils.normalize module
+"""
+import csv
+import os
+import sys
+import unicodedata
+from imdb_game.utils.normalize import strip_text, strip_texts
+
+ODD_TEXTS = ['', 'Amélie', 'WALL·E', 'Léon: The Professional', 'Ｓｅｖｅｎ',
+             'ΟΔΥΣΣΕΑΣ', 'ΣΑΣ ΣΑΣ', 'Æon Flux', 'Straße', 'İstanbul',
+             'Ⅻ Monkeys', '½ Life', 'ﬁnal ﬂight', '한국영화', 'Tab\there\x00']
+
+
+def reference_strip_text(input_text: str) -> str:
+    # strip_text before it moved to imdb_game.utils.normalize
+    normalized = unicodedata.normalize('NFKD', input_text)
+    unaccented = ''.join(character for character in normalized
+                         if unicodedata.category(character) != 'Mn')
+    return ''.join(character for character in unaccented
+                   if character.isalnum()).lower()
+
+
+def movie_titles() -> list[str]:
+    with open(os.path.join('db', 'data', 'movies.csv')) as movies_file:
+        return [row['title'] for row in csv.DictReader(movies_file)]
+
+
+def test_strip_text_matches_movies_csv():
+    for title in movie_titles():
+        assert strip_text(title) == reference_strip_text(title), title
+
+
+def test_strip_text_matches_reference():
+    for text in ODD_TEXTS:
+        assert strip_text(text) == reference_strip_text(text), text
+    # Every codepoint, a run of neighbours at a time
+    for start in range(0, sys.maxunicode + 1, 256):
+        text = ''.join(chr(codepoint) for codepoint in
+                       range(start, min(start + 256, sys.maxunicode + 1)))
+        assert strip_text(text) == reference_strip_text(text), hex(start)
+
+
+def test_strip_texts():
+    titles = movie_titles() + ODD_TEXTS
+    assert strip_texts(titles) == [reference_strip_text(title)
+                                   for title in titles]
+    assert strip_texts(title for title in ['The Matrix', 'Heat']) == \
+           ['thematrix', 'heat']
+    assert strip_texts([]) == []
+    assert strip_texts(['']) == ['']